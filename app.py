@@ -1,14 +1,19 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
 from pathlib import Path
+import os
 import sys
+import tempfile
+from typing import Hashable
 
 sys.path.insert(0, str(Path(__file__).parent))
 
 from src.core.engine import Text2SQLEngine
+from src.core.llm import LLMClient
+from src.core.cache import normalize_question
 from src.config import settings, validate_paths
-from src.core.validation import check_data_quality
+from src.core.tracing import REGISTRY, stage_durations
+from src.core.viz import paginate, prepare_chart
 
 st.set_page_config(
     page_title="Text2SQL Studio",
@@ -19,16 +24,48 @@ st.set_page_config(
 if 'api_key_configured' not in st.session_state:
     st.session_state.api_key_configured = False
 
-if 'engine' not in st.session_state:
-    try:
-        validate_paths()
-        st.session_state.engine = Text2SQLEngine(prompt_version="v1")
-        st.session_state.initialized = True
-        st.session_state.api_key_configured = True
-    except Exception as e:
-        st.session_state.initialized = False
-        st.session_state.error = str(e)
-        st.session_state.api_key_configured = False
+@st.cache_resource(show_spinner=False)
+def get_engine(api_key: str) -> Text2SQLEngine:
+    # One engine per process, shared by every session; its caches, pools and rate limiter are thread-safe
+    validate_paths()
+    engine = Text2SQLEngine(prompt_version="v1", llm=LLMClient(api_key=api_key))
+    if settings.WARM_UP:
+        # Schema, page cache and the Gemini SDK load in the background while the page renders
+        engine.warm_up()
+    return engine
+
+class QueryFailed(Exception):
+    
+    def __init__(self, result, metadata: dict):
+        super().__init__(metadata['error'])
+        self.result = result
+        self.metadata = metadata
+
+@st.cache_data(ttl=settings.UI_RESULT_TTL_SECONDS, max_entries=256, show_spinner=False)
+def ask_cached(_engine: Text2SQLEngine, _question: str, question_key: str, prompt_version: str, data_version: Hashable):
+    # Reruns and other sessions asking the same question reuse the result; failures are raised so they are not cached.
+    # data_version changes whenever the database file does, so answers over old data are not served
+    result, metadata = _engine.ask(_question, validate=True)
+    if not metadata['success']:
+        raise QueryFailed(result, metadata)
+    return result, metadata
+
+@st.cache_data(ttl=settings.UI_SCHEMA_TTL_SECONDS, show_spinner=False)
+def load_schema(_engine: Text2SQLEngine) -> dict:
+    return _engine.get_schema()
+
+@st.cache_data(ttl=settings.UI_STATS_TTL_SECONDS, show_spinner=False)
+def load_performance_stats(_engine: Text2SQLEngine) -> dict:
+    return _engine.get_performance_stats()
+
+try:
+    engine = get_engine(os.environ.get('GOOGLE_API_KEY') or settings.GOOGLE_API_KEY)
+    st.session_state.initialized = True
+    st.session_state.api_key_configured = True
+except Exception as e:
+    st.session_state.initialized = False
+    st.session_state.error = str(e)
+    st.session_state.api_key_configured = False
 
 with st.sidebar:
     st.title("🔧 Data Control Panel")
@@ -48,7 +85,7 @@ with st.sidebar:
     if col1.button("💾 Save & Apply", type="primary", use_container_width=True):
         if api_key_input and len(api_key_input) > 10:
             try:
-                import os
+                previous_key = os.environ.get('GOOGLE_API_KEY') or settings.GOOGLE_API_KEY
                 os.environ['GOOGLE_API_KEY'] = api_key_input
                 
                 env_path = Path(".env")
@@ -63,10 +100,11 @@ with st.sidebar:
                             else:
                                 f.write(line)
                 
-                if 'engine' in st.session_state:
-                    del st.session_state['engine']
-                if 'initialized' in st.session_state:
-                    del st.session_state['initialized']
+                # Other sessions may still be answering with the old engine, so it is only dropped from the
+                # cache once its replacement exists, and released when nothing references it any more
+                get_engine(api_key_input)
+                if previous_key != api_key_input:
+                    get_engine.clear(previous_key)
                 
                 st.success("✅ API key saved! Refreshing...")
                 st.rerun()
@@ -96,21 +134,48 @@ with st.sidebar:
         st.stop()
     
     with st.expander("📂 View Database Schema", expanded=False):
-        schema = st.session_state.engine.get_schema()
+        schema = load_schema(engine)
         for table, columns in schema.items():
             st.markdown(f"**{table.upper()}**")
             st.caption(", ".join(columns))
             st.divider()
     
     with st.expander("📈 Performance Stats"):
-        stats = st.session_state.engine.get_performance_stats()
+        stats = load_performance_stats(engine)
         st.metric("Success Rate", f"{stats['success_rate']:.1f}%")
+        if 'latency' in stats:
+            st.metric("p95 Latency", f"{stats['latency']['p95_ms']:.0f} ms")
+        if 'template_hit_rate' in stats:
+            st.metric("Template Hit Rate", f"{stats['template_hit_rate']:.1f}%")
+        if len(stats.get('by_prompt_version', {})) > 1:
+            versions = pd.DataFrame({
+                version: {'queries': group['total_queries'], 'success %': group['success_rate'],
+                          'p50 ms': group['latency']['p50_ms'], 'p95 ms': group['latency']['p95_ms']}
+                for version, group in stats['by_prompt_version'].items()
+            }).T
+            st.dataframe(versions.round(1), use_container_width=True)
         
         if stats['recent_experiments']:
             st.caption("Recent Queries:")
             for exp in stats['recent_experiments'][-3:]:
                 status = "✓" if exp.get('execution_success') else "✗"
                 st.caption(f"{status} {exp.get('user_question', 'N/A')[:30]}...")
+    
+    with st.expander("⏱️ Latency by Stage"):
+        stage_stats = REGISTRY.to_dict()['stages']
+        if stage_stats:
+            latency = pd.DataFrame(stage_stats).T[['count', 'p50_ms', 'p95_ms', 'p99_ms']]
+            st.dataframe(latency.round(1), use_container_width=True)
+            if settings.METRICS_PORT:
+                st.caption(f"📡 Prometheus metrics at http://{settings.METRICS_HOST}:{settings.METRICS_PORT}/metrics")
+        else:
+            st.caption("No requests yet")
+    
+    stream_results = st.toggle(
+        "⚡ Stream large results",
+        value=False,
+        help="Show the first page immediately and read the rest in chunks into a downloadable CSV"
+    )
 
 st.title("📊 Text2SQL Studio")
 st.caption("Convert natural language to SQL queries using AI")
@@ -131,15 +196,82 @@ user_input = st.text_input(
     placeholder="e.g., What is the profit margin for each product category?"
 )
 
-if user_input:
+def render_sql(sql: str):
+    with st.expander("🔧 View Generated SQL"):
+        if sql:
+            st.code(sql, language="sql")
+        else:
+            st.error("Failed to generate SQL")
+
+def render_streamed_result(question: str):
+    # Reruns of the same question, such as the download click, reuse the last finished run instead of
+    # streaming every row again; the key matches ask_cached so a write to the database starts a new run
+    run_key = (normalize_question(question), engine.prompt_version, engine.db.data_version())
+    last_run = st.session_state.get('streamed_run')
+    if last_run and last_run['key'] == run_key:
+        render_sql(last_run['sql'])
+        st.subheader("📋 Results (first page)")
+        st.dataframe(last_run['first_page'], use_container_width=True)
+        st.caption(last_run['summary'])
+        st.download_button("⬇️ Download CSV", last_run['csv'], file_name="results.csv", mime="text/csv")
+        return
+    
+    with st.spinner("🔍 Analyzing your question..."):
+        stream, metadata = engine.ask(question, stream=True)
+    
+    render_sql(metadata['sql'])
+    
+    if not metadata['success']:
+        st.error(f"❌ Query failed: {metadata['error']}")
+        return
+    
+    # Closing the stream returns its pooled connection even if rendering fails or the run is interrupted
+    with stream:
+        first_page = next(stream, None)
+        if first_page is None:
+            st.warning("⚠️ Query executed but returned no data")
+            return
+        
+        st.subheader("📋 Results (first page)")
+        st.dataframe(first_page, use_container_width=True)
+        
+        progress = st.empty()
+        # One file per run, removed once its contents have been read for the download button
+        export_file = tempfile.NamedTemporaryFile('w', suffix=".csv", prefix="text2sql_", newline='',
+                                                  encoding='utf-8', delete=False)
+        export_path = export_file.name
+        try:
+            with export_file as f:
+                first_page.to_csv(f, index=False)
+                for chunk in stream:
+                    chunk.to_csv(f, header=False, index=False)
+                    progress.caption(f"⏳ Read {stream.rows_read:,} rows...")
+            
+            note = " (row cap reached, result truncated)" if stream.truncated else ""
+            summary = f"✅ Read {stream.rows_read:,} rows{note}"
+            progress.caption(summary)
+            csv_data = Path(export_path).read_bytes()
+        finally:
+            os.remove(export_path)
+    
+    st.download_button("⬇️ Download CSV", csv_data, file_name="results.csv", mime="text/csv")
+    st.session_state.streamed_run = {
+        'key': run_key, 'sql': metadata['sql'], 'first_page': first_page, 'summary': summary, 'csv': csv_data
+    }
+
+if user_input and stream_results:
+    render_streamed_result(user_input)
+
+elif user_input:
     with st.spinner("🔍 Analyzing your question..."):
-        result, metadata = st.session_state.engine.ask(user_input, validate=True)
+        try:
+            result, metadata = ask_cached(
+                engine, user_input, normalize_question(user_input), engine.prompt_version, engine.db.data_version()
+            )
+        except QueryFailed as failure:
+            result, metadata = failure.result, failure.metadata
         
-        with st.expander("🔧 View Generated SQL"):
-            if metadata['sql']:
-                st.code(metadata['sql'], language="sql")
-            else:
-                st.error("Failed to generate SQL")
+        render_sql(metadata['sql'])
         
         if metadata['success'] and result is not None and not result.empty:
             st.success("✅ Query executed successfully!")
@@ -152,48 +284,80 @@ if user_input:
             if not metadata['validation_passed']:
                 st.warning(f"⚠️ Validation Warning: {metadata['error']}")
             
+            memory = metadata.get('memory')
+            if memory:
+                st.caption(
+                    f"💾 {memory['bytes'] / 1e6:,.1f} MB in memory ({memory['format']} format), "
+                    f"peak {memory['peak_bytes'] / 1e6:,.1f} MB while loading"
+                )
+            
             st.subheader("📋 Results")
-            st.dataframe(result, use_container_width=True)
+            table, pages = paginate(result, 1)
+            if pages > 1:
+                page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+                table, pages = paginate(result, page)
+                start_row = (page - 1) * settings.TABLE_PAGE_ROWS
+                st.caption(f"Showing rows {start_row + 1:,}-{start_row + len(table):,} of {len(result):,}")
+            st.dataframe(table, use_container_width=True)
             
             with st.expander("🔍 Data Quality Report"):
-                quality = check_data_quality(result)
+                quality = engine.validator.profile(result)
                 st.json(quality)
             
+            # Altair is only needed once there is a result to chart, so the first page load skips it
+            import altair as alt
+            
+            with st.expander("⏱️ Stage Timings"):
+                durations = stage_durations(metadata.get('stages', []))
+                timings = pd.DataFrame({'stage': list(durations), 'ms': list(durations.values())})
+                st.altair_chart(
+                    alt.Chart(timings).mark_bar().encode(
+                        x=alt.X('ms', title="ms"),
+                        y=alt.Y('stage', sort=None, title=None),
+                        tooltip=['stage', alt.Tooltip('ms', format=".1f")]
+                    ),
+                    use_container_width=True
+                )
+            
             st.subheader("📊 Visualization")
-            numeric_cols = result.select_dtypes(include=['number']).columns
+            chart_data = prepare_chart(result)
             
-            if len(numeric_cols) > 0 and len(result) > 1:
-                text_cols = result.columns.difference(numeric_cols)
+            if chart_data is None:
+                st.info("Chart generation skipped: Insufficient data, or no numeric and categorical column pair")
+            else:
+                x_col, y_col, data = chart_data['x'], chart_data['y'], chart_data['data']
                 
-                if len(text_cols) > 0:
-                    x_col = text_cols[0]
-                    y_col = numeric_cols[0]
-                    
-                    if "region" in x_col.lower() or "category" in x_col.lower():
-                        chart = alt.Chart(result).mark_arc(innerRadius=50).encode(
-                            theta=alt.Theta(field=y_col, type="quantitative"),
-                            color=alt.Color(field=x_col, type="nominal", legend=alt.Legend(title=x_col)),
-                            tooltip=[x_col, y_col]
-                        ).properties(
-                            title=f"{y_col} Distribution by {x_col}",
-                            width=400,
-                            height=400
-                        )
-                    else:
-                        chart = alt.Chart(result).mark_bar().encode(
-                            x=alt.X(x_col, sort=None, axis=alt.Axis(labelAngle=-45, title=x_col)),
-                            y=alt.Y(y_col, title=y_col),
-                            tooltip=[x_col, y_col],
-                            color=alt.Color(x_col, legend=None)
-                        ).properties(
-                            title=f"{y_col} by {x_col}"
-                        ).interactive()
-                    
-                    st.altair_chart(chart, use_container_width=True)
+                if chart_data['kind'] == "time":
+                    chart = alt.Chart(data).mark_line(point=len(data) <= 100).encode(
+                        x=alt.X(x_col, type="temporal", title=x_col),
+                        y=alt.Y(y_col, title=y_col),
+                        tooltip=[x_col, y_col]
+                    ).properties(
+                        title=f"{y_col} over {x_col}"
+                    ).interactive()
+                elif "region" in x_col.lower() or "category" in x_col.lower():
+                    chart = alt.Chart(data).mark_arc(innerRadius=50).encode(
+                        theta=alt.Theta(field=y_col, type="quantitative"),
+                        color=alt.Color(field=x_col, type="nominal", legend=alt.Legend(title=x_col)),
+                        tooltip=[x_col, y_col]
+                    ).properties(
+                        title=f"{y_col} Distribution by {x_col}",
+                        width=400,
+                        height=400
+                    )
                 else:
-                    st.info("Chart generation skipped: No categorical columns for X-axis")
-            else:
-                st.info("Chart generation skipped: Insufficient data or no numeric columns")
+                    chart = alt.Chart(data).mark_bar().encode(
+                        x=alt.X(x_col, sort=None, axis=alt.Axis(labelAngle=-45, title=x_col)),
+                        y=alt.Y(y_col, title=y_col),
+                        tooltip=[x_col, y_col],
+                        color=alt.Color(x_col, legend=None)
+                    ).properties(
+                        title=f"{y_col} by {x_col}"
+                    ).interactive()
+                
+                st.altair_chart(chart, use_container_width=True)
+                if chart_data['notes']:
+                    st.caption(f"📉 Charting {len(data):,} of {chart_data['source_rows']:,} rows: " + "; ".join(chart_data['notes']))
         
         elif metadata['success'] and (result is None or result.empty):
             st.warning("⚠️ Query executed but returned no data")
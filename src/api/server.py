@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import json
+import pandas as pd
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from urllib.parse import parse_qs
+from src.config import settings, validate_paths
+from src.core.cache import normalize_question
+from src.core.engine import Text2SQLEngine
+from src.core.tracing import REGISTRY, stage_durations
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+ROUTES = ("/ask", "/health", "/stats", "/metrics")
+METADATA_KEYS = (
+    'sql', 'success', 'error', 'rows', 'execution_time_ms', 'validation_passed', 'cache_hit',
+    'result_cache_hit', 'template_hit', 'semantic', 'budget_exceeded', 'few_shot_examples', 'memory'
+)
+
+class HTTPError(Exception):
+    
+    def __init__(self, status: int, message: str, headers: List[Tuple[bytes, bytes]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or []
+
+class QueueFull(HTTPError):
+    
+    def __init__(self, waiting: int):
+        super().__init__(503, f"Too many queued requests ({waiting}), retry shortly", [(b"retry-after", b"1")])
+
+class SingleFlight:
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+    
+    def __len__(self) -> int:
+        return len(self._calls)
+    
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        future = self._calls.get(key)
+        if future is not None:
+            self.followers += 1
+            # shield() keeps one impatient follower from cancelling the shared call
+            return await asyncio.shield(future), True
+        
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await func()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._calls.pop(key, None)
+
+class RequestQueue:
+    
+    def __init__(self, concurrency: int, max_waiting: int):
+        self.concurrency = max(1, concurrency)
+        self.max_waiting = max(0, max_waiting)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+    
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise QueueFull(self.waiting)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+    
+    def stats(self) -> Dict:
+        return {
+            'concurrency': self.concurrency,
+            'running': self.running,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'rejected': self.rejected
+        }
+
+def public_metadata(metadata: dict, coalesced: bool = False) -> Dict:
+    public = {key: metadata[key] for key in METADATA_KEYS if key in metadata}
+    public['stages'] = stage_durations(metadata.get('stages', []))
+    public['coalesced'] = coalesced
+    return public
+
+def to_json(result: pd.DataFrame, metadata: Dict) -> bytes:
+    # pandas writes the rows in C; only the small metadata dict goes through json.dumps
+    data = result.to_json(orient="split", index=False, date_format="iso") if result is not None else "null"
+    return f'{{"metadata": {json.dumps(metadata, default=str)}, "data": {data}}}'.encode("utf-8")
+
+def to_arrow(result: pd.DataFrame, metadata: Dict) -> bytes:
+    try:
+        table = pa.Table.from_pandas(result, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type object columns have no Arrow type; send them as text
+        mixed = {column: str for column in result.select_dtypes(include=['object']).columns}
+        table = pa.Table.from_pandas(result.astype(mixed), preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}), b"text2sql": json.dumps(metadata, default=str).encode("utf-8")
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+class QueryService:
+    
+    def __init__(self, engine: Text2SQLEngine = None, concurrency: int = None, queue_size: int = None,
+                 max_body_bytes: int = None):
+        self._engine = engine
+        self.concurrency = concurrency or settings.SERVICE_CONCURRENCY
+        self.queue_size = settings.SERVICE_QUEUE_SIZE if queue_size is None else queue_size
+        self.max_body_bytes = max_body_bytes or settings.SERVICE_MAX_BODY_BYTES
+        self.flights = SingleFlight()
+        self._queue: Optional[RequestQueue] = None
+    
+    @property
+    def engine(self) -> Text2SQLEngine:
+        if self._engine is None:
+            validate_paths()
+            self._engine = Text2SQLEngine()
+        return self._engine
+    
+    @property
+    def queue(self) -> RequestQueue:
+        # Created on first use so the semaphore binds to the server's event loop
+        if self._queue is None:
+            self._queue = RequestQueue(self.concurrency, self.queue_size)
+        return self._queue
+    
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        
+        try:
+            status, body, content_type, headers = await self._route(scope, receive)
+        except HTTPError as e:
+            status, content_type, headers = e.status, "application/json", e.headers
+            body = json.dumps({'error': str(e)}).encode("utf-8")
+        except Exception as e:
+            print(f"Service Error: {e}")
+            status, content_type, headers = 500, "application/json", []
+            body = json.dumps({'error': str(e)}).encode("utf-8")
+        
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b"content-type", content_type.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                *headers
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+    
+    async def _lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    engine = await asyncio.get_running_loop().run_in_executor(None, lambda: self.engine)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                if settings.WARM_UP:
+                    # The server accepts requests straight away; /health reports when warm-up has finished
+                    engine.warm_up()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._engine is not None:
+                    self._engine.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    async def _read_body(self, receive: Callable) -> bytes:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise HTTPError(413, f"Request body over {self.max_body_bytes} bytes")
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b"".join(chunks)
+    
+    async def _route(self, scope: dict, receive: Callable) -> Tuple[int, bytes, str, List]:
+        path, method = scope['path'], scope['method']
+        query = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b"").decode("latin-1")).items()}
+        
+        if path == "/ask" and method in ("GET", "POST"):
+            params = dict(query)
+            if method == "POST":
+                body = await self._read_body(receive)
+                try:
+                    params.update(json.loads(body or b"{}"))
+                except (ValueError, TypeError):
+                    raise HTTPError(400, "Request body must be a JSON object")
+            headers = dict(scope.get('headers') or [])
+            return await self.ask(params, headers.get(b"accept", b"").decode("latin-1"))
+        if path == "/health" and method == "GET":
+            return 200, json.dumps(self.health()).encode("utf-8"), "application/json", []
+        if path == "/stats" and method == "GET":
+            return 200, json.dumps(self.stats(), default=str).encode("utf-8"), "application/json", []
+        if path == "/metrics" and method == "GET":
+            return 200, REGISTRY.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4", []
+        if path in ROUTES:
+            raise HTTPError(405, f"{method} is not allowed on {path}")
+        raise HTTPError(404, "Not found")
+    
+    async def ask(self, params: dict, accept: str = "") -> Tuple[int, bytes, str, List]:
+        question = str(params.get('question') or params.get('q') or "").strip()
+        if not question:
+            raise HTTPError(400, "Missing 'question'")
+        output = params.get('format') or ("arrow" if ARROW_CONTENT_TYPE in accept else "json")
+        if output not in ("json", "arrow"):
+            raise HTTPError(400, "format must be 'json' or 'arrow'")
+        if output == "arrow" and pa is None:
+            raise HTTPError(406, "pyarrow is required for Arrow responses")
+        validate = str(params.get('validate', True)).lower() not in ("false", "0", "no")
+        use_cache = str(params.get('use_cache', True)).lower() not in ("false", "0", "no")
+        
+        async def run() -> Tuple[pd.DataFrame, dict]:
+            async with self.queue.slot():
+                return await self.engine.ask_async(question, validate=validate, use_cache=use_cache)
+        
+        # Identical questions already in flight share one LLM call and one execution
+        key = (normalize_question(question), self.engine.prompt_version, validate, use_cache)
+        (result, metadata), coalesced = await self.flights.do(key, run)
+        metadata = public_metadata(metadata, coalesced)
+        if coalesced:
+            REGISTRY.increment("coalesced_requests_total")
+        
+        status = 200 if metadata['success'] else 422
+        if output == "arrow" and metadata['success']:
+            return status, to_arrow(result, metadata), ARROW_CONTENT_TYPE, []
+        return status, to_json(result if metadata['success'] else None, metadata), "application/json", []
+    
+    def health(self) -> Dict:
+        if self._engine is None:
+            return {'status': "ok", 'ready': False}
+        return {'status': "ok", 'ready': self._engine.ready.is_set()}
+    
+    def stats(self) -> Dict:
+        return {
+            'startup': self._engine.startup_report() if self._engine is not None else None,
+            'queue': self.queue.stats(),
+            'in_flight': len(self.flights),
+            'leaders': self.flights.leaders,
+            'coalesced': self.flights.followers,
+            'metrics': REGISTRY.to_dict()
+        }
+
+app = QueryService()
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Serve Text2SQLEngine over HTTP")
+    parser.add_argument("--host", default=settings.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVICE_PORT)
+    args = parser.parse_args(argv)
+    
+    try:
+        import uvicorn
+    except ImportError:
+        print("Service Error: uvicorn is required, install it with `pip install uvicorn`")
+        return
+    # One process keeps a single engine, rate budget and cache for every client
+    uvicorn.run(app, host=args.host, port=args.port, workers=1, log_level="info")
+
+if __name__ == "__main__":
+    main()
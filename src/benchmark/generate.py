@@ -0,0 +1,143 @@
+import argparse
+import sqlite3
+import time
+import numpy as np
+from pathlib import Path
+from typing import Dict, List
+
+REGIONS = ["asia pacific", "europe", "latin america", "north america"]
+CATEGORIES = ["electronics", "furniture", "office supplies", "apparel", "kitchen", "tools"]
+START_DATE = "2020-01-01"
+END_DATE = "2024-12-31"
+BATCH_SIZE = 500000
+
+SCHEMA = """
+CREATE TABLE clients (
+    client_id INTEGER PRIMARY KEY,
+    company_name TEXT NOT NULL,
+    region TEXT NOT NULL,
+    contact_name TEXT,
+    contact_email TEXT
+);
+CREATE TABLE catalog (
+    product_id INTEGER PRIMARY KEY,
+    product_name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    cost_price REAL NOT NULL,
+    unit_price REAL NOT NULL
+);
+CREATE TABLE invoices (
+    invoice_id INTEGER PRIMARY KEY,
+    client_id INTEGER NOT NULL REFERENCES clients(client_id),
+    product_id INTEGER NOT NULL REFERENCES catalog(product_id),
+    invoice_date TEXT NOT NULL,
+    quantity INTEGER NOT NULL
+);
+"""
+
+def scale_for(rows: int) -> Dict[str, int]:
+    return {
+        'invoices': rows,
+        'clients': int(min(100000, max(50, rows // 200))),
+        'products': int(min(20000, max(30, rows // 2000)))
+    }
+
+def _clients(rng: np.random.Generator, count: int) -> List[tuple]:
+    regions = rng.choice(len(REGIONS), size=count, p=[0.3, 0.25, 0.15, 0.3])
+    return [
+        (i, f"Company {i:06d}", REGIONS[region], f"Contact {i}", f"contact{i}@company{i}.com")
+        for i, region in enumerate(regions.tolist(), start=1)
+    ]
+
+def _products(rng: np.random.Generator, count: int) -> List[tuple]:
+    categories = rng.integers(0, len(CATEGORIES), size=count).tolist()
+    costs = np.round(rng.lognormal(mean=3.5, sigma=0.8, size=count), 2).tolist()
+    markups = rng.uniform(1.1, 2.2, size=count).tolist()
+    return [
+        (i, f"Product {i:05d}", CATEGORIES[category], cost, round(cost * markup, 2))
+        for i, (category, cost, markup) in enumerate(zip(categories, costs, markups), start=1)
+    ]
+
+def _skewed_ids(rng: np.random.Generator, count: int, population: int, stride: int) -> np.ndarray:
+    # 30% of rows follow a Zipf curve so a few clients and products dominate
+    uniform = rng.integers(0, population, size=count)
+    ranks = np.minimum(rng.zipf(1.5, size=count), population) - 1
+    ids = np.where(rng.random(count) < 0.3, ranks * stride % population, uniform)
+    return ids + 1
+
+def _invoices(rng: np.random.Generator, start: int, count: int, clients: int, products: int) -> List[tuple]:
+    client_ids = _skewed_ids(rng, count, clients, 7919)
+    product_ids = _skewed_ids(rng, count, products, 104729)
+    
+    first, last = np.datetime64(START_DATE), np.datetime64(END_DATE)
+    days = rng.integers(0, int((last - first).astype(int)) + 1, size=count)
+    dates = (first + days).astype(str)
+    quantities = rng.integers(1, 50, size=count)
+    
+    ids = range(start, start + count)
+    return list(zip(ids, client_ids.tolist(), product_ids.tolist(), dates.tolist(), quantities.tolist()))
+
+def generate(path: str, rows: int, seed: int = 42, indexes: bool = False, overwrite: bool = False) -> Dict:
+    target = Path(path)
+    if target.exists():
+        if not overwrite:
+            raise FileExistsError(f"{path} already exists (use --overwrite)")
+        target.unlink()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    
+    scale = scale_for(rows)
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO clients VALUES (?, ?, ?, ?, ?)", _clients(rng, scale['clients']))
+        conn.executemany("INSERT INTO catalog VALUES (?, ?, ?, ?, ?)", _products(rng, scale['products']))
+        
+        written = 0
+        while written < rows:
+            count = min(BATCH_SIZE, rows - written)
+            batch = _invoices(rng, written + 1, count, scale['clients'], scale['products'])
+            conn.executemany("INSERT INTO invoices VALUES (?, ?, ?, ?, ?)", batch)
+            conn.commit()
+            written += count
+            print(f"  invoices: {written:,}/{rows:,}")
+        
+        if indexes:
+            conn.execute("CREATE INDEX idx_invoices_client_id ON invoices (client_id)")
+            conn.execute("CREATE INDEX idx_invoices_product_id ON invoices (product_id)")
+            conn.execute("CREATE INDEX idx_invoices_invoice_date ON invoices (invoice_date)")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    
+    return {
+        'path': str(target),
+        'seed': seed,
+        'indexes': indexes,
+        **scale,
+        'size_mb': target.stat().st_size / 1024 / 1024,
+        'elapsed_s': time.perf_counter() - start
+    }
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic wholesale database")
+    parser.add_argument("--rows", type=int, default=100000, help="Number of invoice rows (10k to 50M)")
+    parser.add_argument("--output", default=None, help="Defaults to data/bench/wholesale_<rows>.db")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--indexes", action="store_true", help="Index the invoices foreign keys and date")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args(argv)
+    
+    output = args.output or f"data/bench/wholesale_{args.rows}.db"
+    info = generate(output, args.rows, args.seed, args.indexes, args.overwrite)
+    print(f"Generated {info['invoices']:,} invoices, {info['clients']:,} clients and "
+          f"{info['products']:,} products in {info['elapsed_s']:.1f}s ({info['size_mb']:.1f} MB) -> {info['path']}")
+    return info
+
+if __name__ == "__main__":
+    main()
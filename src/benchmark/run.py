@@ -0,0 +1,169 @@
+import argparse
+import json
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+import numpy as np
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from src.core.cache import QueryCache
+from src.core.db import DatabaseClient
+from src.core.engine import Text2SQLEngine
+from src.core.llm import ReplayLLMClient, response_key
+from src.core.logger import ExperimentLogger
+from src.core.semantic import SemanticLayer
+from src.core.tracing import stage_durations
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_CORPUS = str(Path(__file__).with_name("questions.json"))
+RESULTS_DIR = "experiments/benchmarks"
+PROMPT_VERSION = "bench"
+
+def summarize_latencies(values: List[float]) -> Dict:
+    if not values:
+        return {'count': 0}
+    array = np.asarray(values)
+    return {
+        'count': len(values),
+        'mean_ms': float(array.mean()),
+        'p50_ms': float(np.percentile(array, 50)),
+        'p95_ms': float(np.percentile(array, 95)),
+        'p99_ms': float(np.percentile(array, 99)),
+        'max_ms': float(array.max())
+    }
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak / 1024 / 1024 if platform.system() == "Darwin" else peak / 1024
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                                cwd=Path(__file__).parent)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def load_corpus(path: str) -> List[Dict]:
+    items = json.loads(Path(path).read_text(encoding="utf-8"))
+    return [{'question': item['question'], 'sql': item.get('sql') or item.get('gold_sql')} for item in items]
+
+def build_engine(db_path: str, corpus: List[Dict], work_dir: Path, latency_ms: float, jitter_ms: float,
+                 use_cache: bool, rollups: bool, seed: int) -> Text2SQLEngine:
+    responses = {response_key(item['question'], PROMPT_VERSION): item['sql'] for item in corpus if item['sql']}
+    llm = ReplayLLMClient(responses=responses, latency_ms=latency_ms, jitter_ms=jitter_ms, seed=seed)
+    db = DatabaseClient(db_path, use_result_cache=use_cache)
+    logger = ExperimentLogger(log_file=str(work_dir / "bench_logs.csv"))
+    
+    engine = Text2SQLEngine(prompt_version=PROMPT_VERSION, use_cache=False, llm=llm, db=db, logger=logger)
+    engine.cache = QueryCache(str(work_dir / "cache.db")) if use_cache else None
+    engine.semantic = SemanticLayer(db, rollup_path=str(work_dir / "rollups.db")) if rollups else None
+    return engine
+
+def run_benchmark(db_path: str, corpus_path: str = DEFAULT_CORPUS, iterations: int = 3, warmup: int = 1,
+                  concurrency: int = 1, latency_ms: float = 0.0, jitter_ms: float = 0.0, use_cache: bool = False,
+                  rollups: bool = False, seed: int = 0) -> Dict:
+    corpus = load_corpus(corpus_path)
+    questions = [item['question'] for item in corpus]
+    
+    with tempfile.TemporaryDirectory(prefix="text2sql-bench-") as work:
+        engine = build_engine(db_path, corpus, Path(work), latency_ms, jitter_ms, use_cache, rollups, seed)
+        
+        def run_once() -> List[dict]:
+            if concurrency > 1:
+                return [metadata for _, metadata in engine.ask_many(questions, concurrency=concurrency, use_cache=use_cache)]
+            return [engine.ask(question, use_cache=use_cache)[1] for question in questions]
+        
+        for _ in range(warmup):
+            run_once()
+        
+        records = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            records.extend(run_once())
+        wall_s = time.perf_counter() - start
+        
+        engine.logger.close()
+        invoices = engine.db.get_schema_catalog().get('invoices', {}).get('row_count')
+        engine.db.close()
+    
+    samples: Dict[str, List[float]] = {}
+    for record in records:
+        for stage, elapsed_ms in stage_durations(record.get('stages', [])).items():
+            samples.setdefault(stage, []).append(elapsed_ms)
+    stages = {stage: summarize_latencies(values) for stage, values in samples.items()}
+    stages['total'] = summarize_latencies([record['execution_time_ms'] for record in records])
+    
+    return {
+        'timestamp': datetime.now().isoformat(sep=' ', timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'database': {'path': db_path, 'invoices': invoices},
+        'config': {
+            'corpus': corpus_path,
+            'questions': len(questions),
+            'iterations': iterations,
+            'warmup': warmup,
+            'concurrency': concurrency,
+            'llm_latency_ms': latency_ms,
+            'llm_jitter_ms': jitter_ms,
+            'use_cache': use_cache,
+            'rollups': rollups
+        },
+        'requests': len(records),
+        'success_rate': sum(1 for record in records if record['success']) / len(records) * 100 if records else 0,
+        'rollup_answers': sum(1 for record in records if record.get('semantic')),
+        'wall_time_s': wall_s,
+        'throughput_qps': len(records) / wall_s if wall_s else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages
+    }
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark Text2SQLEngine.ask with replayed LLM responses")
+    parser.add_argument("--db", required=True, help="Database to query (see src.benchmark.generate)")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON list of {question, sql}")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1, help="Run questions through ask_many")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated LLM latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--cache", action="store_true", help="Enable the question and result caches")
+    parser.add_argument("--rollups", action="store_true", help="Answer metric questions from rollups")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Defaults to experiments/benchmarks/bench_<time>.json")
+    args = parser.parse_args(argv)
+    
+    report = run_benchmark(
+        args.db, args.corpus, args.iterations, args.warmup, args.concurrency,
+        args.latency_ms, args.jitter_ms, args.cache, args.rollups, args.seed
+    )
+    
+    output = Path(args.output or f"{RESULTS_DIR}/bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    
+    print(f"{report['requests']} requests in {report['wall_time_s']:.2f}s "
+          f"({report['throughput_qps']:.1f} req/s, success {report['success_rate']:.1f}%)")
+    print(f"{'stage':<14} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in report['stages'].items():
+        if stats['count']:
+            print(f"{stage:<14} {stats['count']:>6} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    if report['peak_rss_mb'] is not None:
+        print(f"Peak RSS: {report['peak_rss_mb']:.1f} MB")
+    print(f"Report saved to {output}")
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,98 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Any, Dict, List
 
 class Settings(BaseSettings):
     GOOGLE_API_KEY: str
     DB_PATH: str = "data/processed/wholesale.db"
     MODEL_VERSION: str = "gemini-2.0-flash-exp"
     LOG_FILE: str = "experiments/logs.csv"
+    LOG_BATCH_SIZE: int = 50
+    LOG_FLUSH_INTERVAL_SECONDS: float = 2.0
+    STATS_RECENT_EXPERIMENTS: int = 100
+    STATS_SKETCH_ACCURACY: float = 0.01
     MAX_REQUESTS_PER_MINUTE: int = 30
+    RATE_LIMIT_BURST: int = 5
+    SQL_CANDIDATES: int = 1
+    SQL_CANDIDATE_RETRIES: int = 1
+    SQL_CANDIDATE_TEMPERATURE: float = 0.7
+    SQL_CANDIDATE_MAX_TIME_MS: int = 10000
+    CACHE_DB_PATH: str = "experiments/cache.db"
+    CACHE_MAX_ENTRIES: int = 1024
+    CACHE_MAX_STORED: int = 100000
+    CACHE_TTL_SECONDS: int = 86400
+    RESULT_CACHE_MAX_BYTES: int = 268435456
+    RESULT_FORMAT: str = "default"
+    TEMPLATE_CACHE: bool = True
+    TEMPLATE_MAX_VALUES: int = 50
+    STREAM_CHUNK_SIZE: int = 10000
+    STREAM_MAX_ROWS: int = 1000000
+    QUERY_MAX_TIME_MS: int = 30000
+    QUERY_MAX_VM_STEPS: int = 0
+    QUERY_MAX_ROWS: int = 1000000
+    PLAN_ANALYSIS: bool = True
+    PLAN_LARGE_TABLE_ROWS: int = 100000
+    SEMANTIC_LAYER: bool = True
+    METRICS_FILE: str = "metrics.yaml"
+    ROLLUP_DB_PATH: str = "experiments/rollups.db"
+    ROLLUP_VERIFY_INTERVAL_SECONDS: int = 3600
+    ROLLUP_REFRESH_MAX_TIME_MS: int = 600000
+    SCHEMA_PRUNING: bool = True
+    SCHEMA_TOP_K: int = 5
+    SCHEMA_MAX_COLUMNS: int = 30
+    SCHEMA_SAMPLE_VALUES: int = 20
+    FEW_SHOT_EXAMPLES: int = 3
+    FEW_SHOT_RECOMPILE_EVERY: int = 256
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 0
+    SERVICE_HOST: str = "127.0.0.1"
+    SERVICE_PORT: int = 8000
+    SERVICE_CONCURRENCY: int = 4
+    SERVICE_QUEUE_SIZE: int = 64
+    SERVICE_MAX_BODY_BYTES: int = 65536
+    PROFILE_SLOW_MS: float = 0.0
+    PROFILE_SAMPLE_RATE: float = 0.1
+    PROFILE_DIR: str = "experiments/profiles"
+    VALIDATION_SAMPLE_ROWS: int = 100000
+    VALIDATION_TIME_BUDGET_MS: float = 250.0
+    UI_RESULT_TTL_SECONDS: int = 600
+    UI_SCHEMA_TTL_SECONDS: int = 60
+    UI_STATS_TTL_SECONDS: int = 10
+    CHART_MAX_POINTS: int = 2000
+    CHART_TOP_N: int = 20
+    TABLE_PAGE_ROWS: int = 1000
+    SHARDS: List[Dict[str, str]] = []
+    SHARD_WORKERS: int = 4
+    DB_POOL_SIZE: int = 4
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_MMAP_SIZE: int = 268435456
+    DB_CACHE_SIZE: int = -65536
+    DB_STATEMENT_CACHE_SIZE: int = 128
+    DB_WARMUP_BYTES: int = 268435456
+    WARM_UP: bool = True
     
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings()
+
+class LazySettings:
+    # Modules import `settings` at load time; .env is read and validated on the first attribute access
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+    
+    def __setattr__(self, name: str, value: Any):
+        setattr(get_settings(), name, value)
+    
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
+settings = LazySettings()
 
 def validate_paths():
     db_path = Path(settings.DB_PATH)
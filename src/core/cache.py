@@ -0,0 +1,285 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+from src.config import settings
+
+SQL_TOKEN = re.compile(r"""
+    (?P<string>'(?:[^']|'')*')
+  | (?P<ident>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<space>\s+)
+  | (?P<word>\w+)
+  | (?P<symbol>.)
+""", re.S | re.X)
+
+QUESTION_PART = re.compile(r"\d+(?:[.,]\d+)*|\w+|[^\w\s]+")
+TRAILING_PUNCTUATION = {"?", "!", ".", "?!", "..."}
+
+def normalize_question(question: str) -> str:
+    # Operators and decimals are kept: "revenue > 100" and "revenue < 100" need different SQL.
+    # Only case, spacing ("revenue>100") and a closing question mark are normalized away.
+    parts = QUESTION_PART.findall(question.lower())
+    while parts and parts[-1] in TRAILING_PUNCTUATION:
+        parts.pop()
+    return " ".join(parts)
+
+def canonicalize_sql(sql: str) -> str:
+    tokens = []
+    for match in SQL_TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind in ('comment', 'space'):
+            continue
+        text = match.group()
+        tokens.append(text.upper() if kind in ('word', 'symbol') else text)
+    
+    while tokens and tokens[-1] == ';':
+        tokens.pop()
+    
+    canonical = []
+    for token in tokens:
+        if canonical and _is_wordlike(canonical[-1][-1]) and _is_wordlike(token[0]):
+            canonical.append(" ")
+        canonical.append(token)
+    return "".join(canonical)
+
+def _is_wordlike(char: str) -> bool:
+    return char.isalnum() or char in "_'\"`[]"
+
+def schema_fingerprint(schema: dict) -> str:
+    payload = json.dumps(schema, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class LRUCache:
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl_seconds and time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key: str, value: Any, stored_at: float = None):
+        with self._lock:
+            self._entries[key] = (value, stored_at or time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def pop(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class QueryCache:
+    
+    def __init__(self, cache_file: str = None, max_entries: int = None, ttl_seconds: float = None,
+                 max_stored: int = None):
+        self.cache_file = Path(cache_file or settings.CACHE_DB_PATH)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.CACHE_TTL_SECONDS
+        self.memory = LRUCache(max_entries or settings.CACHE_MAX_ENTRIES, self.ttl_seconds)
+        self.max_stored = max_stored or settings.CACHE_MAX_STORED
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+    
+    def _connect(self) -> sqlite3.Connection:
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.cache_file), timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                question TEXT,
+                schema_hash TEXT,
+                prompt_version TEXT,
+                sql TEXT,
+                created_at REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS answers_created_at ON answers (created_at)")
+        conn.commit()
+        return conn
+    
+    @staticmethod
+    def make_key(question: str, schema_hash: str, prompt_version: str) -> str:
+        raw = f"{normalize_question(question)}|{schema_hash}|{prompt_version}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+    
+    def get(self, question: str, schema_hash: str, prompt_version: str) -> Optional[str]:
+        key = self.make_key(question, schema_hash, prompt_version)
+        sql = self.memory.get(key)
+        
+        if sql is None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT sql, created_at FROM answers WHERE key = ?", (key,)
+                ).fetchone()
+                if row and self._expired(row[1]):
+                    self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    self._conn.commit()
+                    row = None
+            if row:
+                sql = row[0]
+                self.memory.put(key, sql, row[1])
+        
+        with self._lock:
+            if sql is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return sql
+    
+    def put(self, question: str, schema_hash: str, prompt_version: str, sql: str):
+        key = self.make_key(question, schema_hash, prompt_version)
+        now = time.time()
+        self.memory.put(key, sql, now)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_question(question), schema_hash, prompt_version, sql, now)
+            )
+            # Oldest answers go first once the table is full
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_stored,)
+            )
+            self._conn.commit()
+    
+    def discard(self, question: str, schema_hash: str, prompt_version: str):
+        key = self.make_key(question, schema_hash, prompt_version)
+        self.memory.pop(key)
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self._conn.commit()
+    
+    def invalidate(self, schema_hash: str = None, prompt_version: str = None) -> int:
+        clauses, params = [], []
+        if schema_hash is not None:
+            clauses.append("schema_hash != ?")
+            params.append(schema_hash)
+        if prompt_version is not None:
+            clauses.append("prompt_version = ?")
+            params.append(prompt_version)
+        where = f" WHERE {' OR '.join(clauses)}" if clauses else ""
+        
+        with self._lock:
+            removed = self._conn.execute(f"DELETE FROM answers{where}", params).rowcount
+            self._conn.commit()
+        self.memory.clear()
+        return removed
+    
+    def clear(self) -> int:
+        return self.invalidate()
+    
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total * 100) if total > 0 else 0,
+            'memory_entries': len(self.memory)
+        }
+
+class ResultCache:
+    
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.RESULT_CACHE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._data_token = None
+        self._lock = threading.Lock()
+    
+    def _check_token(self, data_token: Hashable):
+        if data_token != self._data_token:
+            self._entries.clear()
+            self._bytes = 0
+            self._data_token = data_token
+    
+    @staticmethod
+    def make_key(sql: str, params: Sequence = None) -> Hashable:
+        return (canonicalize_sql(sql), tuple(params)) if params else canonicalize_sql(sql)
+    
+    def get(self, sql: str, data_token: Hashable, params: Sequence = None) -> Optional[Tuple[Any, str]]:
+        key = self.make_key(sql, params)
+        with self._lock:
+            self._check_token(data_token)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            source_sql, df, _ = entry
+            return df, source_sql
+    
+    def put(self, sql: str, data_token: Hashable, df, params: Sequence = None) -> bool:
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return False
+        
+        key = self.make_key(sql, params)
+        with self._lock:
+            self._check_token(data_token)
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._bytes -= previous[2]
+            self._entries[key] = (sql, df, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return True
+    
+    def discard(self, sql: str, params: Sequence = None):
+        with self._lock:
+            entry = self._entries.pop(self.make_key(sql, params), None)
+            if entry:
+                self._bytes -= entry[2]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total * 100) if total > 0 else 0,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,174 @@
+import contextvars
+import threading
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+from src.config import settings
+from src.core.db import DatabaseClient
+from src.core.governor import BudgetExceeded, QueryBudget, QueryCancelled
+from src.core.llm import LLMClient
+from src.core.tracing import Trace, current_trace, span
+
+DUPLICATE_ERROR = "Same query as another attempt, write a different one"
+
+class _Search:
+    
+    def __init__(self, owner: "CandidateSearch", question: str, schema: dict, prompt_version: str,
+                 joins: Optional[List[str]], budget: QueryBudget, examples: Optional[List[Dict]] = None):
+        self.owner = owner
+        self.question = question
+        self.schema = schema
+        self.prompt_version = prompt_version
+        self.joins = joins
+        self.examples = examples
+        self.done = threading.Event()
+        limit = min(filter(None, [budget.max_time_ms, owner.max_time_ms]), default=None)
+        self.budget = budget.merge(QueryBudget(limit, cancel=self.done))
+        self.attempts: List[Dict] = []
+        self.seen: Dict[str, Optional[str]] = {}
+        self.winner: Optional[Tuple[str, pd.DataFrame, bool]] = None
+        self.last_error: Optional[Exception] = None
+        self._lock = threading.Lock()
+    
+    def chain(self, index: int, trace: Trace):
+        trace.activate()
+        temperature = None if index == 0 else self.owner.temperature
+        feedback: List[Tuple[str, str]] = []
+        for attempt in range(self.owner.retries + 1):
+            if self.done.is_set():
+                return
+            started = time.perf_counter()
+            record = {'candidate': index, 'attempt': attempt, 'sql': None, 'status': None, 'error': None}
+            try:
+                record['sql'] = self.owner.llm.generate_sql(
+                    self.question, self.schema, self.prompt_version, self.joins, feedback or None, temperature,
+                    self.examples
+                )
+                error = self._try(record)
+            except Exception as e:
+                record['status'], error = 'error', str(e)
+                self._fail(e)
+            record['error'] = error
+            record['elapsed_ms'] = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.attempts.append(record)
+            if error is None or self.done.is_set():
+                return
+            feedback.append((record['sql'], error))
+    
+    def _try(self, record: Dict) -> Optional[str]:
+        sql = record['sql']
+        if self.done.is_set():
+            record['status'] = 'cancelled'
+            return None
+        if not sql:
+            record['status'] = 'no_sql'
+            self._fail(Exception("Failed to generate SQL"))
+            return "No SQL was generated"
+        
+        key = " ".join(sql.split()).rstrip(";")
+        with self._lock:
+            duplicate = key in self.seen
+            previous = self.seen.setdefault(key, None)
+        if duplicate:
+            record['status'] = 'duplicate'
+            return previous or DUPLICATE_ERROR
+        
+        with span('check'):
+            error = self.owner.db.check_sql(sql)
+        if error is None:
+            try:
+                with span('execute') as stage:
+                    result, cache_hit = self.owner.db.execute_cached(sql, self.budget)
+                    stage['rows'] = len(result) if not isinstance(result, str) else 0
+            except QueryCancelled:
+                record['status'] = 'cancelled'
+                return None
+            except BudgetExceeded as e:
+                record['status'] = 'budget'
+                self._fail(e)
+                error = str(e)
+            else:
+                if not isinstance(result, str):
+                    return self._win(record, sql, result, cache_hit)
+                record['status'] = 'failed'
+                error = result
+        else:
+            record['status'] = 'invalid'
+        
+        with self._lock:
+            self.seen[key] = error
+        if record['status'] != 'budget':
+            self._fail(Exception(error))
+        return error
+    
+    def _win(self, record: Dict, sql: str, result: pd.DataFrame, cache_hit: bool) -> None:
+        with self._lock:
+            if self.winner is None:
+                self.winner = (sql, result, cache_hit)
+                record['status'] = 'won'
+                self.done.set()
+            else:
+                record['status'] = 'passed'
+    
+    def _fail(self, error: Exception):
+        with self._lock:
+            self.last_error = error
+
+class CandidateSearch:
+    
+    def __init__(self, llm: LLMClient, db: DatabaseClient, retries: int = None, temperature: float = None,
+                 max_time_ms: float = None):
+        self.llm = llm
+        self.db = db
+        self.retries = settings.SQL_CANDIDATE_RETRIES if retries is None else retries
+        self.temperature = settings.SQL_CANDIDATE_TEMPERATURE if temperature is None else temperature
+        self.max_time_ms = max_time_ms or settings.SQL_CANDIDATE_MAX_TIME_MS
+    
+    def fan_out(self, candidates: int) -> int:
+        # Extra candidates only spend tokens the rate limiter has to spare; retries wait for theirs
+        limiter = getattr(self.llm, 'rate_limiter', None)
+        if limiter is None:
+            return max(1, candidates)
+        return max(1, min(candidates, int(limiter.available())))
+    
+    def search(self, question: str, schema: dict, prompt_version: str = "v1", joins: List[str] = None,
+               budget: QueryBudget = None, candidates: int = None, examples: List[Dict] = None) -> Dict:
+        launched = self.fan_out(candidates or settings.SQL_CANDIDATES)
+        search = _Search(self, question, schema, prompt_version, joins, budget or QueryBudget(), examples)
+        
+        parent = current_trace()
+        traces = [Trace() for _ in range(launched)]
+        for trace in traces:
+            if parent:
+                trace.started = parent.started
+        
+        executor = ThreadPoolExecutor(max_workers=launched, thread_name_prefix="text2sql-candidate")
+        try:
+            futures = [
+                executor.submit(contextvars.copy_context().run, search.chain, index, trace)
+                for index, trace in enumerate(traces)
+            ]
+            for _ in as_completed(futures):
+                if search.done.is_set():
+                    break
+        finally:
+            # Losing candidates see the event between steps, and their running queries are interrupted
+            search.done.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        if parent:
+            for index, trace in enumerate(traces):
+                parent.spans.extend(dict(record, candidate=index) for record in list(trace.spans))
+        
+        with search._lock:
+            attempts = sorted(search.attempts, key=lambda record: (record['candidate'], record['attempt']))
+        outcome = {'launched': launched, 'attempts': attempts, 'sql': None, 'result': None,
+                   'result_cache_hit': False, 'error': None}
+        if search.winner:
+            outcome['sql'], outcome['result'], outcome['result_cache_hit'] = search.winner
+        else:
+            outcome['sql'] = next((record['sql'] for record in reversed(attempts) if record['sql']), None)
+            outcome['error'] = search.last_error or Exception("Failed to generate SQL")
+        return outcome
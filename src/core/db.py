@@ -1,55 +1,172 @@
 import sqlite3
 import pandas as pd
-from typing import Union
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple, Union
 from pathlib import Path
 from src.config import settings
+from src.core.schema import SchemaCatalog, file_token
+from src.core.pool import ConnectionPool
+from src.core.cache import ResultCache
+from src.core.stream import QueryStream
+from src.core.governor import BudgetExceeded, QueryBudget, ResourceGovernor
+from src.core.frames import RESULT_FORMATS, FrameBuilder, pa
 
 class DatabaseClient:
     
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, use_result_cache: bool = True, result_format: str = None):
         self.db_path = db_path or settings.DB_PATH
+        self.result_format = result_format or settings.RESULT_FORMAT
+        if self.result_format not in RESULT_FORMATS:
+            raise ValueError(f"Unknown result format '{self.result_format}', expected one of {', '.join(RESULT_FORMATS)}")
+        if self.result_format == "arrow" and pa is None:
+            raise ImportError("pyarrow is required for the arrow result format")
         self._validate_database()
+        self.pool = ConnectionPool(self.db_path, on_connect=self._prepare_connection)
+        self.catalog = SchemaCatalog(self.db_path, self.pool.connection)
+        self.result_cache = ResultCache() if use_result_cache else None
+        self.governor = ResourceGovernor()
     
     def _validate_database(self):
         if not Path(self.db_path).exists():
             raise FileNotFoundError(f"Database not found: {self.db_path}")
     
-    def execute_query(self, sql: str) -> Union[pd.DataFrame, str]:
+    def _prepare_connection(self, conn: sqlite3.Connection):
+        pass
+    
+    def data_version(self) -> Hashable:
+        return file_token(self.db_path)
+    
+    def data_files(self) -> List[str]:
+        return [str(self.db_path)]
+    
+    def execute_query(self, sql: str, use_cache: bool = True, budget: QueryBudget = None,
+                      params: Sequence = None) -> Union[pd.DataFrame, str]:
+        if use_cache:
+            return self.execute_cached(sql, budget, params)[0]
+        return self._run_query(sql, budget, params)
+    
+    def execute_cached(self, sql: str, budget: QueryBudget = None,
+                       params: Sequence = None) -> Tuple[Union[pd.DataFrame, str], bool]:
+        if not self.result_cache:
+            return self._run_query(sql, budget, params), False
+        
+        data_version = self.data_version()
+        cached = self.result_cache.get(sql, data_version, params)
+        if cached is not None:
+            df, source_sql = cached
+            df = df.copy(deep=False)
+            if source_sql != sql:
+                columns = self._describe_columns(sql, params)
+                if columns is None or len(columns) != len(df.columns):
+                    self.result_cache.discard(sql, params)
+                    cached = None
+                else:
+                    df.columns = columns
+            if cached is not None:
+                return df, True
+        
+        result = self._run_query(sql, budget, params)
+        if isinstance(result, pd.DataFrame):
+            self.result_cache.put(sql, data_version, result, params)
+        return result, False
+    
+    def _describe_columns(self, sql: str, params: Sequence = None) -> Optional[List[str]]:
+        inner = sql.strip().rstrip(';')
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.execute(f"SELECT * FROM ({inner}\n) LIMIT 0", params or ())
+                return [column[0] for column in cursor.description]
+        except sqlite3.Error:
+            return None
+    
+    def check_sql(self, sql: str) -> Optional[str]:
+        # EXPLAIN compiles the statement without running it, catching syntax errors and unknown names
+        if self._is_modification(sql):
+            return "Error: Modification queries are not allowed"
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(f"EXPLAIN {sql.strip().rstrip(';')}")
+        except sqlite3.Error as e:
+            return f"SQL Error: {e}"
+        return None
+    
+    def _is_modification(self, sql: str) -> bool:
         dangerous_keywords = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE']
-        if any(keyword in sql.upper() for keyword in dangerous_keywords):
+        return any(keyword in sql.upper() for keyword in dangerous_keywords)
+    
+    def iter_query(self, sql: str, chunk_size: int = None, max_rows: int = None, as_arrow: bool = False,
+                   on_close: Callable[[QueryStream], None] = None, budget: QueryBudget = None) -> QueryStream:
+        if self._is_modification(sql):
+            raise ValueError("Modification queries are not allowed")
+        
+        govern = None
+        if budget is not None and not budget.is_unlimited():
+            govern = lambda conn: self.governor.govern(conn, budget)
+        return QueryStream(
+            self.pool.connection,
+            sql,
+            chunk_size=chunk_size or settings.STREAM_CHUNK_SIZE,
+            max_rows=max_rows if max_rows is not None else settings.STREAM_MAX_ROWS,
+            as_arrow=as_arrow,
+            on_close=on_close,
+            govern=govern
+        )
+    
+    def _run_query(self, sql: str, budget: QueryBudget = None, params: Sequence = None) -> Union[pd.DataFrame, str]:
+        if self._is_modification(sql):
             return "Error: Modification queries are not allowed"
         
         try:
-            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
-            df = pd.read_sql_query(sql, conn)
-            conn.close()
-            return df
+            with self.pool.connection() as conn:
+                if budget is None or budget.is_unlimited():
+                    return self._fetch(conn.execute(sql, params or ()))
+                return self._run_governed(conn, sql, budget, params)
+        except BudgetExceeded:
+            raise
         except sqlite3.Error as e:
             return f"SQL Error: {e}"
         except Exception as e:
             return f"Execution Error: {e}"
     
+    def _run_governed(self, conn: sqlite3.Connection, sql: str, budget: QueryBudget,
+                      params: Sequence = None) -> pd.DataFrame:
+        with self.governor.govern(conn, budget) as guard:
+            return self._fetch(conn.execute(sql, params or ()), guard.check_rows)
+    
+    def _fetch(self, cursor: sqlite3.Cursor, check_rows: Callable[[int], None] = None) -> pd.DataFrame:
+        # Compact formats convert each chunk as it arrives, so the full set of raw rows never exists at once
+        builder = FrameBuilder([column[0] for column in cursor.description or []], self.result_format)
+        while True:
+            chunk = cursor.fetchmany(settings.STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            builder.add(chunk)
+            if check_rows:
+                check_rows(builder.rows)
+        return builder.build()
+    
+    def get_governor_stats(self) -> dict:
+        return self.governor.stats()
+    
     def get_schema_info(self) -> dict:
-        schema = {}
-        
         try:
-            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = [row[0] for row in cursor.fetchall()]
-            
-            for table in tables:
-                cursor.execute(f"PRAGMA table_info({table});")
-                columns = [row[1] for row in cursor.fetchall()]
-                schema[table] = columns
-            
-            conn.close()
-            return schema
+            return self.catalog.columns()
         except Exception as e:
             print(f"Schema Error: {e}")
             return {}
     
+    def get_schema_catalog(self) -> dict:
+        try:
+            return self.catalog.get()
+        except Exception as e:
+            print(f"Schema Error: {e}")
+            return {}
+    
+    def get_pool_stats(self) -> dict:
+        return self.pool.stats()
+    
+    def close(self):
+        self.pool.close()
+    
     def get_sample_data(self, table: str, n: int = 5) -> pd.DataFrame:
         sql = f"SELECT * FROM {table} LIMIT {n};"
         return self.execute_query(sql)
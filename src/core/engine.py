@@ -1,22 +1,198 @@
+import asyncio
+import contextvars
+import threading
 import pandas as pd
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple, Union
+from src.config import settings
 from src.core.llm import LLMClient
 from src.core.db import DatabaseClient
-from src.core.logger import ExperimentLogger
-from src.core.validation import validate_result
+from src.core.shards import ShardedDatabaseClient, open_database
+from src.core.logger import SEMANTIC_MODEL, ExperimentLogger
+from src.core.validation import ValidationEngine
+from src.core.cache import QueryCache, schema_fingerprint
+from src.core.stream import QueryStream
+from src.core.governor import BudgetExceeded, QueryBudget
+from src.core.planner import QueryPlanAnalyzer
+from src.core.semantic import SemanticLayer
+from src.core.retriever import SchemaRetriever
+from src.core.candidates import CandidateSearch
+from src.core.examples import ExampleIndex
+from src.core.templates import TemplateCache, render_sql
+from src.core.frames import memory_report
+from src.core.startup import StartupProfile, warm_page_cache
+from src.core.tracing import SlowRequestProfiler, Trace, record_request, span, start_metrics_server
 import time
 
+_MISSING = object()
+
+class LazyComponent:
+    
+    def __init__(self, build: Callable[["Text2SQLEngine"], Any]):
+        self.build = build
+    
+    def __set_name__(self, owner: type, name: str):
+        self.name = name
+        self.attr = f"_{name}"
+    
+    def __get__(self, engine: "Text2SQLEngine", owner: type = None) -> Any:
+        if engine is None:
+            return self
+        value = engine.__dict__.get(self.attr, _MISSING)
+        if value is _MISSING:
+            # Reentrant: building the templates or the planner builds the database first
+            with engine._components_lock:
+                value = engine.__dict__.get(self.attr, _MISSING)
+                if value is _MISSING:
+                    with engine.startup.phase(f"init:{self.name}"):
+                        value = self.build(engine)
+                    engine.__dict__[self.attr] = value
+        return value
+    
+    def __set__(self, engine: "Text2SQLEngine", value: Any):
+        engine.__dict__[self.attr] = value
+    
+    def built(self, engine: "Text2SQLEngine") -> bool:
+        return engine.__dict__.get(self.attr, _MISSING) is not _MISSING
+
 class Text2SQLEngine:
     
-    def __init__(self, prompt_version: str = "v1"):
-        self.llm = LLMClient()
-        self.db = DatabaseClient()
-        self.logger = ExperimentLogger()
+    # Each component is built on first use, so a process that only serves a few kinds of question
+    # never opens the rollup store, the example index or the Gemini client it does not need
+    llm = LazyComponent(lambda engine: LLMClient())
+    db = LazyComponent(lambda engine: open_database())
+    logger = LazyComponent(lambda engine: ExperimentLogger())
+    cache = LazyComponent(lambda engine: QueryCache() if engine.use_cache else None)
+    templates = LazyComponent(
+        lambda engine: TemplateCache(engine.db) if engine.use_cache and settings.TEMPLATE_CACHE else None
+    )
+    planner = LazyComponent(lambda engine: QueryPlanAnalyzer(engine.db) if settings.PLAN_ANALYSIS else None)
+    # Rollups read invoices straight from DB_PATH, which does not hold the sharded history
+    semantic = LazyComponent(
+        lambda engine: None if isinstance(engine.db, ShardedDatabaseClient) else SemanticLayer.from_settings(engine.db)
+    )
+    retriever = LazyComponent(lambda engine: SchemaRetriever(engine.db) if settings.SCHEMA_PRUNING else None)
+    candidates = LazyComponent(lambda engine: CandidateSearch(engine.llm, engine.db))
+    examples = LazyComponent(
+        lambda engine: ExampleIndex.from_settings(str(engine.logger.log_file)) if settings.FEW_SHOT_EXAMPLES else None
+    )
+    profiler = LazyComponent(lambda engine: SlowRequestProfiler())
+    validator = LazyComponent(lambda engine: ValidationEngine())
+    COMPONENTS = (
+        'db', 'logger', 'llm', 'cache', 'templates', 'planner', 'semantic', 'retriever', 'candidates',
+        'examples', 'profiler', 'validator'
+    )
+    
+    def __init__(self, prompt_version: str = "v1", use_cache: bool = True, llm: LLMClient = None,
+                 db: DatabaseClient = None, logger: ExperimentLogger = None, budget: QueryBudget = None):
+        self.startup = StartupProfile()
+        self._components_lock = threading.RLock()
+        if llm is not None:
+            self.llm = llm
+        if db is not None:
+            self.db = db
+        if logger is not None:
+            self.logger = logger
         self.prompt_version = prompt_version
+        self.use_cache = use_cache
+        self.budget = budget or QueryBudget.from_settings()
+        self.ready = threading.Event()
+        self._warm_up_started = False
+        self._schema_hash = None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        if settings.METRICS_PORT:
+            start_metrics_server()
     
-    def ask(self, question: str, validate: bool = True) -> Tuple[pd.DataFrame, dict]:
-        start_time = time.time()
-        metadata = {
+    def warm_up(self, background: bool = True) -> threading.Event:
+        with self._components_lock:
+            if self._warm_up_started:
+                return self.ready
+            self._warm_up_started = True
+        if background:
+            threading.Thread(target=self._warm_up, name="text2sql-warm-up", daemon=True).start()
+        else:
+            self._warm_up()
+        return self.ready
+    
+    def _warm_up(self):
+        try:
+            with self.startup.phase("warm_up"):
+                for name in self.COMPONENTS:
+                    getattr(self, name)
+                with self.startup.phase("warm_up:llm"):
+                    # Importing the Gemini SDK is the slowest part of startup; do it before the first question
+                    getattr(self.llm, 'model', None)
+                with self.startup.phase("warm_up:schema"):
+                    schema_hash = self._check_schema(self.db.get_schema_info())
+                with self.startup.phase("warm_up:page_cache"):
+                    warm_page_cache(self.db.data_files(), settings.DB_WARMUP_BYTES)
+                if self.retriever:
+                    with self.startup.phase("warm_up:retriever"):
+                        self.retriever.warm(schema_hash)
+                if self.templates:
+                    with self.startup.phase("warm_up:templates"):
+                        self.templates.parse("", schema_hash)
+                if self.semantic:
+                    with self.startup.phase("warm_up:rollups"):
+                        self.semantic.refresh()
+        except Exception as e:
+            print(f"Warm-up Error: {e}")
+        finally:
+            self.ready.set()
+    
+    def startup_report(self) -> dict:
+        report = self.startup.to_dict()
+        report['ready'] = self.ready.is_set()
+        report['components'] = [name for name in self.COMPONENTS if getattr(type(self), name).built(self)]
+        return report
+    
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        # Components that were never built have nothing to close
+        for name in ('logger', 'db'):
+            if getattr(type(self), name).built(self):
+                getattr(self, name).close()
+    
+    def _check_schema(self, schema: dict) -> str:
+        schema_hash = schema_fingerprint(schema)
+        if self.cache and self._schema_hash and schema_hash != self._schema_hash:
+            self.cache.invalidate(schema_hash=schema_hash)
+            if self.templates:
+                self.templates.invalidate(schema_hash=schema_hash)
+        self._schema_hash = schema_hash
+        return schema_hash
+    
+    def invalidate_cache(self, prompt_version: str = None) -> int:
+        if not self.cache:
+            return 0
+        if prompt_version:
+            if self.templates:
+                self.templates.invalidate(prompt_version=prompt_version)
+            return self.cache.invalidate(prompt_version=prompt_version)
+        if self.templates:
+            self.templates.clear()
+        return self.cache.clear()
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.DB_POOL_SIZE,
+                    thread_name_prefix="text2sql-db"
+                )
+            return self._executor
+    
+    def _run_in_executor(self, func, *args):
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(self.executor, context.run, func, *args)
+    
+    def _new_metadata(self, question: str, trace: Trace) -> dict:
+        return {
             'user_question': question,
             'prompt_version': self.prompt_version,
             'sql': None,
@@ -24,53 +200,408 @@ class Text2SQLEngine:
             'error': None,
             'rows': 0,
             'execution_time_ms': 0,
-            'validation_passed': True
+            'validation_passed': True,
+            'cache_hit': False,
+            'result_cache_hit': False,
+            'template_hit': False,
+            'stages': trace.spans
         }
+    
+    def _lookup(self, question: str, metadata: dict, use_cache: bool) -> Tuple[dict, str, Optional[str]]:
+        with span('schema'):
+            schema = self.db.get_schema_info()
+            schema_hash = self._check_schema(schema)
         
+        cache = self.cache if use_cache else None
+        with span('cache_lookup'):
+            sql = cache.get(question, schema_hash, self.prompt_version) if cache else None
+        metadata['cache_hit'] = sql is not None
+        return schema, schema_hash, sql
+    
+    def _find_examples(self, question: str, schema: dict, metadata: dict) -> Optional[List[dict]]:
+        if self.examples is None:
+            return None
         try:
-            schema = self.db.get_schema_info()
-            sql = self.llm.generate_sql(question, schema, self.prompt_version)
-            metadata['sql'] = sql
-            
-            if not sql:
-                raise Exception("Failed to generate SQL")
-            
-            result = self.db.execute_query(sql)
-            
-            if isinstance(result, str):
-                raise Exception(result)
-            
-            metadata['rows'] = len(result)
-            metadata['success'] = True
-            
-            if validate:
-                is_valid, error_msg = validate_result(result)
-                metadata['validation_passed'] = is_valid
-                if not is_valid:
-                    metadata['error'] = error_msg
-            
-            metadata['execution_time_ms'] = (time.time() - start_time) * 1000
-            
+            with span('examples') as stage:
+                examples = self.examples.search(question, tables=schema.keys())
+                stage['found'] = len(examples)
+        except Exception as e:
+            metadata['examples_error'] = str(e)
+            return None
+        metadata['few_shot_examples'] = len(examples)
+        return examples
+    
+    def _plan(self, question: str, schema: dict, schema_hash: str,
+              metadata: dict) -> Tuple[dict, Optional[List[str]], Optional[List[dict]]]:
+        examples = self._find_examples(question, schema, metadata)
+        schema, joins = self._prepare_schema(question, schema, schema_hash, metadata, examples)
+        return schema, joins, examples
+    
+    def _prepare_schema(self, question: str, schema: dict, schema_hash: str, metadata: dict,
+                        examples: List[dict] = None) -> Tuple[dict, Optional[List[str]]]:
+        full_tokens = self.llm.prompt_tokens(question, schema, self.prompt_version, examples=examples)
+        metadata['prompt_tokens_full'] = full_tokens
+        metadata['prompt_tokens'] = full_tokens
+        if not self.retriever:
+            return schema, None
+        
+        try:
+            with span('schema_pruning'):
+                context = self.retriever.retrieve(question, schema_hash)
+        except Exception as e:
+            metadata['schema_pruning_error'] = str(e)
+            return schema, None
+        if not context['pruned']:
+            return schema, context['joins']
+        
+        metadata['schema_tables'] = list(context['schema'])
+        metadata['prompt_tokens'] = self.llm.prompt_tokens(
+            question, context['schema'], self.prompt_version, context['joins'], examples
+        )
+        return context['schema'], context['joins']
+    
+    def _execute(self, question: str, sql: Optional[str], schema_hash: str, metadata: dict,
+                 validate: bool, use_cache: bool, budget: QueryBudget = None) -> pd.DataFrame:
+        cache = self.cache if use_cache else None
+        metadata['sql'] = sql
+        
+        if not sql:
+            raise Exception("Failed to generate SQL")
+        
+        if self.planner:
+            with span('plan'):
+                metadata['plan'] = self._analyze_plan(sql)
+        
+        with span('execute') as stage:
+            result, metadata['result_cache_hit'] = self.db.execute_cached(sql, self.budget.merge(budget))
+            stage['rows'] = len(result) if not isinstance(result, str) else 0
+            stage['result_cache_hit'] = metadata['result_cache_hit']
+        
+        if isinstance(result, str):
+            if metadata['cache_hit']:
+                cache.discard(question, schema_hash, self.prompt_version)
+            raise Exception(result)
+        
+        return self._accept(question, sql, result, schema_hash, metadata, validate, cache)
+    
+    def _accept(self, question: str, sql: str, result: pd.DataFrame, schema_hash: str, metadata: dict,
+                validate: bool, cache: Optional[QueryCache]) -> pd.DataFrame:
+        metadata['rows'] = len(result)
+        metadata['success'] = True
+        memory = memory_report(result)
+        if memory is not None:
+            metadata['memory'] = dict(memory, cached=metadata['result_cache_hit'])
+        self._validate(result, metadata, validate)
+        # SQL whose result failed validation is not reused for the next asker
+        if cache and metadata['validation_passed'] and not metadata['cache_hit']:
+            cache.put(question, schema_hash, self.prompt_version, sql)
+        elif cache and metadata['cache_hit'] and not metadata['validation_passed']:
+            cache.discard(question, schema_hash, self.prompt_version)
+        if self.examples is not None and metadata['validation_passed']:
+            self.examples.add(question, sql)
+        if cache and self.templates and metadata['validation_passed'] and not (metadata['cache_hit'] or metadata['template_hit']):
+            self._learn_template(question, sql, schema_hash, metadata)
+        return result
+    
+    def _learn_template(self, question: str, sql: str, schema_hash: str, metadata: dict):
+        try:
+            self.templates.learn(question, sql, schema_hash, self.prompt_version)
+        except Exception as e:
+            metadata['template_error'] = str(e)
+    
+    def _answer_from_template(self, question: str, schema_hash: str, metadata: dict, validate: bool,
+                              use_cache: bool, budget: QueryBudget = None) -> Optional[pd.DataFrame]:
+        if not use_cache or not self.templates:
+            return None
+        
+        try:
+            with span('template') as stage:
+                match = self.templates.match(question, schema_hash, self.prompt_version)
+                stage['matched'] = match is not None
+        except Exception as e:
+            metadata['template_error'] = str(e)
+            return None
+        if match is None:
+            return None
+        
+        template, sql, params = match
+        with span('execute') as stage:
+            result, metadata['result_cache_hit'] = self.db.execute_cached(sql, self.budget.merge(budget), params)
+            stage['rows'] = len(result) if not isinstance(result, str) else 0
+            stage['result_cache_hit'] = metadata['result_cache_hit']
+        if isinstance(result, str):
+            # The template no longer fits these literals; the LLM answers instead
+            self.templates.discard(template, schema_hash, self.prompt_version)
+            metadata['template_error'] = result
+            metadata['result_cache_hit'] = False
+            return None
+        
+        sql = render_sql(sql, params)
+        metadata['sql'] = sql
+        metadata['template'] = template
+        metadata['template_hit'] = True
+        if self.planner:
+            with span('plan'):
+                metadata['plan'] = self._analyze_plan(sql)
+        return self._accept(question, sql, result, schema_hash, metadata, validate, self.cache)
+    
+    def _search_candidates(self, question: str, schema: dict, joins: Optional[List[str]], schema_hash: str,
+                           metadata: dict, validate: bool, use_cache: bool, budget: QueryBudget,
+                           candidates: int, examples: List[dict] = None) -> pd.DataFrame:
+        with span('candidates') as stage:
+            outcome = self.candidates.search(
+                question, schema, self.prompt_version, joins, self.budget.merge(budget), candidates, examples
+            )
+            stage['launched'] = outcome['launched']
+            stage['attempts'] = len(outcome['attempts'])
+        metadata['sql'] = outcome['sql']
+        metadata['candidates'] = outcome['attempts']
+        if outcome['result'] is None:
+            raise outcome['error']
+        
+        if self.planner:
+            with span('plan'):
+                metadata['plan'] = self._analyze_plan(outcome['sql'])
+        metadata['result_cache_hit'] = outcome['result_cache_hit']
+        cache = self.cache if use_cache else None
+        return self._accept(question, outcome['sql'], outcome['result'], schema_hash, metadata, validate, cache)
+    
+    def _validate(self, result: pd.DataFrame, metadata: dict, validate: bool):
+        if validate:
+            with span('validate'):
+                is_valid, error_msg = self.validator.check(result)
+            metadata['validation_passed'] = is_valid
+            if not is_valid:
+                metadata['error'] = error_msg
+    
+    def _answer_from_rollup(self, question: str, metadata: dict, validate: bool, use_cache: bool,
+                            budget: QueryBudget = None) -> Optional[pd.DataFrame]:
+        if not self.semantic or not use_cache:
+            return None
+        
+        try:
+            with span('rollup') as stage:
+                answer = self.semantic.answer(question, self.budget.merge(budget))
+                stage['matched'] = answer is not None
+        except Exception as e:
+            metadata['semantic_error'] = str(e)
+            return None
+        if answer is None:
+            return None
+        
+        sql, result, plan = answer
+        metadata['sql'] = sql
+        metadata['semantic'] = plan
+        metadata['rows'] = len(result)
+        metadata['success'] = True
+        self._validate(result, metadata, validate)
+        return result
+    
+    def _analyze_plan(self, sql: str) -> Optional[dict]:
+        try:
+            return self.planner.summarize(sql)
+        except Exception as e:
+            return {'classification': 'unknown', 'estimated_cost': None, 'warnings': [f"Plan Error: {e}"]}
+    
+    def _model_name(self, metadata: dict) -> str:
+        return SEMANTIC_MODEL if metadata.get('semantic') else self.llm.model_name
+    
+    def _finish(self, result: pd.DataFrame, metadata: dict, start_time: float) -> Tuple[pd.DataFrame, dict]:
+        metadata['execution_time_ms'] = (time.time() - start_time) * 1000
+        self._add_cache_stats(metadata)
+        
+        with span('log'):
             self.logger.log_experiment({
                 **metadata,
+                'model': self._model_name(metadata),
                 'execution_success': metadata['success']
             })
-            
-            return result, metadata
-            
-        except Exception as e:
-            metadata['error'] = str(e)
-            metadata['execution_time_ms'] = (time.time() - start_time) * 1000
-            
+        record_request(metadata)
+        
+        return result, metadata
+    
+    def _fail(self, error: Exception, metadata: dict, start_time: float) -> Tuple[pd.DataFrame, dict]:
+        metadata['error'] = str(error)
+        if isinstance(error, BudgetExceeded):
+            metadata['budget_exceeded'] = error.to_dict()
+        metadata['execution_time_ms'] = (time.time() - start_time) * 1000
+        self._add_cache_stats(metadata)
+        
+        with span('log'):
             self.logger.log_experiment({
                 **metadata,
+                'model': self._model_name(metadata),
                 'execution_success': False
             })
+        record_request(metadata)
+        
+        return pd.DataFrame(), metadata
+    
+    def _open_stream(self, question: str, sql: Optional[str], schema_hash: str, metadata: dict,
+                     use_cache: bool, start_time: float, chunk_size: int = None, max_rows: int = None,
+                     budget: QueryBudget = None) -> QueryStream:
+        cache = self.cache if use_cache else None
+        metadata['sql'] = sql
+        metadata['streaming'] = True
+        
+        if not sql:
+            raise Exception("Failed to generate SQL")
+        
+        def on_close(stream: QueryStream):
+            metadata['rows'] = stream.rows_read
+            metadata['truncated'] = stream.truncated
+            if stream.error:
+                metadata['success'] = False
+                metadata['error'] = stream.error
+                if stream.guard and stream.guard.violation:
+                    metadata['budget_exceeded'] = stream.guard.violation.to_dict()
+            elif cache and not metadata['cache_hit']:
+                # Cached only once every row streamed without an error
+                cache.put(question, schema_hash, self.prompt_version, sql)
+            self._finish(None, metadata, start_time)
+        
+        try:
+            stream = self.db.iter_query(
+                sql, chunk_size=chunk_size, max_rows=max_rows, on_close=on_close, budget=self.budget.merge(budget)
+            )
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            if metadata['cache_hit']:
+                cache.discard(question, schema_hash, self.prompt_version)
+            raise Exception(f"SQL Error: {e}")
+        
+        metadata['success'] = True
+        return stream
+    
+    def ask(self, question: str, validate: bool = True, use_cache: bool = True, stream: bool = False,
+            chunk_size: int = None, max_rows: int = None, budget: QueryBudget = None,
+            candidates: int = None) -> Tuple[Union[pd.DataFrame, QueryStream], dict]:
+        start_time = time.time()
+        trace = Trace().activate()
+        metadata = self._new_metadata(question, trace)
+        
+        try:
+            with self.profiler.profile(metadata):
+                return self._ask(question, metadata, start_time, validate, use_cache, stream,
+                                 chunk_size, max_rows, budget, candidates or settings.SQL_CANDIDATES)
+        finally:
+            trace.deactivate()
+    
+    def _ask(self, question: str, metadata: dict, start_time: float, validate: bool, use_cache: bool,
+             stream: bool, chunk_size: int, max_rows: int, budget: QueryBudget,
+             candidates: int) -> Tuple[Union[pd.DataFrame, QueryStream], dict]:
+        try:
+            if not stream:
+                result = self._answer_from_rollup(question, metadata, validate, use_cache, budget)
+                if result is not None:
+                    return self._finish(result, metadata, start_time)
+            
+            schema, schema_hash, sql = self._lookup(question, metadata, use_cache)
+            if sql is None and not stream:
+                result = self._answer_from_template(question, schema_hash, metadata, validate, use_cache, budget)
+                if result is not None:
+                    return self._finish(result, metadata, start_time)
+            if sql is None:
+                schema, joins, examples = self._plan(question, schema, schema_hash, metadata)
+                if candidates > 1 and not stream:
+                    result = self._search_candidates(
+                        question, schema, joins, schema_hash, metadata, validate, use_cache, budget, candidates,
+                        examples
+                    )
+                    return self._finish(result, metadata, start_time)
+                sql = self.llm.generate_sql(question, schema, self.prompt_version, joins, examples=examples)
+            
+            if stream:
+                result = self._open_stream(
+                    question, sql, schema_hash, metadata, use_cache, start_time, chunk_size, max_rows, budget
+                )
+                return result, metadata
+            
+            result = self._execute(question, sql, schema_hash, metadata, validate, use_cache, budget)
+            return self._finish(result, metadata, start_time)
+        
+        except Exception as e:
+            return self._fail(e, metadata, start_time)
+    
+    async def ask_async(self, question: str, validate: bool = True, use_cache: bool = True,
+                        budget: QueryBudget = None, candidates: int = None) -> Tuple[pd.DataFrame, dict]:
+        start_time = time.time()
+        trace = Trace().activate()
+        metadata = self._new_metadata(question, trace)
+        
+        try:
+            result = await self._run_in_executor(
+                self._answer_from_rollup, question, metadata, validate, use_cache, budget
+            )
+            if result is not None:
+                return self._finish(result, metadata, start_time)
+            
+            schema, schema_hash, sql = await self._run_in_executor(self._lookup, question, metadata, use_cache)
+            if sql is None:
+                result = await self._run_in_executor(
+                    self._answer_from_template, question, schema_hash, metadata, validate, use_cache, budget
+                )
+                if result is not None:
+                    return self._finish(result, metadata, start_time)
+                schema, joins, examples = await self._run_in_executor(
+                    self._plan, question, schema, schema_hash, metadata
+                )
+                candidates = candidates or settings.SQL_CANDIDATES
+                if candidates > 1:
+                    result = await self._run_in_executor(
+                        self._search_candidates, question, schema, joins, schema_hash, metadata,
+                        validate, use_cache, budget, candidates, examples
+                    )
+                    return self._finish(result, metadata, start_time)
+                sql = await self.llm.generate_sql_async(
+                    question, schema, self.prompt_version, joins, examples=examples
+                )
             
-            return pd.DataFrame(), metadata
+            result = await self._run_in_executor(
+                self._execute, question, sql, schema_hash, metadata, validate, use_cache, budget
+            )
+            return self._finish(result, metadata, start_time)
+        
+        except Exception as e:
+            return self._fail(e, metadata, start_time)
+        finally:
+            trace.deactivate()
+    
+    async def ask_many_async(self, questions: List[str], concurrency: int = 4, validate: bool = True,
+                             use_cache: bool = True, budget: QueryBudget = None) -> List[Tuple[pd.DataFrame, dict]]:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def run(question: str) -> Tuple[pd.DataFrame, dict]:
+            async with semaphore:
+                return await self.ask_async(question, validate=validate, use_cache=use_cache, budget=budget)
+        
+        return await asyncio.gather(*(run(question) for question in questions))
+    
+    def ask_many(self, questions: List[str], concurrency: int = 4, validate: bool = True,
+                 use_cache: bool = True, budget: QueryBudget = None) -> List[Tuple[pd.DataFrame, dict]]:
+        return asyncio.run(self.ask_many_async(questions, concurrency, validate, use_cache, budget))
+    
+    def _add_cache_stats(self, metadata: dict):
+        if self.cache:
+            metadata['cache_hits'] = self.cache.hits
+            metadata['cache_misses'] = self.cache.misses
+        if self.db.result_cache:
+            metadata['result_cache_hits'] = self.db.result_cache.hits
+            metadata['result_cache_misses'] = self.db.result_cache.misses
+        if self.semantic:
+            metadata['rollup_hits'] = self.semantic.hits
+            metadata['rollup_misses'] = self.semantic.misses
+        if self.templates:
+            metadata['template_hits'] = self.templates.hits
+            metadata['template_misses'] = self.templates.misses
     
     def get_schema(self) -> dict:
         return self.db.get_schema_info()
     
     def get_performance_stats(self) -> dict:
-        return self.logger.get_stats()
+        stats = self.logger.get_stats()
+        if self.templates:
+            stats['templates'] = self.templates.stats()
+            stats['template_hit_rate'] = stats['templates']['hit_rate']
+        return stats
@@ -0,0 +1,263 @@
+import argparse
+import atexit
+import json
+import re
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.config import settings
+from src.core.cache import normalize_question
+from src.core.lexical import BM25Index, tokenize
+from src.core.logger import SEMANTIC_MODEL, read_log_tail
+
+SNAPSHOT_VERSION = 2
+TABLE_REF = re.compile(r'\b(?:FROM|JOIN)\s+["`\[]?([A-Za-z_]\w*)', re.IGNORECASE)
+
+def referenced_tables(sql: str) -> List[str]:
+    return sorted({name.lower() for name in TABLE_REF.findall(sql)})
+
+def validated(row: Dict) -> bool:
+    # Logs written before validation_passed was a column: a successful row carrying an error failed validation
+    passed = row.get('validation_passed')
+    if passed is None:
+        return not row.get('error')
+    return passed.strip().lower() == "true"
+
+def snapshot_path_for(log_file: str) -> Path:
+    log_file = Path(log_file)
+    return log_file.with_name(f"{log_file.stem}_examples.json")
+
+class ExampleIndex:
+    
+    def __init__(self, log_file: str = None, snapshot_path: str = None, recompile_every: int = None):
+        self.log_file = Path(log_file or settings.LOG_FILE)
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else snapshot_path_for(self.log_file)
+        self.recompile_every = recompile_every or settings.FEW_SHOT_RECOMPILE_EVERY
+        self._lock = threading.Lock()
+        self._reset()
+        self.lookups = 0
+        self.hits = 0
+        atexit.register(self.save)
+    
+    def _reset(self):
+        self.index = BM25Index()
+        self.examples: List[Dict] = []
+        self._by_question: Dict[str, int] = {}
+        self._log_offset = 0
+        self._compiled: Optional[Dict] = None
+        self._pending: List[int] = []
+        self._dirty = False
+    
+    @classmethod
+    def from_settings(cls, log_file: str = None) -> "ExampleIndex":
+        index = cls(log_file=log_file)
+        index.load()
+        return index
+    
+    def __len__(self) -> int:
+        return len(self.examples)
+    
+    def add(self, question: str, sql: str) -> bool:
+        key = normalize_question(question)
+        sql = (sql or "").strip()
+        if not key or not sql:
+            return False
+        
+        with self._lock:
+            doc_id = self._by_question.get(key)
+            if doc_id is not None:
+                # The latest working SQL for a question replaces the older one; its terms are unchanged
+                changed = self.examples[doc_id]['sql'] != sql
+                self.examples[doc_id].update(sql=sql, tables=referenced_tables(sql))
+                self._dirty = self._dirty or changed
+                return changed
+            
+            doc_id = len(self.examples)
+            self.examples.append({'question': question, 'sql': sql, 'tables': referenced_tables(sql)})
+            self._by_question[key] = doc_id
+            self.index.add(doc_id, tokenize(question))
+            self._pending.append(doc_id)
+            self._dirty = True
+            if len(self._pending) >= self.recompile_every:
+                self._compiled = None
+        return True
+    
+    def _compile(self) -> Dict:
+        # BM25 term weights only depend on corpus statistics, so they are computed once per
+        # term and a lookup is a handful of vectorised adds over the matching documents
+        count = len(self.examples)
+        lengths = np.zeros(count, dtype=np.float64)
+        for doc_id, length in self.index.lengths.items():
+            lengths[doc_id] = length
+        average = lengths.mean() if count and lengths.mean() else 1.0
+        norms = self.index.k1 * (1 - self.index.b + self.index.b * lengths / average)
+        
+        postings = {}
+        for term, docs in self.index.postings.items():
+            ids = np.fromiter(docs.keys(), dtype=np.intp, count=len(docs))
+            tf = np.fromiter(docs.values(), dtype=np.float64, count=len(docs))
+            postings[term] = (ids, self.index.idf(term) * tf * (self.index.k1 + 1) / (tf + norms[ids]))
+        self._pending = []
+        return {'size': count, 'average': average, 'postings': postings}
+    
+    def _score_pending(self, terms: Iterable[str], compiled: Dict) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        k1, b = self.index.k1, self.index.b
+        for doc_id in self._pending:
+            counts = self.index.documents[doc_id]
+            norm = k1 * (1 - b + b * self.index.lengths[doc_id] / compiled['average'])
+            score = sum(
+                self.index.idf(term) * counts[term] * (k1 + 1) / (counts[term] + norm)
+                for term in terms if term in counts
+            )
+            if score > 0:
+                scores[doc_id] = score
+        return scores
+    
+    def search(self, question: str, top_k: int = None, tables: Iterable[str] = None) -> List[Dict]:
+        top_k = settings.FEW_SHOT_EXAMPLES if top_k is None else top_k
+        terms = set(tokenize(question))
+        allowed = {table.lower() for table in tables} if tables is not None else None
+        if not terms or top_k <= 0:
+            return []
+        
+        with self._lock:
+            self.lookups += 1
+            if not self.examples:
+                return []
+            if self._compiled is None:
+                self._compiled = self._compile()
+            compiled = self._compiled
+            
+            scores = np.zeros(compiled['size'], dtype=np.float64)
+            for term in terms:
+                posting = compiled['postings'].get(term)
+                if posting is not None:
+                    scores[posting[0]] += posting[1]
+            pending = self._score_pending(terms, compiled)
+            
+            # Over-fetch so examples over tables missing from the schema can be dropped
+            wanted = min(len(scores), top_k * 4)
+            best = np.argpartition(-scores, wanted - 1)[:wanted] if wanted else np.array([], dtype=np.intp)
+            ranked = sorted(
+                [(int(doc_id), float(scores[doc_id])) for doc_id in best if scores[doc_id] > 0] + list(pending.items()),
+                key=lambda item: item[1], reverse=True
+            )
+            
+            results, seen_sql = [], set()
+            for doc_id, score in ranked:
+                example = self.examples[doc_id]
+                if allowed is not None and not set(example['tables']) <= allowed:
+                    continue
+                # Questions that differ only in a literal tend to share SQL; one copy is enough for the prompt
+                sql_key = " ".join(example['sql'].split())
+                if sql_key in seen_sql:
+                    continue
+                seen_sql.add(sql_key)
+                results.append({'question': example['question'], 'sql': example['sql'], 'score': score})
+                if len(results) == top_k:
+                    break
+            if results:
+                self.hits += 1
+            return results
+    
+    def _read_log(self) -> List[Tuple[str, str]]:
+        rows, self._log_offset, _ = read_log_tail(self.log_file, self._log_offset)
+        pairs = []
+        for row in rows:
+            if row.get('model') == SEMANTIC_MODEL:
+                # Rollup answers query the sidecar rollup database, not the schema the prompt describes
+                continue
+            if str(row.get('execution_success')).strip().lower() == "true" and row.get('sql') and validated(row):
+                pairs.append((row.get('user_question') or "", row['sql']))
+        return pairs
+    
+    def refresh(self) -> int:
+        offset = self._log_offset
+        try:
+            pairs = self._read_log()
+        except Exception as e:
+            print(f"Example Index Error: {e}")
+            return 0
+        self._dirty = self._dirty or self._log_offset != offset
+        return sum(1 for question, sql in pairs if self.add(question, sql))
+    
+    def load(self) -> int:
+        try:
+            data = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            if data.get('version') != SNAPSHOT_VERSION or data.get('log_file') != str(self.log_file):
+                raise ValueError("snapshot does not match this log")
+            with self._lock:
+                self.examples = [
+                    {'question': question, 'sql': sql, 'tables': tables} for question, sql, tables in data['examples']
+                ]
+                self._by_question = {normalize_question(example['question']): doc_id
+                                     for doc_id, example in enumerate(self.examples)}
+                self.index = BM25Index.from_dict(data['index'])
+                self._log_offset = data['log_offset']
+                self._compiled = None
+                self._pending = []
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Example Snapshot Error: {e}")
+            with self._lock:
+                self._reset()
+        self.refresh()
+        return len(self.examples)
+    
+    def save(self) -> bool:
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = {
+                'version': SNAPSHOT_VERSION,
+                'log_file': str(self.log_file),
+                'log_offset': self._log_offset,
+                'examples': [[example['question'], example['sql'], example['tables']] for example in self.examples],
+                'index': self.index.to_dict()
+            }
+            self._dirty = False
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.snapshot_path.with_suffix(".tmp")
+            temp_path.write_text(json.dumps(data), encoding="utf-8")
+            temp_path.replace(self.snapshot_path)
+        except Exception as e:
+            print(f"Example Snapshot Error: {e}")
+            return False
+        return True
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'examples': len(self.examples),
+                'pending': len(self._pending),
+                'lookups': self.lookups,
+                'hits': self.hits
+            }
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Build the few-shot example index from the experiment log")
+    parser.add_argument("--log-file", default=settings.LOG_FILE)
+    parser.add_argument("--snapshot", default=None, help="Defaults to <log>_examples.json next to the log")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the existing snapshot")
+    parser.add_argument("--query", default=None, help="Show the examples retrieved for a question")
+    args = parser.parse_args(argv)
+    
+    index = ExampleIndex(log_file=args.log_file, snapshot_path=args.snapshot)
+    if not args.rebuild:
+        index.load()
+    else:
+        index.refresh()
+    index.save()
+    print(f"{len(index)} examples indexed from {args.log_file}, snapshot at {index.snapshot_path}")
+    
+    if args.query:
+        for example in index.search(args.query):
+            print(f"[{example['score']:.2f}] {example['question']}\n    {example['sql']}")
+    return index
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from src.config import settings
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+RESULT_FORMATS = ("default", "compact", "arrow")
+CATEGORY_MAX_RATIO = 0.5
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def memory_report(df: pd.DataFrame) -> Optional[Dict]:
+    return df.attrs.get('memory') if isinstance(df, pd.DataFrame) else None
+
+def is_text(series: pd.Series) -> bool:
+    return series.dtype == object or isinstance(series.dtype, pd.StringDtype)
+
+def downcast_numeric(series: pd.Series) -> pd.Series:
+    kind = series.dtype.kind if isinstance(series.dtype, np.dtype) else None
+    if kind in ('i', 'u'):
+        return pd.to_numeric(series, downcast='integer' if kind == 'i' else 'unsigned')
+    if kind == 'f' and series.dtype.itemsize > 4:
+        narrow = series.to_numpy().astype(np.float32)
+        # Only when every value survives the round trip; money columns usually do not
+        if np.array_equal(narrow.astype(np.float64), series.to_numpy(), equal_nan=True):
+            return pd.Series(narrow, index=series.index, name=series.name)
+    return series
+
+def compact_frame(df: pd.DataFrame, result_format: str, categorical: Dict[int, bool] = None) -> pd.DataFrame:
+    if result_format == "default":
+        return df
+    
+    # Columns go by position; SQL results may repeat a name
+    columns = {}
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        if not series.notna().any():
+            columns[position] = series
+        elif not is_text(series):
+            columns[position] = downcast_numeric(series)
+        elif (categorical or {}).get(position, series.nunique() <= CATEGORY_MAX_RATIO * len(series)):
+            # Regions, categories and company names repeat; each row then holds a small integer code
+            columns[position] = series.astype("category")
+        elif (result_format == "arrow" and pa is not None and not isinstance(series.dtype, pd.StringDtype)
+              and pd.api.types.infer_dtype(series, skipna=True) == "string"):
+            columns[position] = series.astype(pd.StringDtype("pyarrow"))
+        else:
+            columns[position] = series
+    compact = pd.DataFrame(columns, index=df.index)
+    compact.columns = df.columns
+    return compact
+
+class FrameBuilder:
+    
+    def __init__(self, columns: List[str], result_format: str = None):
+        self.columns = columns
+        self.result_format = result_format or settings.RESULT_FORMAT
+        self.frames: List[pd.DataFrame] = []
+        self._records: List[tuple] = []
+        self.rows = 0
+        self.bytes = 0
+        self.raw_bytes = 0
+        self.peak_bytes = 0
+        self._categorical: Dict[int, bool] = {}
+    
+    def add(self, records: List[tuple]):
+        if self.result_format == "default":
+            # One frame from every row, exactly as before; dtypes are inferred over the whole result
+            self._records.extend(records)
+        else:
+            self.add_frame(pd.DataFrame.from_records(records, columns=self.columns, coerce_float=True))
+        self.rows += len(records)
+    
+    def add_frame(self, raw: pd.DataFrame):
+        raw_bytes = frame_bytes(raw)
+        frame = compact_frame(raw, self.result_format, self._categorical)
+        # Decided on the first chunk with values so every chunk of a column gets the same kind of dtype
+        for position, dtype in enumerate(frame.dtypes):
+            if position not in self._categorical and frame.iloc[:, position].notna().any():
+                self._categorical[position] = isinstance(dtype, pd.CategoricalDtype)
+        size = frame_bytes(frame) if frame is not raw else 0
+        # The raw chunk and its compact copy are alive together, next to everything built so far
+        self.peak_bytes = max(self.peak_bytes, self.bytes + raw_bytes + size)
+        self.bytes += size or raw_bytes
+        self.raw_bytes += raw_bytes
+        self.frames.append(frame)
+    
+    def _align(self):
+        for position in range(len(self.columns)):
+            series = [frame.iloc[:, position] for frame in self.frames]
+            present = [part for part in series if part.notna().any()]
+            if not present or len({part.dtype for part in series}) == 1:
+                continue
+            if len({part.dtype for part in present}) == 1:
+                dtype = present[0].dtype
+            elif all(isinstance(part.dtype, pd.CategoricalDtype) for part in present):
+                categories = present[0].cat.categories
+                for part in present[1:]:
+                    categories = categories.union(part.cat.categories)
+                dtype = pd.CategoricalDtype(categories)
+            elif all(isinstance(part.dtype, np.dtype) and part.dtype.kind in "iuf" for part in present):
+                dtype = np.result_type(*[part.dtype for part in present])
+            else:
+                continue
+            if len(present) < len(series) and isinstance(dtype, np.dtype) and dtype.kind in "iu":
+                # All-null chunks hold NaN, which integers cannot
+                dtype = np.dtype(np.float64)
+            for frame in self.frames:
+                if frame.iloc[:, position].dtype != dtype:
+                    frame.isetitem(position, frame.iloc[:, position].astype(dtype))
+    
+    def build(self) -> pd.DataFrame:
+        if self._records:
+            self.add_frame(pd.DataFrame.from_records(self._records, columns=self.columns, coerce_float=True))
+            self._records = []
+        if not self.frames:
+            df = pd.DataFrame.from_records([], columns=self.columns)
+        elif len(self.frames) == 1:
+            df = self.frames[0]
+        else:
+            # Chunks see different categories and ranges; aligned dtypes keep concat from widening to object
+            self._align()
+            df = pd.concat(self.frames, ignore_index=True)
+            self.peak_bytes = max(self.peak_bytes, self.bytes + frame_bytes(df))
+        self.frames = []
+        
+        df.attrs['memory'] = {
+            'format': self.result_format,
+            'rows': len(df),
+            'bytes': frame_bytes(df),
+            'raw_bytes': self.raw_bytes,
+            'peak_bytes': self.peak_bytes
+        }
+        return df
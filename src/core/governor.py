@@ -0,0 +1,156 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from src.config import settings
+
+PROGRESS_INTERVAL = 1000
+
+class QueryBudget:
+    
+    def __init__(self, max_time_ms: float = None, max_vm_steps: int = None, max_rows: int = None,
+                 cancel: threading.Event = None):
+        # None leaves a limit to the budget this one is merged into; 0 lifts it
+        self.max_time_ms = max_time_ms
+        self.max_vm_steps = max_vm_steps
+        self.max_rows = max_rows
+        self.cancel = cancel
+    
+    def __getstate__(self) -> Dict:
+        # Events cannot cross process boundaries; shard workers run without cancellation
+        return {**self.__dict__, 'cancel': None}
+    
+    @classmethod
+    def from_settings(cls) -> "QueryBudget":
+        return cls(settings.QUERY_MAX_TIME_MS, settings.QUERY_MAX_VM_STEPS, settings.QUERY_MAX_ROWS)
+    
+    def merge(self, override: Optional["QueryBudget"]) -> "QueryBudget":
+        if override is None:
+            return self
+        def pick(limit, default):
+            return default if limit is None else limit
+        
+        return QueryBudget(
+            pick(override.max_time_ms, self.max_time_ms),
+            pick(override.max_vm_steps, self.max_vm_steps),
+            pick(override.max_rows, self.max_rows),
+            override.cancel or self.cancel
+        )
+    
+    def is_cancelled(self) -> bool:
+        return self.cancel is not None and self.cancel.is_set()
+    
+    def is_unlimited(self) -> bool:
+        return not (self.max_time_ms or self.max_vm_steps or self.max_rows or self.cancel)
+    
+    def to_dict(self) -> Dict:
+        return {
+            'max_time_ms': self.max_time_ms,
+            'max_vm_steps': self.max_vm_steps,
+            'max_rows': self.max_rows
+        }
+
+class BudgetExceeded(Exception):
+    
+    def __init__(self, kind: str, limit: float, used: float):
+        self.kind = kind
+        self.limit = limit
+        self.used = used
+        super().__init__(f"Budget Exceeded: {kind} limit {limit} reached (used {used:.0f})")
+    
+    def to_dict(self) -> Dict:
+        return {
+            'kind': self.kind,
+            'limit': self.limit,
+            'used': self.used,
+            'message': str(self)
+        }
+
+class QueryCancelled(BudgetExceeded):
+    
+    def __init__(self, used: float):
+        self.kind = 'cancelled'
+        self.limit = 0
+        self.used = used
+        Exception.__init__(self, f"Query Cancelled after {used:.0f}ms")
+
+class QueryGuard:
+    
+    def __init__(self, budget: QueryBudget):
+        self.budget = budget
+        self.started = time.perf_counter()
+        self.deadline = self.started + budget.max_time_ms / 1000 if budget.max_time_ms else None
+        self.vm_steps = 0
+        self.rows = 0
+        self.violation: Optional[BudgetExceeded] = None
+    
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+    
+    def on_progress(self) -> int:
+        self.vm_steps += PROGRESS_INTERVAL
+        if self.budget.is_cancelled():
+            self.violation = QueryCancelled(self.elapsed_ms())
+            return 1
+        if self.budget.max_vm_steps and self.vm_steps > self.budget.max_vm_steps:
+            self.violation = BudgetExceeded('vm_steps', self.budget.max_vm_steps, self.vm_steps)
+            return 1
+        if self.deadline and time.perf_counter() > self.deadline:
+            self.violation = BudgetExceeded('time_ms', self.budget.max_time_ms, self.elapsed_ms())
+            return 1
+        return 0
+    
+    def check_rows(self, rows: int):
+        self.rows = rows
+        if self.budget.max_rows and rows > self.budget.max_rows:
+            self.violation = BudgetExceeded('rows', self.budget.max_rows, rows)
+            raise self.violation
+
+class ResourceGovernor:
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            'queries': 0,
+            'killed': 0,
+            'killed_time_ms': 0,
+            'killed_vm_steps': 0,
+            'killed_rows': 0,
+            'cancelled': 0
+        }
+    
+    @contextmanager
+    def govern(self, conn: sqlite3.Connection, budget: QueryBudget) -> Iterator[QueryGuard]:
+        guard = QueryGuard(budget)
+        
+        # The progress handler checks the deadline every PROGRESS_INTERVAL steps, so no timer thread is needed
+        if budget.max_time_ms or budget.max_vm_steps or budget.cancel:
+            conn.set_progress_handler(guard.on_progress, PROGRESS_INTERVAL)
+        
+        with self._lock:
+            self._stats['queries'] += 1
+        
+        try:
+            yield guard
+        except Exception as e:
+            if guard.violation is None:
+                raise
+            self._record_kill(guard.violation)
+            if e is guard.violation:
+                raise
+            raise guard.violation from e
+        finally:
+            conn.set_progress_handler(None, PROGRESS_INTERVAL)
+    
+    def _record_kill(self, violation: BudgetExceeded):
+        with self._lock:
+            if isinstance(violation, QueryCancelled):
+                self._stats['cancelled'] += 1
+                return
+            self._stats['killed'] += 1
+            self._stats[f'killed_{violation.kind}'] += 1
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,99 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, Iterable, List, Tuple, Union
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'in', 'is', 'it', 'me', 'of',
+    'on', 'or', 'show', 'that', 'the', 'their', 'to', 'was', 'what', 'which', 'with', 'who'
+}
+
+def stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+def tokenize(text: str) -> List[str]:
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    return [stem(token) for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: Dict[Hashable, Dict[str, int]] = {}
+        self.lengths: Dict[Hashable, int] = {}
+        self.postings: Dict[str, Dict[Hashable, int]] = defaultdict(dict)
+        self.total_length = 0
+    
+    def __len__(self) -> int:
+        return len(self.lengths)
+    
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self.lengths
+    
+    def add(self, doc_id: Hashable, document: Union[str, Iterable[str]]):
+        tokens = tokenize(document) if isinstance(document, str) else list(document)
+        if doc_id in self.lengths:
+            self.remove(doc_id)
+        
+        counts = dict(Counter(tokens))
+        for term, count in counts.items():
+            self.postings[term][doc_id] = count
+        self.documents[doc_id] = counts
+        self.lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+    
+    def remove(self, doc_id: Hashable):
+        if doc_id not in self.lengths:
+            return
+        for term in self.documents.pop(doc_id):
+            del self.postings[term][doc_id]
+            if not self.postings[term]:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id)
+    
+    def to_dict(self) -> Dict:
+        return {'k1': self.k1, 'b': self.b, 'documents': [[doc_id, counts] for doc_id, counts in self.documents.items()]}
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BM25Index":
+        # Term counts are stored, so loading skips tokenizing every document again
+        index = cls(data['k1'], data['b'])
+        for doc_id, counts in data['documents']:
+            doc_id = tuple(doc_id) if isinstance(doc_id, list) else doc_id
+            for term, count in counts.items():
+                index.postings[term][doc_id] = count
+            index.documents[doc_id] = counts
+            index.lengths[doc_id] = sum(counts.values())
+            index.total_length += index.lengths[doc_id]
+        return index
+    
+    def idf(self, term: str) -> float:
+        frequency = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.lengths) - frequency + 0.5) / (frequency + 0.5))
+    
+    def search(self, query: Union[str, Iterable[str]], top_k: int = None) -> List[Tuple[Hashable, float]]:
+        terms = tokenize(query) if isinstance(query, str) else list(query)
+        if not self.lengths:
+            return []
+        
+        average_length = self.total_length / len(self.lengths) or 1.0
+        scores: Dict[Hashable, float] = defaultdict(float)
+        for term in set(terms):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf(term)
+            for doc_id, count in docs.items():
+                norm = 1 - self.b + self.b * self.lengths[doc_id] / average_length
+                scores[doc_id] += idf * count * (self.k1 + 1) / (count + self.k1 * norm)
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k] if top_k else ranked
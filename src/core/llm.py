@@ -1,62 +1,170 @@
-import google.generativeai as genai
-from src.config import settings
+import asyncio
+import json
+import random
+import threading
 import time
-from typing import Optional
+from pathlib import Path
+from src.config import settings
+from src.core.cache import normalize_question
+from src.core.ratelimit import TokenBucket, get_shared_bucket
+from src.core.lexical import estimate_tokens
+from src.core.tracing import span
+from typing import Dict, List, Optional, Tuple
 
 class LLMClient:
     
-    def __init__(self, api_key: str = None, model: str = None):
-        self.api_key = api_key or settings.GOOGLE_API_KEY
+    def __init__(self, api_key: str = None, model: str = None, rate_limiter: TokenBucket = None,
+                 offline: bool = False):
+        # Offline clients never reach the API, so they need neither a key nor a share of the rate limit
+        self.offline = offline
+        self.api_key = None if offline else api_key or settings.GOOGLE_API_KEY
         self.model_name = model or settings.MODEL_VERSION
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(self.model_name)
-        self.last_request_time = 0
-        self.min_interval = 60 / settings.MAX_REQUESTS_PER_MINUTE
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.rate_limiter = rate_limiter
+        if rate_limiter is None and not offline:
+            self.rate_limiter = get_shared_bucket(settings.MAX_REQUESTS_PER_MINUTE, settings.RATE_LIMIT_BURST)
+    
+    @property
+    def model(self):
+        # google.generativeai takes most of a second to import, so it loads with the first prompt
+        if self.offline:
+            raise RuntimeError(f"{self.model_name} is an offline client and cannot call the API")
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
     
     def _rate_limit(self):
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.min_interval:
-            time.sleep(self.min_interval - elapsed)
-        self.last_request_time = time.time()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+    
+    async def _rate_limit_async(self):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async()
+    
+    def generate_sql(self, question: str, schema: dict, prompt_version: str = "v1",
+                     joins: List[str] = None, feedback: List[Tuple[str, str]] = None,
+                     temperature: float = None, examples: List[Dict] = None) -> Optional[str]:
+        with span('rate_limit'):
+            self._rate_limit()
+        
+        prompt = self._prompt(question, schema, prompt_version, joins, feedback, examples)
+        
+        try:
+            with span('llm', model=self.model_name) as stage:
+                self._measure_prompt(stage, prompt)
+                response = self.model.generate_content(prompt, generation_config=self._generation_config(temperature))
+                self._measure_response(stage, response.text)
+            with span('extract'):
+                sql = self._extract_sql(response.text)
+            return sql
+        except Exception as e:
+            print(f"LLM Error: {e}")
+            return None
     
-    def generate_sql(self, question: str, schema: dict, prompt_version: str = "v1") -> Optional[str]:
-        self._rate_limit()
+    async def generate_sql_async(self, question: str, schema: dict, prompt_version: str = "v1",
+                                 joins: List[str] = None, feedback: List[Tuple[str, str]] = None,
+                                 temperature: float = None, examples: List[Dict] = None) -> Optional[str]:
+        with span('rate_limit'):
+            await self._rate_limit_async()
         
-        schema_str = self._format_schema(schema)
-        prompt = self._build_prompt(question, schema_str, prompt_version)
+        prompt = self._prompt(question, schema, prompt_version, joins, feedback, examples)
         
         try:
-            response = self.model.generate_content(prompt)
-            sql = self._extract_sql(response.text)
+            with span('llm', model=self.model_name) as stage:
+                self._measure_prompt(stage, prompt)
+                response = await self.model.generate_content_async(
+                    prompt, generation_config=self._generation_config(temperature)
+                )
+                self._measure_response(stage, response.text)
+            with span('extract'):
+                sql = self._extract_sql(response.text)
             return sql
         except Exception as e:
             print(f"LLM Error: {e}")
             return None
     
-    def _format_schema(self, schema: dict) -> str:
+    def _generation_config(self, temperature: float = None) -> Optional[dict]:
+        return {'temperature': temperature} if temperature is not None else None
+    
+    def _prompt(self, question: str, schema: dict, prompt_version: str, joins: List[str] = None,
+                feedback: List[Tuple[str, str]] = None, examples: List[Dict] = None) -> str:
+        with span('prompt') as stage:
+            prompt = self._build_prompt(
+                question, self._format_schema(schema, joins), prompt_version, self._format_feedback(feedback),
+                self._format_examples(examples)
+            )
+            stage['tables'] = len(schema)
+            if examples:
+                stage['examples'] = len(examples)
+            if feedback:
+                stage['feedback'] = len(feedback)
+        return prompt
+    
+    def _measure_prompt(self, stage: dict, prompt: str):
+        stage['prompt_chars'] = len(prompt)
+        stage['prompt_tokens'] = estimate_tokens(prompt)
+    
+    def _measure_response(self, stage: dict, text: Optional[str]):
+        stage['response_chars'] = len(text or "")
+        stage['response_tokens'] = estimate_tokens(text or "")
+    
+    def _format_schema(self, schema: dict, joins: List[str] = None) -> str:
         lines = []
         for table, columns in schema.items():
             lines.append(f"Table: {table}")
             lines.append(f"Columns: {', '.join(columns)}")
             lines.append("")
+        if joins:
+            lines.append("Join paths:")
+            lines.extend(f"- {join}" for join in joins)
+            lines.append("")
         return "\n".join(lines)
     
-    def _build_prompt(self, question: str, schema: str, version: str) -> str:
-        system_prompt = f\"\"\"You are a SQL expert. Generate SQLite queries for the given schema.
+    def _format_feedback(self, feedback: List[Tuple[str, str]] = None) -> str:
+        if not feedback:
+            return ""
+        lines = ["Previous attempts failed. Do not repeat them:"]
+        for sql, error in feedback:
+            lines.append(f"SQL: {' '.join((sql or '').split())}")
+            lines.append(f"Error: {error}")
+        return "\n".join(lines) + "\n\n"
+    
+    def _format_examples(self, examples: List[Dict] = None) -> str:
+        if not examples:
+            return ""
+        lines = ["Similar questions answered before:"]
+        for example in examples:
+            lines.append(f"Question: {example['question']}")
+            lines.append(f"SQL: {' '.join(example['sql'].split())}")
+        return "\n".join(lines) + "\n\n"
+    
+    def prompt_tokens(self, question: str, schema: dict, prompt_version: str = "v1", joins: List[str] = None,
+                      examples: List[Dict] = None) -> int:
+        return estimate_tokens(self._build_prompt(
+            question, self._format_schema(schema, joins), prompt_version, examples=self._format_examples(examples)
+        ))
+    
+    def _build_prompt(self, question: str, schema: str, version: str, feedback: str = "", examples: str = "") -> str:
+        system_prompt = f"""You are a SQL expert. Generate SQLite queries for the given schema.
 
 Database Schema:
 {schema}
 
-Rules:
+{examples}Rules:
 - Use SQLite syntax
 - Return only the SQL query, no explanation
 - Use proper JOINs when needed
 - Use aggregate functions appropriately
 - Format the query for readability
 
-Question: {question}
+{feedback}Question: {question}
 
-SQL Query:\"\"\"
+SQL Query:"""
         return system_prompt
     
     def _extract_sql(self, response: str) -> str:
@@ -72,3 +180,106 @@ SQL Query:\"\"\"
             return response[start:end].strip()
         
         return response
+
+def response_key(question: str, prompt_version: str) -> str:
+    return f"{prompt_version}|{normalize_question(question)}"
+
+class ReplayLLMClient(LLMClient):
+    
+    def __init__(self, responses_file: str = None, model: str = "replay", responses: Dict[str, str] = None,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = None, rate_limiter: TokenBucket = None):
+        super().__init__(model=model, rate_limiter=rate_limiter, offline=True)
+        self.responses_file = Path(responses_file) if responses_file else None
+        self.responses: Dict[str, str] = dict(responses or {})
+        if self.responses_file:
+            self.responses.update(json.loads(self.responses_file.read_text(encoding="utf-8")))
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.misses = 0
+        self._random = random.Random(seed)
+    
+    def _latency(self) -> float:
+        if not self.latency_ms and not self.jitter_ms:
+            return 0.0
+        return max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+    
+    def _lookup(self, question: str, prompt_version: str) -> Optional[str]:
+        sql = self.responses.get(response_key(question, prompt_version))
+        if sql is None:
+            self.misses += 1
+        return sql
+    
+    def generate_sql(self, question: str, schema: dict, prompt_version: str = "v1",
+                     joins: List[str] = None, feedback: List[Tuple[str, str]] = None,
+                     temperature: float = None, examples: List[Dict] = None) -> Optional[str]:
+        prompt = self._prompt(question, schema, prompt_version, joins, feedback, examples)
+        with span('llm', model=self.model_name) as stage:
+            self._measure_prompt(stage, prompt)
+            delay = self._latency()
+            if delay:
+                time.sleep(delay)
+            sql = self._lookup(question, prompt_version)
+            self._measure_response(stage, sql)
+        return sql
+    
+    async def generate_sql_async(self, question: str, schema: dict, prompt_version: str = "v1",
+                                 joins: List[str] = None, feedback: List[Tuple[str, str]] = None,
+                                 temperature: float = None, examples: List[Dict] = None) -> Optional[str]:
+        prompt = self._prompt(question, schema, prompt_version, joins, feedback, examples)
+        with span('llm', model=self.model_name) as stage:
+            self._measure_prompt(stage, prompt)
+            delay = self._latency()
+            if delay:
+                await asyncio.sleep(delay)
+            sql = self._lookup(question, prompt_version)
+            self._measure_response(stage, sql)
+        return sql
+
+class RecordingLLMClient(LLMClient):
+    
+    def __init__(self, responses_file: str, api_key: str = None, model: str = None, rate_limiter: TokenBucket = None):
+        super().__init__(api_key, model, rate_limiter)
+        self.responses_file = Path(responses_file)
+        self.responses: Dict[str, str] = {}
+        if self.responses_file.exists():
+            self.responses = json.loads(self.responses_file.read_text(encoding="utf-8"))
+        self._recorded = 0
+        self._lock = threading.Lock()
+    
+    def _record(self, question: str, prompt_version: str, sql: Optional[str]):
+        if sql is None:
+            return
+        with self._lock:
+            self.responses[response_key(question, prompt_version)] = sql
+            self._recorded += 1
+    
+    def close(self):
+        # Responses are written once here rather than rewriting the whole file after every call
+        with self._lock:
+            if not self._recorded:
+                return
+            self.responses_file.parent.mkdir(parents=True, exist_ok=True)
+            self.responses_file.write_text(json.dumps(self.responses, indent=2), encoding="utf-8")
+            self._recorded = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def generate_sql(self, question: str, schema: dict, prompt_version: str = "v1",
+                     joins: List[str] = None, feedback: List[Tuple[str, str]] = None,
+                     temperature: float = None, examples: List[Dict] = None) -> Optional[str]:
+        sql = super().generate_sql(question, schema, prompt_version, joins, feedback, temperature, examples)
+        self._record(question, prompt_version, sql)
+        return sql
+    
+    async def generate_sql_async(self, question: str, schema: dict, prompt_version: str = "v1",
+                                 joins: List[str] = None, feedback: List[Tuple[str, str]] = None,
+                                 temperature: float = None, examples: List[Dict] = None) -> Optional[str]:
+        sql = await super().generate_sql_async(
+            question, schema, prompt_version, joins, feedback, temperature, examples
+        )
+        self._record(question, prompt_version, sql)
+        return sql
@@ -1,57 +1,162 @@
-import pandas as pd
+import atexit
+import csv
+import io
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
 from src.config import settings
-from typing import Dict, List
+from typing import Dict, List, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOG_COLUMNS = [
+    'timestamp', 'user_question', 'sql', 'prompt_version', 'model',
+    'execution_success', 'validation_passed', 'rows', 'execution_time_ms', 'error'
+]
+# Logged as the model of answers served from rollups, where no LLM ran
+SEMANTIC_MODEL = "semantic"
+
+def read_log_tail(log_file: Path, offset: int = 0) -> Tuple[List[Dict], int, bool]:
+    # Rows appended after `offset`, read under a shared lock so a concurrent flush is never seen half-written.
+    # The returned flag is set when the log was truncated or replaced and the tail restarted from the top.
+    log_file = Path(log_file)
+    if not log_file.exists():
+        return [], offset, False
+    with open(log_file, 'rb') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+        try:
+            header_line = f.readline()
+            header = next(csv.reader([header_line.decode('utf-8')]), [])
+            reset = f.seek(0, io.SEEK_END) < offset
+            if reset:
+                offset = 0
+            f.seek(offset or len(header_line))
+            text = f.read().decode('utf-8')
+            offset = f.tell()
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    return list(csv.DictReader(io.StringIO(text, newline=''), fieldnames=header)), offset, reset
 
 class ExperimentLogger:
     
-    def __init__(self, log_file: str = None):
+    def __init__(self, log_file: str = None, batch_size: int = None, flush_interval: float = None):
         self.log_file = Path(log_file or settings.LOG_FILE)
+        self.batch_size = batch_size or settings.LOG_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.LOG_FLUSH_INTERVAL_SECONDS
+        self._buffer: List[dict] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
         self._ensure_log_exists()
+        # Logs created before the model column keep their header; their rows count under "unknown"
+        self.columns = self._read_columns()
+        # stats.py tails the log through read_log_tail, so it is imported once this module has loaded
+        from src.core.stats import ExperimentStats
+        self.stats = ExperimentStats.from_settings(str(self.log_file))
+        
+        self._flusher = threading.Thread(target=self._flush_loop, name="experiment-log-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+    
+    @contextmanager
+    def _locked_append(self):
+        with open(self.log_file, 'a', newline='', encoding='utf-8') as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                f.flush()
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
     
     def _ensure_log_exists(self):
         self.log_file.parent.mkdir(parents=True, exist_ok=True)
         
-        if not self.log_file.exists():
-            df = pd.DataFrame(columns=[
-                'timestamp', 'user_question', 'sql', 'prompt_version',
-                'execution_success', 'rows', 'execution_time_ms', 'error'
-            ])
-            df.to_csv(self.log_file, index=False)
+        with self._locked_append() as f:
+            if f.tell() == 0:
+                csv.writer(f, lineterminator=os.linesep).writerow(LOG_COLUMNS)
+    
+    def _read_columns(self) -> List[str]:
+        with open(self.log_file, newline='', encoding='utf-8') as f:
+            header = next(csv.reader(f), None)
+        return header or LOG_COLUMNS
     
     def log_experiment(self, data: dict):
-        try:
-            df = pd.read_csv(self.log_file)
+        row = {
+            'timestamp': datetime.now().isoformat(sep=' '),
+            'user_question': data.get('user_question', ''),
+            'sql': data.get('sql', ''),
+            'prompt_version': data.get('prompt_version', ''),
+            'model': data.get('model', ''),
+            'execution_success': data.get('execution_success', False),
+            'validation_passed': data.get('validation_passed', False),
+            'rows': data.get('rows', 0),
+            'execution_time_ms': data.get('execution_time_ms', 0),
+            'error': data.get('error', '')
+        }
+        
+        with self._buffer_lock:
+            self._buffer.append(row)
+            should_flush = len(self._buffer) >= self.batch_size
+        if should_flush:
+            self._wakeup.set()
+    
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+    
+    def flush(self):
+        with self._flush_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
             
-            new_row = pd.DataFrame([{
-                'timestamp': pd.Timestamp.now(),
-                'user_question': data.get('user_question', ''),
-                'sql': data.get('sql', ''),
-                'prompt_version': data.get('prompt_version', ''),
-                'execution_success': data.get('execution_success', False),
-                'rows': data.get('rows', 0),
-                'execution_time_ms': data.get('execution_time_ms', 0),
-                'error': data.get('error', '')
-            }])
+            payload = io.StringIO()
+            writer = csv.DictWriter(payload, fieldnames=self.columns, extrasaction='ignore', lineterminator=os.linesep)
+            writer.writerows(rows)
             
-            df = pd.concat([df, new_row], ignore_index=True)
-            df.to_csv(self.log_file, index=False)
-        except Exception as e:
-            print(f"Logging Error: {e}")
+            text = payload.getvalue()
+            try:
+                with self._locked_append() as f:
+                    start = f.seek(0, io.SEEK_END)
+                    f.write(text)
+            except Exception as e:
+                print(f"Logging Error: {e}")
+                with self._buffer_lock:
+                    self._buffer = rows + self._buffer
+                return
+            
+            # Only the logged columns, so the aggregates match a rebuild from the CSV
+            self.stats.record(
+                [{column: row.get(column) for column in self.columns} for row in rows],
+                start, start + len(text.encode('utf-8'))
+            )
+            self.stats.save()
+    
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+        self.stats.save()
     
     def get_stats(self) -> Dict:
         try:
-            df = pd.read_csv(self.log_file)
-            
-            total = len(df)
-            successes = df['execution_success'].sum()
-            
-            return {
-                'total_queries': total,
-                'successful_queries': successes,
-                'success_rate': (successes / total * 100) if total > 0 else 0,
-                'recent_experiments': df.tail(10).to_dict('records')
-            }
+            self.flush()
+            # Picks up rows other processes appended; the log itself is never re-read from the start
+            self.stats.refresh()
+            return self.stats.summary()
         except Exception as e:
             return {
                 'total_queries': 0,
@@ -59,3 +164,8 @@ class ExperimentLogger:
                 'success_rate': 0,
                 'recent_experiments': []
             }
+    
+    def get_success_rate(self, prompt_version: str = None, model: str = None) -> float:
+        self.flush()
+        self.stats.refresh()
+        return self.stats.success_rate(prompt_version, model)
@@ -0,0 +1,309 @@
+import argparse
+import math
+import re
+import sqlite3
+import time
+import pandas as pd
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from src.config import settings
+from src.core.db import DatabaseClient
+from src.core.schema import quote_identifier
+
+PLAN_STEP = re.compile(r"^(SCAN|SEARCH)\s+(?:TABLE\s+)?(\S+)(?:\s+AS\s+(\S+))?(.*)$")
+AUTOMATIC_INDEX = re.compile(r"USING AUTOMATIC (?:COVERING |PARTIAL )*INDEX \(([^)]*)\)")
+ALIAS_KEYWORDS = {
+    'ON', 'USING', 'WHERE', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS', 'NATURAL', 'OUTER',
+    'GROUP', 'ORDER', 'LIMIT', 'HAVING', 'UNION', 'EXCEPT', 'INTERSECT', 'WINDOW', 'AS', 'SET', 'AND', 'OR'
+}
+CLAUSE_END = r"(?=\bLIMIT\b|\bHAVING\b|\bORDER\s+BY\b|\bWINDOW\b|\bUNION\b|\)|;|$)"
+
+def resolve_aliases(sql: str, tables: List[str]) -> Dict[str, str]:
+    aliases = {}
+    for table in tables:
+        aliases[table.lower()] = table
+        pattern = rf"\b{re.escape(table)}\b\s+(?:AS\s+)?(\w+)"
+        for match in re.finditer(pattern, sql, re.IGNORECASE):
+            alias = match.group(1)
+            if alias.upper() not in ALIAS_KEYWORDS:
+                aliases[alias.lower()] = table
+    return aliases
+
+class QueryPlanAnalyzer:
+    
+    def __init__(self, db: DatabaseClient, large_table_rows: int = None):
+        self.db = db
+        self.large_table_rows = large_table_rows or settings.PLAN_LARGE_TABLE_ROWS
+    
+    def explain(self, sql: str, db_path: str = None) -> List[Dict]:
+        statement = f"EXPLAIN QUERY PLAN {sql.strip().rstrip(';')}"
+        if db_path:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                rows = conn.execute(statement).fetchall()
+            finally:
+                conn.close()
+        else:
+            with self.db.pool.connection() as conn:
+                rows = conn.execute(statement).fetchall()
+        return [{'id': row[0], 'parent': row[1], 'detail': row[3]} for row in rows]
+    
+    def analyze(self, sql: str, db_path: str = None) -> Dict:
+        catalog = self.db.get_schema_catalog()
+        aliases = resolve_aliases(sql, list(catalog))
+        steps = self.explain(sql, db_path)
+        
+        full_scans, searches, automatic_indexes, temp_btrees, warnings = [], [], [], [], []
+        outer_rows, cost = 1.0, 0.0
+        
+        for step in steps:
+            detail = step['detail']
+            match = PLAN_STEP.match(detail)
+            
+            if match:
+                kind, name, alias, rest = match.groups()
+                table = aliases.get((alias or name).lower(), aliases.get(name.lower(), name))
+                rows = (catalog.get(table, {}).get('row_count') or 0) + 1
+                
+                if kind == 'SCAN':
+                    covering = "COVERING INDEX" in rest
+                    full_scans.append({'table': table, 'rows': rows - 1, 'covering_index': covering})
+                    if rows > self.large_table_rows and not covering:
+                        warnings.append(f"Full table scan on large table {table} (~{rows - 1:,} rows)")
+                    outer_rows *= rows
+                    cost += outer_rows
+                else:
+                    automatic = AUTOMATIC_INDEX.search(rest)
+                    if automatic:
+                        columns = [part.split('=')[0].strip() for part in automatic.group(1).split(' AND ')]
+                        automatic_indexes.append({'table': table, 'columns': columns})
+                        warnings.append(f"Missing index on {table}({', '.join(columns)}) for join; SQLite builds a temporary one")
+                        cost += rows * math.log2(rows + 1)
+                    searches.append({'table': table, 'detail': detail})
+                    cost += outer_rows * math.log2(rows + 1)
+            elif detail.startswith("USE TEMP B-TREE"):
+                temp_btrees.append(detail.replace("USE TEMP B-TREE FOR ", ""))
+                cost += outer_rows * math.log2(outer_rows + 1)
+        
+        if temp_btrees:
+            warnings.append(f"Temporary B-tree for {', '.join(temp_btrees)}")
+        
+        if any(scan['rows'] > self.large_table_rows and not scan['covering_index'] for scan in full_scans) or automatic_indexes:
+            classification = "expensive"
+        elif warnings:
+            classification = "warning"
+        else:
+            classification = "ok"
+        
+        return {
+            'classification': classification,
+            'estimated_cost': round(cost, 1),
+            'full_scans': full_scans,
+            'searches': searches,
+            'automatic_indexes': automatic_indexes,
+            'temp_btrees': temp_btrees,
+            'warnings': warnings,
+            'steps': [step['detail'] for step in steps]
+        }
+    
+    def summarize(self, sql: str) -> Dict:
+        plan = self.analyze(sql)
+        return {key: plan[key] for key in ('classification', 'estimated_cost', 'warnings')}
+
+class IndexAdvisor:
+    
+    def __init__(self, db: DatabaseClient = None, analyzer: QueryPlanAnalyzer = None, max_columns: int = 6):
+        self.db = db or DatabaseClient(use_result_cache=False)
+        self.analyzer = analyzer or QueryPlanAnalyzer(self.db)
+        self.max_columns = max_columns
+    
+    def load_logged_queries(self, log_file: str = None) -> List[str]:
+        df = pd.read_csv(log_file or settings.LOG_FILE)
+        successful = df[df['execution_success'].astype(str).str.lower() == 'true']
+        return successful['sql'].dropna().drop_duplicates().tolist()
+    
+    def _column_usage(self, sql: str, table: str, aliases: Dict[str, str]) -> Dict[str, List[str]]:
+        catalog = self.db.get_schema_catalog()
+        table_columns = {column['name'].lower(): column['name'] for column in catalog[table]['columns']}
+        query_tables = set(aliases.values())
+        other_columns = {
+            column['name'].lower()
+            for other in query_tables if other != table and other in catalog
+            for column in catalog[other]['columns']
+        }
+        own_aliases = [alias for alias, name in aliases.items() if name == table]
+        
+        def refs(text: str) -> List[str]:
+            found = []
+            for qualifier, column in re.findall(r"\b(?:(\w+)\.)?(\w+)\b", text):
+                column = column.lower()
+                if column not in table_columns:
+                    continue
+                if qualifier and qualifier.lower() not in own_aliases:
+                    continue
+                if not qualifier and column in other_columns:
+                    continue
+                found.append(table_columns[column])
+            return found
+        
+        column_ref = r"(?:\w+\.)?\w+"
+        literal = r"(?:'[^']*'|\d+(?:\.\d+)?|\?)"
+        usage = {
+            'equality': refs(" ".join(re.findall(rf"({column_ref})\s*(?:=|\bIN\b)\s*{literal}", sql, re.IGNORECASE))),
+            'range': refs(" ".join(re.findall(rf"({column_ref})\s*(?:<=|>=|<|>|\bBETWEEN\b|\bLIKE\b)", sql, re.IGNORECASE))),
+            'join': refs(" ".join(
+                left + " " + right for left, right in
+                re.findall(rf"({column_ref})\s*=\s*({column_ref})\b(?!\s*')", sql, re.IGNORECASE)
+                if not re.fullmatch(r"\d+(?:\.\d+)?", right)
+            )),
+            'grouping': refs(" ".join(re.findall(rf"\b(?:GROUP|ORDER)\s+BY\b(.*?){CLAUSE_END}", sql, re.IGNORECASE | re.S))),
+            'all': refs(sql)
+        }
+        return usage
+    
+    def _candidate(self, sql: str, plan: Dict) -> List[Tuple[str, Tuple[str, ...]]]:
+        catalog = self.db.get_schema_catalog()
+        aliases = resolve_aliases(sql, list(catalog))
+        candidates = []
+        
+        targets = {item['table']: item['columns'] for item in plan['automatic_indexes']}
+        for scan in plan['full_scans']:
+            if scan['rows'] > self.analyzer.large_table_rows and not scan['covering_index']:
+                targets.setdefault(scan['table'], None)
+        
+        for table, automatic_columns in targets.items():
+            if table not in catalog:
+                continue
+            usage = self._column_usage(sql, table, aliases)
+            if automatic_columns:
+                leading = automatic_columns + usage['equality']
+            else:
+                leading = usage['equality'] + usage['join']
+            ordered = leading + usage['range'] + usage['grouping'] + usage['all']
+            
+            columns = []
+            for column in ordered:
+                if column not in columns:
+                    columns.append(column)
+            if columns:
+                candidates.append((table, tuple(columns[:self.max_columns])))
+        return candidates
+    
+    def _existing_indexes(self) -> Dict[str, List[Tuple[str, ...]]]:
+        indexes = defaultdict(list)
+        with self.db.pool.connection() as conn:
+            for table in self.db.get_schema_catalog():
+                for index in conn.execute(f"PRAGMA index_list({quote_identifier(table)});").fetchall():
+                    columns = conn.execute(f"PRAGMA index_info({quote_identifier(index[1])});").fetchall()
+                    indexes[table].append(tuple(column[2] for column in columns))
+        return indexes
+    
+    def recommend(self, queries: List[str] = None, top_n: int = 5) -> List[Dict]:
+        queries = queries if queries is not None else self.load_logged_queries()
+        existing = self._existing_indexes()
+        scores = defaultdict(lambda: {'queries': 0, 'estimated_cost': 0.0})
+        
+        for sql in queries:
+            try:
+                plan = self.analyzer.analyze(sql)
+            except sqlite3.Error:
+                continue
+            for table, columns in self._candidate(sql, plan):
+                if any(index[:len(columns)] == columns for index in existing.get(table, [])):
+                    continue
+                scores[(table, columns)]['queries'] += 1
+                scores[(table, columns)]['estimated_cost'] += plan['estimated_cost']
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1]['estimated_cost'], reverse=True)
+        recommendations = []
+        for (table, columns), score in ranked[:top_n]:
+            name = f"idx_{table}_{'_'.join(columns)}"[:60]
+            column_list = ", ".join(quote_identifier(column) for column in columns)
+            recommendations.append({
+                'table': table,
+                'columns': list(columns),
+                'name': name,
+                'sql': f"CREATE INDEX IF NOT EXISTS {quote_identifier(name)} ON {quote_identifier(table)} ({column_list});",
+                'queries': score['queries'],
+                'estimated_cost': round(score['estimated_cost'], 1)
+            })
+        return recommendations
+    
+    def build_sidecar(self, recommendations: List[Dict], sidecar_path: str = None) -> str:
+        sidecar_path = sidecar_path or str(Path(self.db.db_path).with_suffix(".indexed.db"))
+        Path(sidecar_path).parent.mkdir(parents=True, exist_ok=True)
+        
+        source = sqlite3.connect(f"file:{self.db.db_path}?mode=ro", uri=True)
+        target = sqlite3.connect(sidecar_path)
+        try:
+            source.backup(target)
+            for recommendation in recommendations:
+                target.execute(recommendation['sql'])
+            target.execute("ANALYZE;")
+            target.commit()
+        finally:
+            target.close()
+            source.close()
+        return sidecar_path
+    
+    def _time_query(self, db_path: str, sql: str, repeat: int) -> Optional[float]:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            return min(timings)
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+    
+    def benchmark(self, queries: List[str], sidecar_path: str, repeat: int = 3) -> Dict:
+        results = []
+        for sql in queries:
+            before = self._time_query(self.db.db_path, sql, repeat)
+            after = self._time_query(sidecar_path, sql, repeat)
+            if before is None or after is None:
+                continue
+            results.append({
+                'sql': sql,
+                'before_ms': before,
+                'after_ms': after,
+                'speedup': before / after if after > 0 else None,
+                'plan_before': self.analyzer.analyze(sql)['steps'],
+                'plan_after': self.analyzer.analyze(sql, sidecar_path)['steps']
+            })
+        
+        total_before = sum(result['before_ms'] for result in results)
+        total_after = sum(result['after_ms'] for result in results)
+        return {
+            'queries': len(results),
+            'total_before_ms': total_before,
+            'total_after_ms': total_after,
+            'speedup': total_before / total_after if total_after > 0 else None,
+            'results': results
+        }
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Recommend indexes from logged queries")
+    parser.add_argument("--log-file", default=None)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--sidecar", default=None, help="Build the indexes into this copy and benchmark it")
+    args = parser.parse_args(argv)
+    
+    advisor = IndexAdvisor()
+    queries = advisor.load_logged_queries(args.log_file)
+    recommendations = advisor.recommend(queries, args.top)
+    for recommendation in recommendations:
+        print(f"{recommendation['sql']}  -- {recommendation['queries']} queries, cost {recommendation['estimated_cost']}")
+    
+    if args.sidecar and recommendations:
+        sidecar_path = advisor.build_sidecar(recommendations, args.sidecar)
+        report = advisor.benchmark(queries, sidecar_path)
+        print(f"Benchmarked {report['queries']} queries: {report['total_before_ms']:.1f}ms -> {report['total_after_ms']:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+from src.config import settings
+
+class ConnectionPool:
+    
+    def __init__(self, db_path: str, size: int = None, timeout: float = None,
+                 mmap_size: int = None, cache_size: int = None, statement_cache_size: int = None,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.db_path = db_path
+        self.on_connect = on_connect
+        self.size = size or settings.DB_POOL_SIZE
+        self.timeout = timeout if timeout is not None else settings.DB_POOL_TIMEOUT
+        self.mmap_size = mmap_size if mmap_size is not None else settings.DB_MMAP_SIZE
+        self.cache_size = cache_size if cache_size is not None else settings.DB_CACHE_SIZE
+        self.statement_cache_size = statement_cache_size or settings.DB_STATEMENT_CACHE_SIZE
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._stats = {
+            'checkouts': 0,
+            'reuses': 0,
+            'discarded': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0
+        }
+    
+    def _create(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size
+        )
+        if self.on_connect:
+            self.on_connect(conn)
+        conn.execute("PRAGMA query_only = ON;")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)};")
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats['reuses'] += 1
+            return conn
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available after {self.timeout}s (pool size {self.size})")
+        with self._lock:
+            self._stats['reuses'] += 1
+        return conn
+    
+    def _release(self, conn: sqlite3.Connection, broken: bool = False):
+        if not broken:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+                return
+            except sqlite3.Error:
+                pass
+        
+        with self._lock:
+            self._created -= 1
+            self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        start = time.perf_counter()
+        conn = self._acquire()
+        wait_ms = (time.perf_counter() - start) * 1000
+        
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['wait_ms_total'] += wait_ms
+            self._stats['wait_ms_max'] = max(self._stats['wait_ms_max'], wait_ms)
+        
+        broken = False
+        try:
+            yield conn
+        except sqlite3.ProgrammingError:
+            broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+    
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+            conn.close()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._created
+        stats['idle'] = self._idle.qsize()
+        stats['wait_ms_avg'] = stats['wait_ms_total'] / stats['checkouts'] if stats['checkouts'] else 0
+        return stats
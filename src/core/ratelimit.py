@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Tuple
+
+class TokenBucket:
+    
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, tokens: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+    
+    def acquire(self, tokens: float = 1.0) -> float:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+    
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+    
+    def available(self) -> float:
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return min(self.capacity, self._tokens + elapsed * self.rate)
+
+_shared_buckets: Dict[Tuple[float, float], TokenBucket] = {}
+_shared_lock = threading.Lock()
+
+def get_shared_bucket(rate_per_minute: float, capacity: float = None) -> TokenBucket:
+    key = (rate_per_minute, capacity)
+    with _shared_lock:
+        if key not in _shared_buckets:
+            _shared_buckets[key] = TokenBucket(rate_per_minute, capacity)
+        return _shared_buckets[key]
@@ -0,0 +1,148 @@
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Set, Tuple
+from src.config import settings
+from src.core.db import DatabaseClient
+from src.core.lexical import BM25Index, tokenize
+from src.core.schema import quote_identifier
+
+TEXT_TYPE = re.compile(r"CHAR|CLOB|TEXT|^$", re.IGNORECASE)
+MAX_VALUE_LENGTH = 64
+
+class SchemaRetriever:
+    
+    def __init__(self, db: DatabaseClient, top_k: int = None, max_columns: int = None, sample_values: int = None):
+        self.db = db
+        self.top_k = top_k or settings.SCHEMA_TOP_K
+        self.max_columns = max_columns or settings.SCHEMA_MAX_COLUMNS
+        self.sample_values = settings.SCHEMA_SAMPLE_VALUES if sample_values is None else sample_values
+        self.builds = 0
+        self._catalog: Dict = {}
+        self._tables = BM25Index()
+        self._columns = BM25Index()
+        self._edges: Dict[str, List[Tuple[str, str, str, str]]] = {}
+        self._schema_hash = None
+        self._lock = threading.Lock()
+    
+    def _sample(self, table: str, column: str) -> List[str]:
+        if not self.sample_values:
+            return []
+        sql = (
+            f"SELECT DISTINCT {quote_identifier(column)} FROM {quote_identifier(table)} "
+            f"WHERE {quote_identifier(column)} IS NOT NULL LIMIT {self.sample_values}"
+        )
+        result = self.db.execute_query(sql, use_cache=False)
+        if isinstance(result, str):
+            return []
+        return [str(value) for value in result.iloc[:, 0] if len(str(value)) <= MAX_VALUE_LENGTH]
+    
+    def build(self, schema_hash: str = None):
+        catalog = self.db.get_schema_catalog()
+        tables, columns = BM25Index(), BM25Index()
+        edges = {table: [] for table in catalog}
+        
+        for table, info in catalog.items():
+            table_terms = tokenize(table)
+            document = table_terms * 3
+            for column in info['columns']:
+                values = []
+                if TEXT_TYPE.search(column['type'] or ""):
+                    values = [term for value in self._sample(table, column['name']) for term in tokenize(value)]
+                column_terms = tokenize(column['name'])
+                columns.add((table, column['name']), column_terms * 2 + table_terms + values)
+                document += column_terms + values
+            tables.add(table, document)
+            
+            for fk in info['foreign_keys']:
+                if fk['ref_table'] not in edges:
+                    continue
+                ref_column = fk['ref_column'] or (catalog[fk['ref_table']]['primary_key'] or ['rowid'])[0]
+                edge = (table, fk['column'], fk['ref_table'], ref_column)
+                edges[table].append(edge)
+                edges[fk['ref_table']].append(edge)
+        
+        self._catalog, self._tables, self._columns, self._edges = catalog, tables, columns, edges
+        self._schema_hash = schema_hash
+        self.builds += 1
+    
+    def _ensure(self, schema_hash: str = None):
+        with self._lock:
+            if not self._catalog or schema_hash != self._schema_hash:
+                self.build(schema_hash)
+    
+    def warm(self, schema_hash: str = None):
+        self._ensure(schema_hash)
+    
+    def _rank_tables(self, question: str) -> List[Tuple[str, float]]:
+        scores = dict(self._tables.search(question))
+        degree = {table: len(edges) for table, edges in self._edges.items()}
+        return sorted(
+            ((table, scores.get(table, 0.0)) for table in self._catalog),
+            key=lambda item: (item[1], degree.get(item[0], 0)),
+            reverse=True
+        )
+    
+    def _join_path(self, connected: Set[str], target: str) -> List[Tuple[str, str, str, str]]:
+        previous = {table: None for table in connected}
+        queue = deque(connected)
+        while queue:
+            table = queue.popleft()
+            if table == target:
+                break
+            for edge in self._edges.get(table, []):
+                neighbour = edge[2] if edge[0] == table else edge[0]
+                if neighbour not in previous:
+                    previous[neighbour] = (table, edge)
+                    queue.append(neighbour)
+        
+        path = []
+        step = target
+        while previous.get(step):
+            step, edge = previous[step]
+            path.append(edge)
+        return path
+    
+    def _select_columns(self, table: str, question: str, keys: Set[str]) -> List[str]:
+        names = [column['name'] for column in self._catalog[table]['columns']]
+        if len(names) <= self.max_columns:
+            return names
+        
+        keep = set(keys) | set(self._catalog[table]['primary_key'])
+        scores = self._columns.search(question)
+        keep.update(column for (owner, column), _ in scores if owner == table and len(keep) < self.max_columns)
+        for name in names:
+            if len(keep) >= self.max_columns:
+                break
+            keep.add(name)
+        return [name for name in names if name in keep]
+    
+    def retrieve(self, question: str, schema_hash: str = None) -> Dict:
+        self._ensure(schema_hash)
+        ranked = self._rank_tables(question)
+        
+        selected = [table for table, _ in ranked[:self.top_k]]
+        joined = set(selected[:1])
+        for table in selected[1:]:
+            for edge in self._join_path(joined, table):
+                joined.update((edge[0], edge[2]))
+            joined.add(table)
+        
+        order = {table: position for position, table in enumerate(self._catalog)}
+        tables = sorted(joined, key=order.get)
+        edges = {edge for table in tables for edge in self._edges[table] if edge[0] in joined and edge[2] in joined}
+        keys: Dict[str, Set[str]] = {table: set() for table in tables}
+        for table, column, ref_table, ref_column in edges:
+            keys[table].add(column)
+            keys[ref_table].add(ref_column)
+        
+        schema = {table: self._select_columns(table, question, keys[table]) for table in tables}
+        pruned = len(tables) < len(self._catalog) or any(
+            len(columns) < len(self._catalog[table]['columns']) for table, columns in schema.items()
+        )
+        return {
+            'schema': schema,
+            'joins': sorted(f"{table}.{column} = {ref_table}.{ref_column}" for table, column, ref_table, ref_column in edges),
+            'ranked': [(table, round(score, 3)) for table, score in ranked[:self.top_k]],
+            'pruned': pruned
+        }
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import threading
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+
+COLUMNS_SQL = """
+    SELECT m.name, p.name, p.type, p."notnull", p.pk
+    FROM sqlite_master AS m
+    JOIN pragma_table_info(m.name) AS p
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    ORDER BY m.rowid, p.cid
+"""
+
+FOREIGN_KEYS_SQL = """
+    SELECT m.name, f."from", f."table", f."to"
+    FROM sqlite_master AS m
+    JOIN pragma_foreign_key_list(m.name) AS f
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    ORDER BY m.rowid, f.id, f.seq
+"""
+
+MAX_COMPOUND_SELECT = 400
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def file_token(db_path: str) -> Tuple:
+    token = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+            token.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            token.append(None)
+    return tuple(token)
+
+class SchemaCatalog:
+    
+    def __init__(self, db_path: str, connection: Callable[[], ContextManager[sqlite3.Connection]]):
+        self.db_path = db_path
+        self.connection = connection
+        self.loads = 0
+        self._tables = None
+        self._schema_version = None
+        self._file_token = None
+        self._lock = threading.Lock()
+    
+    def get(self) -> Dict[str, dict]:
+        current_token = file_token(self.db_path)
+        with self._lock:
+            if self._tables is not None and current_token == self._file_token:
+                return self._tables
+            
+            with self.connection() as conn:
+                schema_version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+                if self._tables is None or schema_version != self._schema_version:
+                    self._tables = self._load(conn)
+                    self._schema_version = schema_version
+                    self.loads += 1
+            
+            self._file_token = current_token
+            return self._tables
+    
+    def invalidate(self):
+        with self._lock:
+            self._tables = None
+            self._file_token = None
+    
+    def _load(self, conn: sqlite3.Connection) -> Dict[str, dict]:
+        tables = {}
+        
+        for table, column, col_type, notnull, pk in conn.execute(COLUMNS_SQL):
+            entry = tables.setdefault(table, {
+                'columns': [],
+                'primary_key': [],
+                'foreign_keys': [],
+                'row_count': None
+            })
+            entry['columns'].append({
+                'name': column,
+                'type': col_type,
+                'nullable': not notnull
+            })
+            if pk:
+                entry['primary_key'].append((pk, column))
+        
+        for entry in tables.values():
+            entry['primary_key'] = [column for _, column in sorted(entry['primary_key'])]
+        
+        for table, column, ref_table, ref_column in conn.execute(FOREIGN_KEYS_SQL):
+            if table in tables:
+                tables[table]['foreign_keys'].append({
+                    'column': column,
+                    'ref_table': ref_table,
+                    'ref_column': ref_column
+                })
+        
+        for table, count in self._estimate_row_counts(conn, list(tables)).items():
+            tables[table]['row_count'] = count
+        
+        return tables
+    
+    def _estimate_row_counts(self, conn: sqlite3.Connection, tables: List[str]) -> Dict[str, Optional[int]]:
+        counts = {}
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1';"
+        ).fetchone()
+        if has_stats:
+            rows = conn.execute(
+                "SELECT tbl, MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 GROUP BY tbl;"
+            ).fetchall()
+            counts = {table: count for table, count in rows if table in tables}
+        
+        without_rowid = {
+            name for name, sql in conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'table';"
+            ) if sql and "WITHOUT ROWID" in sql.upper()
+        }
+        missing = [table for table in tables if table not in counts and table not in without_rowid]
+        for start in range(0, len(missing), MAX_COMPOUND_SELECT):
+            batch = missing[start:start + MAX_COMPOUND_SELECT]
+            selects = [f"SELECT ?, MAX(rowid) FROM {quote_identifier(table)}" for table in batch]
+            rows = conn.execute(" UNION ALL ".join(selects), batch).fetchall()
+            counts.update({table: count or 0 for table, count in rows})
+        return counts
+    
+    def columns(self) -> Dict[str, List[str]]:
+        return {
+            table: [column['name'] for column in entry['columns']]
+            for table, entry in self.get().items()
+        }
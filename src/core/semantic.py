@@ -0,0 +1,539 @@
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import pandas as pd
+import yaml
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+from src.config import settings
+from src.core.db import DatabaseClient
+from src.core.governor import BudgetExceeded, QueryBudget, ResourceGovernor
+from src.core.schema import file_token, quote_identifier
+
+FILLER_WORDS = {
+    'a', 'all', 'an', 'and', 'are', 'across', 'broken', 'by', 'did', 'do', 'down', 'each', 'for', 'from',
+    'get', 'give', 'has', 'have', 'how', 'in', 'is', 'list', 'me', 'much', 'of', 'our', 'over', 'overall',
+    'per', 'show', 'split', 'the', 'total', 'was', 'we', 'were', 'what', 'which', 'with'
+}
+ORDER_WORDS = {
+    'top': 'DESC', 'highest': 'DESC', 'most': 'DESC', 'best': 'DESC', 'biggest': 'DESC', 'largest': 'DESC',
+    'bottom': 'ASC', 'lowest': 'ASC', 'least': 'ASC', 'worst': 'ASC', 'smallest': 'ASC'
+}
+
+def load_semantic_model(path: str) -> Dict:
+    model = yaml.safe_load(Path(path).read_text(encoding="utf-8"))
+    for section in ('source', 'measures', 'metrics', 'dimensions', 'rollups'):
+        if not model.get(section):
+            raise ValueError(f"{path} is missing the '{section}' section")
+    for rollup in model['rollups']:
+        unknown = [name for name in rollup['dimensions'] if name not in model['dimensions']]
+        if unknown or not rollup['dimensions']:
+            raise ValueError(f"Rollup {rollup['name']} has invalid dimensions: {unknown or 'none'}")
+    return model
+
+COMPARISON = re.compile(r"[<>=]|\d[.,]\d")
+
+def normalize_words(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+def sql_literal(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+def row_checksum(*values) -> int:
+    return zlib.crc32(repr(values).encode("utf-8"))
+
+def add_fingerprints(*fingerprints: List[int]) -> List[int]:
+    return [sum(parts) for parts in zip(*fingerprints)]
+
+class RebuildRequired(Exception):
+    pass
+
+class RollupStore:
+    
+    def __init__(self, model: Dict, db_path: str, rollup_path: str, governor: ResourceGovernor = None):
+        self.model = model
+        self.db_path = db_path
+        self.rollup_path = rollup_path
+        self.governor = governor or ResourceGovernor()
+        self.refreshes = 0
+        self.rebuilds = 0
+        self.verifications = 0
+        self.rows_applied = 0
+        self._lock = threading.Lock()
+        Path(rollup_path).parent.mkdir(parents=True, exist_ok=True)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.rollup_path}", uri=True, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                name TEXT PRIMARY KEY,
+                definition TEXT,
+                watermark INTEGER,
+                source_rows INTEGER,
+                refreshed_at TEXT,
+                fingerprint TEXT
+            )
+        """)
+        if 'fingerprint' not in {row[1] for row in conn.execute("PRAGMA main.table_info(rollup_state)")}:
+            conn.execute("ALTER TABLE rollup_state ADD COLUMN fingerprint TEXT")
+        conn.create_function("row_checksum", -1, row_checksum, deterministic=True)
+        return conn
+    
+    def columns(self, rollup: Dict) -> List[Tuple[str, str]]:
+        columns = []
+        for name in rollup['dimensions']:
+            dimension = self.model['dimensions'][name]
+            if dimension.get('key'):
+                columns.append((f"{name}_id", dimension['key']))
+            columns.append((name, dimension['expression']))
+        return columns
+    
+    def _definition(self, rollup: Dict) -> str:
+        spec = {
+            'database': str(Path(self.db_path).resolve()),
+            'source': self.model['source'],
+            'measures': self.model['measures'],
+            'columns': self.columns(rollup)
+        }
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+    
+    def _source_sql(self, rollup: Dict) -> str:
+        source = self.model['source']
+        fact = quote_identifier(source['table'])
+        columns = self.columns(rollup)
+        
+        select = [f"COALESCE({expression}, '') AS {quote_identifier(name)}" for name, expression in columns]
+        select += [f"{expression} AS {quote_identifier(name)}" for name, expression in self.model['measures'].items()]
+        joins = "".join(
+            f" JOIN src.{quote_identifier(join['table'])} AS {quote_identifier(join['table'])} ON {join['condition']}"
+            for join in source.get('joins', [])
+        )
+        group_by = ", ".join(str(position) for position in range(1, len(columns) + 1))
+        
+        return (
+            f"SELECT {', '.join(select)} FROM src.{fact} AS {fact}{joins} "
+            f"WHERE {fact}.{quote_identifier(source['key'])} > ? AND {fact}.{quote_identifier(source['key'])} <= ? "
+            f"GROUP BY {group_by}"
+        )
+    
+    def _create(self, conn: sqlite3.Connection, rollup: Dict):
+        table = quote_identifier(rollup['name'])
+        columns = [quote_identifier(name) for name, _ in self.columns(rollup)]
+        measures = [f"{quote_identifier(name)} NOT NULL DEFAULT 0" for name in self.model['measures']]
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} ({', '.join(columns + measures)}, PRIMARY KEY ({', '.join(columns)}))")
+    
+    @contextmanager
+    def _governed(self, conn: sqlite3.Connection, budget: QueryBudget = None) -> Iterator[None]:
+        if budget is None or budget.is_unlimited():
+            yield
+            return
+        with self.governor.govern(conn, budget):
+            yield
+    
+    def _table_signal(self, conn: sqlite3.Connection, table: str) -> List[int]:
+        # Row count and highest rowid: an inserted or deleted row moves one of them without a full scan
+        return list(conn.execute(
+            f"SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM src.{quote_identifier(table)}"
+        ).fetchone())
+    
+    def _table_fingerprint(self, conn: sqlite3.Connection, table: str, where: str = "",
+                           params: Tuple = ()) -> List[int]:
+        # Row count plus a sum of per-row CRCs: order-independent, and any changed value moves it
+        columns = [quote_identifier(row[1]) for row in conn.execute(f"PRAGMA src.table_info({quote_identifier(table)})")]
+        count, checksum = conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(row_checksum(rowid, {', '.join(columns)})), 0) "
+            f"FROM src.{quote_identifier(table)} {where}",
+            params
+        ).fetchone()
+        return [count, checksum]
+    
+    def refresh(self, rebuild: bool = False, budget: QueryBudget = None, verify: bool = False,
+                allow_rebuild: bool = True, blocking: bool = True) -> Optional[Dict[str, int]]:
+        # Returns None, changing nothing, when a rollup needs a rebuild that allow_rebuild forbids
+        # or, without blocking, when another refresh is running
+        source = self.model['source']
+        fact, key = quote_identifier(source['table']), quote_identifier(source['key'])
+        token = json.loads(json.dumps(file_token(self.db_path)))
+        applied = {}
+        
+        if not self._lock.acquire(blocking):
+            return None
+        try:
+            conn = self._connect()
+            try:
+                states = {
+                    name: (definition, json.loads(fingerprint) if fingerprint else None)
+                    for name, definition, fingerprint in conn.execute(
+                        "SELECT name, definition, fingerprint FROM rollup_state"
+                    )
+                }
+                if not rebuild and all(
+                    states.get(rollup['name'], (None, None))[0] == self._definition(rollup)
+                    and (states[rollup['name']][1] or {}).get('token') == token
+                    and (not verify or states[rollup['name']][1].get('verified'))
+                    for rollup in self.model['rollups']
+                ):
+                    # The source file has not been written since the last refresh, or the last verification
+                    return {rollup['name']: 0 for rollup in self.model['rollups']}
+                
+                conn.execute("ATTACH DATABASE ? AS src", (f"file:{self.db_path}?mode=ro",))
+                with self._governed(conn, budget):
+                    conn.execute("BEGIN IMMEDIATE")
+                    high = conn.execute(f"SELECT MAX({key}) FROM src.{fact}").fetchone()[0] or 0
+                    context = {
+                        'token': token,
+                        'verify': verify,
+                        'allow_rebuild': allow_rebuild,
+                        'dimensions': {join['table']: self._table_signal(conn, join['table'])
+                                       for join in source.get('joins', [])},
+                        'scans': {}
+                    }
+                    for rollup in self.model['rollups']:
+                        applied[rollup['name']] = self._refresh_rollup(conn, rollup, fact, key, high, rebuild, context)
+                    conn.execute("COMMIT")
+            except RebuildRequired:
+                conn.execute("ROLLBACK")
+                return None
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+            
+            self.refreshes += 1
+            self.verifications += int(verify)
+            self.rows_applied += sum(applied.values())
+        finally:
+            self._lock.release()
+        return applied
+    
+    def _scan(self, context: Dict, name: str, compute: Callable[[], Union[int, List[int]]]) -> Union[int, List[int]]:
+        # Rollups usually share a watermark, so each table is counted or checksummed once per refresh
+        if name not in context['scans']:
+            context['scans'][name] = compute()
+        return context['scans'][name]
+    
+    def _dimension_checksums(self, conn: sqlite3.Connection, context: Dict) -> Dict[str, List[int]]:
+        return {
+            table: self._scan(context, f"checksum:{table}", lambda table=table: self._table_fingerprint(conn, table))
+            for table in context['dimensions']
+        }
+    
+    def _is_stale(self, conn: sqlite3.Connection, context: Dict, watermark: int, previous: Dict) -> bool:
+        fact, key = self.model['source']['table'], quote_identifier(self.model['source']['key'])
+        # An earlier invoice deleted or backfilled, or a client or product added or removed
+        history_rows = self._scan(context, f"count:{watermark}", lambda: conn.execute(
+            f"SELECT COUNT(*) FROM src.{quote_identifier(fact)} WHERE {key} <= ?", (watermark,)
+        ).fetchone()[0])
+        if previous['dimensions'] != context['dimensions'] or previous['checksums']['history'][0] != history_rows:
+            return True
+        if not context['verify']:
+            return False
+        # In-place updates only show up in a checksum of every row, which is too slow to take on each write
+        history = self._scan(context, f"checksum:{watermark}", lambda: self._table_fingerprint(
+            conn, fact, f"WHERE {key} <= ?", (watermark,)
+        ))
+        return (previous['checksums']['history'] != history
+                or previous['checksums']['dimensions'] != self._dimension_checksums(conn, context))
+    
+    def _refresh_rollup(self, conn: sqlite3.Connection, rollup: Dict, fact: str, key: str,
+                        high: int, rebuild: bool, context: Dict) -> int:
+        definition = self._definition(rollup)
+        state = conn.execute(
+            "SELECT definition, watermark, source_rows, fingerprint FROM rollup_state WHERE name = ?",
+            (rollup['name'],)
+        ).fetchone()
+        previous = json.loads(state[3]) if state and state[3] else {}
+        
+        stale = rebuild or state is None or state[0] != definition or 'checksums' not in previous
+        if not stale:
+            watermark, checksums = state[1], previous['checksums']
+            stale = self._is_stale(conn, context, watermark, previous)
+        if stale:
+            if not context['allow_rebuild']:
+                raise RebuildRequired(rollup['name'])
+            self._create(conn, rollup)
+            self.rebuilds += 1
+            watermark = 0
+            checksums = {'history': [0, 0], 'dimensions': self._dimension_checksums(conn, context)}
+        
+        appended = [0, 0]
+        if high > watermark:
+            appended = self._table_fingerprint(conn, self.model['source']['table'],
+                                               f"WHERE {key} > ? AND {key} <= ?", (watermark, high))
+            self._apply(conn, rollup, watermark, high)
+        
+        checksums = {**checksums, 'history': add_fingerprints(checksums['history'], appended)}
+        conn.execute(
+            "INSERT OR REPLACE INTO rollup_state (name, definition, watermark, source_rows, refreshed_at, fingerprint) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (rollup['name'], definition, max(high, watermark), checksums['history'][0],
+             datetime.now().isoformat(sep=' '),
+             json.dumps({'token': context['token'], 'dimensions': context['dimensions'], 'checksums': checksums,
+                         'verified': context['verify'] or stale}))
+        )
+        return appended[0]
+    
+    def _apply(self, conn: sqlite3.Connection, rollup: Dict, watermark: int, high: int):
+        table = quote_identifier(rollup['name'])
+        columns = [quote_identifier(name) for name, _ in self.columns(rollup)]
+        measures = [quote_identifier(name) for name in self.model['measures']]
+        updates = ", ".join(f"{measure} = {measure} + excluded.{measure}" for measure in measures)
+        conn.execute(
+            f"INSERT INTO {table} ({', '.join(columns + measures)}) {self._source_sql(rollup)} "
+            f"ON CONFLICT ({', '.join(columns)}) DO UPDATE SET {updates}",
+            (watermark, high)
+        )
+    
+    def query(self, sql: str, budget: QueryBudget = None) -> pd.DataFrame:
+        conn = sqlite3.connect(f"file:{self.rollup_path}?mode=ro", uri=True)
+        try:
+            if budget is None or budget.is_unlimited():
+                return pd.read_sql_query(sql, conn)
+            with self.governor.govern(conn, budget) as guard:
+                result = pd.read_sql_query(sql, conn)
+                guard.check_rows(len(result))
+                return result
+        finally:
+            conn.close()
+    
+    def row_counts(self) -> Dict[str, int]:
+        conn = sqlite3.connect(f"file:{self.rollup_path}?mode=ro", uri=True)
+        try:
+            return {
+                rollup['name']: conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(rollup['name'])}").fetchone()[0]
+                for rollup in self.model['rollups']
+            }
+        finally:
+            conn.close()
+    
+    def distinct_values(self, rollup: str, dimension: str) -> List[str]:
+        column = quote_identifier(dimension)
+        df = self.query(f"SELECT DISTINCT {column} FROM {quote_identifier(rollup)} WHERE {column} != ''")
+        return [str(value) for value in df.iloc[:, 0]]
+    
+    def stats(self) -> Dict:
+        return {
+            'refreshes': self.refreshes,
+            'rebuilds': self.rebuilds,
+            'verifications': self.verifications,
+            'rows_applied': self.rows_applied
+        }
+
+class SemanticLayer:
+    
+    def __init__(self, db: DatabaseClient = None, metrics_file: str = None, rollup_path: str = None):
+        self.db = db or DatabaseClient()
+        self.model = load_semantic_model(metrics_file or settings.METRICS_FILE)
+        self.store = RollupStore(
+            self.model, self.db.db_path, rollup_path or settings.ROLLUP_DB_PATH, self.db.governor
+        )
+        self.hits = 0
+        self.misses = 0
+        self._token = None
+        self._sizes: Dict[str, int] = {}
+        self._vocabulary: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        self._phrases: List[str] = []
+        self._verified_at = 0.0
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_settings(cls, db: DatabaseClient = None) -> Optional["SemanticLayer"]:
+        if not settings.SEMANTIC_LAYER or not Path(settings.METRICS_FILE).exists():
+            return None
+        return cls(db)
+    
+    def _load(self, token):
+        self._sizes = self.store.row_counts()
+        self._vocabulary = self._build_vocabulary()
+        self._phrases = sorted(self._vocabulary, key=lambda phrase: (-len(phrase.split()), -len(phrase)))
+        self._token = token
+    
+    def refresh(self, verify: bool = True, budget: QueryBudget = None):
+        token = self.db.data_version()
+        self.store.refresh(budget=budget, verify=verify)
+        with self._lock:
+            self._load(token)
+            if verify:
+                self._verified_at = time.time()
+    
+    def ensure_fresh(self, budget: QueryBudget = None) -> bool:
+        token = self.db.data_version()
+        with self._lock:
+            if token == self._token:
+                return True
+            if self._worker is not None and self._worker.is_alive():
+                return False
+            # Only appended invoices are folded in on the request path; rebuilds and the full
+            # checksum run in the background while questions go to the LLM
+            try:
+                fresh = self.store.refresh(budget=budget, allow_rebuild=False, blocking=False) is not None
+            except BudgetExceeded:
+                fresh = False
+            if fresh:
+                self._load(token)
+            interval = settings.ROLLUP_VERIFY_INTERVAL_SECONDS
+            if not fresh or (interval and time.time() - self._verified_at > interval):
+                self._worker = threading.Thread(target=self._refresh_in_background, name="rollup-refresh", daemon=True)
+                self._worker.start()
+            return fresh
+    
+    def _refresh_in_background(self):
+        try:
+            self.refresh(budget=QueryBudget(max_time_ms=settings.ROLLUP_REFRESH_MAX_TIME_MS))
+        except Exception as e:
+            print(f"Rollup Refresh Error: {e}")
+    
+    def wait(self, timeout: float = None) -> bool:
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+        return worker is None or not worker.is_alive()
+    
+    def _build_vocabulary(self) -> Dict[str, Tuple[str, str, Optional[str]]]:
+        vocabulary = {}
+        for name, dimension in self.model['dimensions'].items():
+            if dimension.get('filterable'):
+                rollup = self._smallest_rollup({name})
+                for value in self.store.distinct_values(rollup['name'], name):
+                    vocabulary.setdefault(normalize_words(value), ('value', name, value))
+        for name, dimension in self.model['dimensions'].items():
+            for synonym in dimension.get('synonyms', [name]):
+                vocabulary[normalize_words(synonym)] = ('dimension', name, None)
+        for name, metric in self.model['metrics'].items():
+            for synonym in metric.get('synonyms', [name]):
+                vocabulary[normalize_words(synonym)] = ('metric', name, None)
+        return vocabulary
+    
+    def _smallest_rollup(self, dimensions: set) -> Optional[Dict]:
+        candidates = [rollup for rollup in self.model['rollups'] if dimensions <= set(rollup['dimensions'])]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda rollup: self._sizes.get(rollup['name'], 0))
+    
+    def match(self, question: str) -> Optional[Dict]:
+        # Matching is over words only; comparisons and decimals are left to the LLM
+        if COMPARISON.search(question):
+            return None
+        text = f" {normalize_words(question)} "
+        metrics, dimensions, filters = [], [], {}
+        
+        for phrase in self._phrases:
+            pattern = f" {phrase} "
+            while pattern in text:
+                kind, name, value = self._vocabulary[phrase]
+                if kind == 'metric' and name not in metrics:
+                    metrics.append(name)
+                elif kind == 'dimension' and name not in dimensions:
+                    dimensions.append(name)
+                elif kind == 'value':
+                    if filters.get(name, value) != value:
+                        return None
+                    filters[name] = value
+                text = text.replace(pattern, "  ", 1)
+        
+        order, limit, ranking = None, None, None
+        for token in text.split():
+            if token in ORDER_WORDS and order is None:
+                order, ranking = ORDER_WORDS[token], token
+            elif token.isdigit() and order and limit is None:
+                limit = int(token)
+            elif token not in FILLER_WORDS:
+                return None
+        
+        if not metrics:
+            return None
+        if order and limit is None and dimensions and ranking not in ('top', 'bottom'):
+            limit = 1
+        
+        rollup = self._smallest_rollup(set(dimensions) | set(filters))
+        if rollup is None:
+            return None
+        
+        return {
+            'rollup': rollup['name'],
+            'metrics': metrics,
+            'dimensions': dimensions,
+            'filters': filters,
+            'order': order,
+            'limit': limit
+        }
+    
+    def build_sql(self, plan: Dict) -> str:
+        select, group_by, order_by = [], [], []
+        for name in plan['dimensions']:
+            dimension = self.model['dimensions'][name]
+            if dimension.get('key'):
+                group_by.append(quote_identifier(f"{name}_id"))
+            group_by.append(quote_identifier(name))
+            select.append(quote_identifier(name))
+            if dimension.get('sort'):
+                order_by.append(f"{quote_identifier(name)} {dimension['sort'].upper()}")
+        
+        for name in plan['metrics']:
+            select.append(f"{self.model['metrics'][name]['expression']} AS {quote_identifier(name)}")
+        
+        first_metric = quote_identifier(plan['metrics'][0])
+        if plan['order']:
+            order_by = [f"{first_metric} {plan['order']}"]
+        elif plan['dimensions'] and not order_by:
+            order_by = [f"{first_metric} DESC"]
+        
+        sql = f"SELECT {', '.join(select)} FROM {quote_identifier(plan['rollup'])}"
+        if plan['filters']:
+            sql += " WHERE " + " AND ".join(
+                f"{quote_identifier(name)} = {sql_literal(value)}" for name, value in plan['filters'].items()
+            )
+        if group_by:
+            sql += f" GROUP BY {', '.join(group_by)}"
+        if order_by:
+            sql += f" ORDER BY {', '.join(order_by)}"
+        if plan['limit']:
+            sql += f" LIMIT {plan['limit']}"
+        return sql
+    
+    def answer(self, question: str, budget: QueryBudget = None) -> Optional[Tuple[str, pd.DataFrame, Dict]]:
+        plan = self.match(question) if self.ensure_fresh(budget) else None
+        if plan is None:
+            self.misses += 1
+            return None
+        
+        sql = self.build_sql(plan)
+        result = self.store.query(sql, budget)
+        self.hits += 1
+        return sql, result, plan
+    
+    def stats(self) -> Dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'rollup_rows': dict(self._sizes),
+            **self.store.stats()
+        }
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Build or refresh the metric rollups")
+    parser.add_argument("--metrics-file", default=None)
+    parser.add_argument("--rollup-db", default=None)
+    parser.add_argument("--rebuild", action="store_true", help="Drop and rebuild every rollup")
+    args = parser.parse_args(argv)
+    
+    layer = SemanticLayer(metrics_file=args.metrics_file, rollup_path=args.rollup_db)
+    applied = layer.store.refresh(rebuild=args.rebuild, verify=True)
+    for name, rows in applied.items():
+        print(f"{name}: {rows:,} new source rows")
+    print(f"Rollups saved to {layer.store.rollup_path}")
+
+if __name__ == "__main__":
+    main()
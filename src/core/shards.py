@@ -0,0 +1,759 @@
+import argparse
+import json
+import sqlite3
+import threading
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from src.config import settings
+from src.core.cache import SQL_TOKEN
+from src.core.db import DatabaseClient
+from src.core.frames import FrameBuilder
+from src.core.governor import BudgetExceeded, QueryBudget, ResourceGovernor
+from src.core.schema import file_token, quote_identifier
+from src.core.tracing import span
+
+SHARD_TABLE = "invoices"
+SHARD_KEY = "invoice_date"
+AGGREGATES = {"SUM", "TOTAL", "COUNT", "MIN", "MAX", "AVG"}
+UNMERGEABLE = {"GROUP_CONCAT", "STRING_AGG", "JSON_GROUP_ARRAY", "JSON_GROUP_OBJECT"}
+UNSUPPORTED = {"WITH", "UNION", "INTERSECT", "EXCEPT", "LEFT", "RIGHT", "FULL", "OUTER"}
+CLAUSES = {"FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT"}
+IMPLICIT_ALIAS_STOPWORDS = {"and", "or", "not", "is", "in", "like", "glob", "between", "case", "when", "then", "else", "end",
+                            "null", "true", "false", "distinct", "collate", "escape", "current_date", "current_time",
+                            "current_timestamp", "select"}
+COMPARISONS = {"=", "==", ">", ">=", "<", "<="}
+MAX_KEY = "\uffff"
+
+Token = Tuple[str, str]
+
+class ShardPlanError(ValueError):
+    pass
+
+def tokenize(sql: str) -> List[Token]:
+    tokens = []
+    for match in SQL_TOKEN.finditer(sql):
+        kind = match.lastgroup
+        tokens.append(('space', " ") if kind == 'comment' else (kind, match.group()))
+    # Glue two-character operators back together so they compare as one symbol
+    merged = []
+    for kind, text in tokens:
+        if kind == 'symbol' and merged and merged[-1][0] == 'symbol' and merged[-1][1] + text in (
+                "<=", ">=", "<>", "!=", "==", "||", "<<", ">>"):
+            merged[-1] = ('symbol', merged[-1][1] + text)
+        else:
+            merged.append((kind, text))
+    return merged
+
+def _normalize(token: Token) -> str:
+    kind, text = token
+    if kind == 'word':
+        return text.lower()
+    if kind == 'ident':
+        return text[1:-1].replace('""', '"').lower()
+    return text
+
+def _key(tokens: List[Token]) -> Tuple[str, ...]:
+    return tuple(_normalize(token) for token in tokens if token[0] != 'space')
+
+def _text(tokens: List[Token]) -> str:
+    return "".join(text for _, text in tokens).strip()
+
+def _next_significant(tokens: List[Token], index: int) -> Optional[int]:
+    while index < len(tokens) and tokens[index][0] == 'space':
+        index += 1
+    return index if index < len(tokens) else None
+
+def _previous_significant(tokens: List[Token], index: int) -> Optional[int]:
+    index -= 1
+    while index >= 0 and tokens[index][0] == 'space':
+        index -= 1
+    return index if index >= 0 else None
+
+def _closing(tokens: List[Token], index: int) -> int:
+    depth = 0
+    for position in range(index, len(tokens)):
+        if tokens[position] == ('symbol', "("):
+            depth += 1
+        elif tokens[position] == ('symbol', ")"):
+            depth -= 1
+            if depth == 0:
+                return position
+    raise ShardPlanError("Unbalanced parentheses")
+
+def _split(tokens: List[Token], separator: str = ",") -> List[List[Token]]:
+    parts, current, depth = [], [], 0
+    for token in tokens:
+        if token == ('symbol', "("):
+            depth += 1
+        elif token == ('symbol', ")"):
+            depth -= 1
+        if depth == 0 and _normalize(token) == separator:
+            parts.append(current)
+            current = []
+        else:
+            current.append(token)
+    parts.append(current)
+    return [part for part in parts if _key(part)]
+
+def _literal(token: Token) -> Optional[str]:
+    kind, text = token
+    return text[1:-1].replace("''", "'") if kind == 'string' else None
+
+def _strip_alias(item: List[Token]) -> List[Token]:
+    significant = [index for index, token in enumerate(item) if token[0] != 'space']
+    if len(significant) >= 3 and _normalize(item[significant[-2]]) == "as":
+        return item[:significant[-2]]
+    if len(significant) >= 2:
+        # Implicit alias: "SUM(x) total", "c.region name"
+        last, previous = item[significant[-1]], item[significant[-2]]
+        if (last[0] in ('word', 'ident') and _normalize(last) not in IMPLICIT_ALIAS_STOPWORDS
+                and (previous == ('symbol', ")") or previous[0] in ('ident', 'string', 'number')
+                     or previous[0] == 'word' and _normalize(previous) not in IMPLICIT_ALIAS_STOPWORDS)):
+            return item[:significant[-1]]
+    return item
+
+class SelectQuery:
+    
+    def __init__(self, sql: str):
+        self.tokens = tokenize(sql.strip().rstrip(";"))
+        self.clauses: Dict[str, List[Token]] = {}
+        self.clause_starts: Dict[str, int] = {}
+        self.table_refs = 0
+        self._parse()
+        
+        select = self.clauses.get("SELECT", [])
+        first = _next_significant(select, 0)
+        self.distinct = first is not None and _normalize(select[first]) in ("distinct", "all")
+        if self.distinct:
+            self.distinct = _normalize(select[first]) == "distinct"
+            select = select[first + 1:]
+        self.items = _split(select)
+        self.group_by = _split(self.clauses.get("GROUP", []))
+        self.order_by = _split(self.clauses.get("ORDER", []))
+        self.limit, self.offset = self._parse_limit(self.clauses.get("LIMIT"))
+    
+    def _parse(self):
+        depth, current = 0, None
+        index = 0
+        while index < len(self.tokens):
+            token = self.tokens[index]
+            word = _normalize(token).upper() if token[0] == 'word' else None
+            if token == ('symbol', "("):
+                depth += 1
+            elif token == ('symbol', ")"):
+                depth -= 1
+            
+            if word in ("OVER", "WINDOW") or (depth == 0 and word in UNSUPPORTED):
+                raise ShardPlanError(f"{word} cannot be pushed down to shards")
+            if _normalize(token) == SHARD_TABLE and token[0] in ('word', 'ident'):
+                # Only FROM/JOIN positions name the table; elsewhere it can be a column alias
+                previous = _previous_significant(self.tokens, index)
+                previous = _normalize(self.tokens[previous]) if previous is not None else None
+                if previous in ("from", "join") or (previous == "," and current == "FROM"):
+                    if depth:
+                        raise ShardPlanError(f"{SHARD_TABLE} is referenced inside a subquery")
+                    self.table_refs += 1
+            
+            if depth == 0 and (word == "SELECT" and current is None or word in CLAUSES):
+                start = index
+                if word in ("GROUP", "ORDER"):
+                    following = _next_significant(self.tokens, index + 1)
+                    if following is None or _normalize(self.tokens[following]) != "by":
+                        raise ShardPlanError(f"Malformed {word} BY")
+                    index = following
+                if word in self.clauses:
+                    raise ShardPlanError(f"Repeated {word} clause")
+                current = word
+                self.clauses[current] = []
+                self.clause_starts[current] = start
+                index += 1
+                continue
+            
+            if current is None:
+                raise ShardPlanError("Only SELECT statements can be sharded")
+            self.clauses[current].append(token)
+            index += 1
+        
+        if "SELECT" not in self.clauses or "FROM" not in self.clauses:
+            raise ShardPlanError("Only SELECT ... FROM statements can be sharded")
+        if self.table_refs > 1:
+            raise ShardPlanError(f"{SHARD_TABLE} is referenced more than once")
+    
+    @staticmethod
+    def _parse_limit(tokens: Optional[List[Token]]) -> Tuple[Optional[int], int]:
+        if not tokens:
+            return None, 0
+        values = _key(tokens)
+        try:
+            if len(values) == 1:
+                return int(values[0]), 0
+            if len(values) == 3 and values[1] == "offset":
+                return int(values[0]), int(values[2])
+            if len(values) == 3 and values[1] == ",":
+                return int(values[2]), int(values[0])
+        except ValueError:
+            pass
+        raise ShardPlanError("LIMIT must use integer literals")
+    
+    def text_before(self, clause: str) -> str:
+        return _text(self.tokens[:self.clause_starts[clause]]) if clause in self.clause_starts else _text(self.tokens)
+    
+    def is_aggregate(self) -> bool:
+        if self.group_by:
+            return True
+        for tokens in self.items + [self.clauses.get("HAVING", [])]:
+            for index, token in enumerate(tokens):
+                if token[0] == 'word' and token[1].upper() in AGGREGATES | UNMERGEABLE:
+                    following = _next_significant(tokens, index + 1)
+                    if following is not None and tokens[following] == ('symbol', "("):
+                        return True
+        return False
+
+class PartialAggregates:
+    
+    def __init__(self):
+        self.columns: List[Tuple[str, str]] = []
+        self._merged: Dict[Tuple, str] = {}
+    
+    def _column(self, expression: str) -> str:
+        name = f"a{len(self.columns)}"
+        self.columns.append((name, expression))
+        return name
+    
+    def add(self, function: str, args: List[Token]) -> str:
+        key = (function, _key(args))
+        if key in self._merged:
+            return self._merged[key]
+        if key[1] and key[1][0] == "distinct":
+            raise ShardPlanError(f"{function}(DISTINCT ...) cannot be merged across shards")
+        
+        argument = _text(args)
+        if function == "AVG":
+            total, count = self._column(f"SUM({argument})"), self._column(f"COUNT({argument})")
+            merged = f"(TOTAL({total}) / NULLIF(SUM({count}), 0))"
+        elif function == "COUNT":
+            merged = f"COALESCE(SUM({self._column(f'COUNT({argument})')}), 0)"
+        else:
+            merged = f"{function}({self._column(f'{function}({argument})')})"
+        self._merged[key] = merged
+        return merged
+
+def _match_at(tokens: List[Token], index: int, replacements: List[Tuple[Tuple[str, ...], str]]) -> Optional[Tuple[int, str]]:
+    previous = _previous_significant(tokens, index)
+    if previous is not None and tokens[previous] == ('symbol', "."):
+        return None
+    
+    best = None
+    for pattern, name in replacements:
+        candidates = [pattern]
+        if len(pattern) == 1:
+            # A bare column name also matches its table-qualified form
+            candidates.append((_normalize(tokens[index]), ".", pattern[0]))
+        for candidate in candidates:
+            position, matched, last = index, 0, index
+            while position is not None and matched < len(candidate) and _normalize(tokens[position]) == candidate[matched]:
+                matched += 1
+                last = position
+                position = _next_significant(tokens, position + 1)
+            if matched != len(candidate):
+                continue
+            if position is not None and tokens[position] in (('symbol', "."), ('symbol', "(")):
+                continue
+            end = last + 1
+            if best is None or end > best[0]:
+                best = (end, name)
+    return best
+
+def _rewrite(tokens: List[Token], replacements: List[Tuple[Tuple[str, ...], str]],
+             partials: Optional[PartialAggregates] = None) -> str:
+    output, index = [], 0
+    while index < len(tokens):
+        kind, text = tokens[index]
+        if kind == 'space':
+            output.append(text)
+            index += 1
+            continue
+        
+        following = _next_significant(tokens, index + 1)
+        is_call = kind == 'word' and following is not None and tokens[following] == ('symbol', "(")
+        if is_call and text.upper() in UNMERGEABLE:
+            raise ShardPlanError(f"{text.upper()} cannot be merged across shards")
+        if is_call and partials is not None and text.upper() in AGGREGATES:
+            end = _closing(tokens, following)
+            args = tokens[following + 1:end]
+            if len(_split(args)) <= 1:
+                output.append(partials.add(text.upper(), args))
+                index = end + 1
+                continue
+        
+        match = _match_at(tokens, index, replacements)
+        if match:
+            output.append(match[1])
+            index = match[0]
+            continue
+        output.append(text)
+        index += 1
+    return "".join(output).strip()
+
+def _order_clause(query: SelectQuery, replacements: List[Tuple[Tuple[str, ...], str]],
+                  partials: Optional[PartialAggregates] = None) -> str:
+    if not query.order_by:
+        return ""
+    return " ORDER BY " + ", ".join(_rewrite(term, replacements, partials) for term in query.order_by)
+
+def _limit_clause(query: SelectQuery) -> str:
+    if query.limit is None:
+        return ""
+    return f" LIMIT {query.limit} OFFSET {query.offset}" if query.offset else f" LIMIT {query.limit}"
+
+def _key_range(where: List[Token]) -> Tuple[Optional[str], Optional[str]]:
+    # Only AND-ed predicates on the shard key narrow the range; anything under OR keeps every shard
+    if not where or any(_normalize(token) == "or" for token in where):
+        return None, None
+    
+    terms, current, pending_between = [], [], False
+    depth = 0
+    for token in where:
+        word = _normalize(token)
+        if token == ('symbol', "("):
+            depth += 1
+        elif token == ('symbol', ")"):
+            depth -= 1
+        if depth == 0 and word == "between":
+            pending_between = True
+        elif depth == 0 and word == "and":
+            if pending_between:
+                pending_between = False
+            else:
+                terms.append(current)
+                current = []
+                continue
+        current.append(token)
+    terms.append(current)
+    
+    low, high = None, None
+    for term in terms:
+        bounds = _term_range([token for token in term if token[0] != 'space'])
+        if bounds is None:
+            continue
+        if bounds[0] is not None and (low is None or bounds[0] > low):
+            low = bounds[0]
+        if bounds[1] is not None and (high is None or bounds[1] < high):
+            high = bounds[1]
+    return low, high
+
+def _column_length(tokens: List[Token]) -> int:
+    if len(tokens) >= 1 and _normalize(tokens[0]) == SHARD_KEY:
+        return 1
+    if len(tokens) >= 3 and tokens[1] == ('symbol', ".") and _normalize(tokens[2]) == SHARD_KEY:
+        return 3
+    return 0
+
+def _prefix_length(tokens: List[Token]) -> int:
+    # substr(invoice_date, 1, n) and strftime('%Y...', invoice_date) compare like a prefix of the key
+    if len(tokens) < 4 or tokens[1] != ('symbol', "("):
+        return 0
+    function = _normalize(tokens[0])
+    try:
+        end = _closing(tokens, 1)
+    except ShardPlanError:
+        return 0
+    args = _split(tokens[2:end])
+    if function in ("substr", "substring") and len(args) == 3 and _column_length(args[0]) == len(args[0]) \
+            and _key(args[1]) == ("1",):
+        return end + 1
+    if function == "strftime" and len(args) == 2 and _literal(args[0][0]) in ("%Y", "%Y-%m", "%Y-%m-%d") \
+            and _column_length(args[1]) == len(args[1]):
+        return end + 1
+    return 0
+
+def _term_range(term: List[Token]) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    column = _column_length(term)
+    prefix = 0 if column else _prefix_length(term)
+    width = column or prefix
+    if not width or width >= len(term):
+        return None
+    operator, rest = _normalize(term[width]), term[width + 1:]
+    values = [_literal(token) for token in rest]
+    
+    if operator in COMPARISONS and len(rest) == 1 and values[0] is not None:
+        value = values[0]
+        if prefix and operator not in ("=", "=="):
+            return None
+        if operator in ("=", "=="):
+            return value, value + MAX_KEY
+        return (value, None) if operator in (">", ">=") else (None, value + MAX_KEY)
+    if operator == "between" and len(rest) == 3 and _normalize(rest[1]) == "and" \
+            and values[0] is not None and values[2] is not None:
+        return values[0], values[2] + MAX_KEY
+    if operator == "like" and column and len(rest) == 1 and values[0]:
+        head = values[0].split("%")[0].split("_")[0]
+        return (head, head + MAX_KEY) if head else None
+    if operator == "in" and len(rest) >= 3 and rest[0] == ('symbol', "(") and rest[-1] == ('symbol', ")"):
+        literals = [_literal(token) for token in rest[1:-1] if token != ('symbol', ",")]
+        if literals and all(value is not None for value in literals):
+            return min(literals), max(literals) + MAX_KEY
+    return None
+
+class ShardPlan:
+    
+    def __init__(self, shard_sql: str, merge_sql: str, columns: List[str], names: List[str],
+                 shards: List[Dict], pruned: List[Dict]):
+        self.shard_sql = shard_sql
+        self.merge_sql = merge_sql
+        self.columns = columns
+        self.names = names
+        self.shards = shards
+        self.pruned = pruned
+    
+    def check(self):
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute(f"CREATE TABLE partials ({', '.join(self.columns)})")
+            conn.execute(self.merge_sql).fetchall()
+        except sqlite3.Error as e:
+            raise ShardPlanError(f"Merge query is not valid: {e}")
+        finally:
+            conn.close()
+    
+    def merge(self, parts: List[List[tuple]], result_format: str = None) -> pd.DataFrame:
+        builder = FrameBuilder(self.names, result_format)
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute(f"CREATE TABLE partials ({', '.join(self.columns)})")
+            insert = f"INSERT INTO partials VALUES ({', '.join('?' for _ in self.columns)})"
+            for rows in parts:
+                conn.executemany(insert, rows)
+            builder.add(conn.execute(self.merge_sql).fetchall())
+        finally:
+            conn.close()
+        return builder.build()
+    
+    def to_dict(self) -> Dict:
+        return {
+            'shard_sql': self.shard_sql,
+            'merge_sql': self.merge_sql,
+            'shards': [shard['path'] for shard in self.shards],
+            'pruned': [shard['path'] for shard in self.pruned]
+        }
+
+def prune_shards(shards: List[Dict], low: Optional[str], high: Optional[str]) -> Tuple[List[Dict], List[Dict]]:
+    kept, pruned = [], []
+    for shard in shards:
+        start, end = shard.get('start'), shard.get('end')
+        # Shard bounds are inclusive dates, so any timestamp on the end date still belongs to the shard
+        outside = (low is not None and end and end + MAX_KEY < low) or (high is not None and start and start > high)
+        (pruned if outside else kept).append(shard)
+    if not kept:
+        # Still run on one shard so empty results and global aggregates keep their shape
+        kept, pruned = pruned[:1], pruned[1:]
+    return kept, pruned
+
+def build_plan(sql: str, names: List[str], shards: List[Dict]) -> Optional[ShardPlan]:
+    query = SelectQuery(sql)
+    if not query.table_refs:
+        return None
+    
+    low, high = _key_range(query.clauses.get("WHERE", []))
+    kept, pruned = prune_shards(shards, low, high)
+    distinct = "DISTINCT " if query.distinct else ""
+    
+    if not query.is_aggregate():
+        columns = [f"p{position}" for position in range(len(names))]
+        replacements = [((name.lower(),), column) for name, column in zip(names, columns)]
+        # Select items line up with result columns unless a * expanded into several of them
+        if not any(_key(item)[-1:] == ("*",) for item in query.items):
+            replacements += [(_key(_strip_alias(item)), column) for item, column in zip(query.items, columns)]
+        shard_sql = query.text_before("LIMIT")
+        if query.limit is not None:
+            shard_sql += f" LIMIT {query.limit + query.offset}"
+        merge_sql = f"SELECT {distinct}* FROM partials{_order_clause(query, replacements)}{_limit_clause(query)}"
+        plan = ShardPlan(shard_sql, merge_sql, columns, names, kept, pruned)
+        plan.check()
+        return plan
+    
+    if len(query.items) != len(names):
+        raise ShardPlanError("Select list does not match the result columns")
+    
+    groups = []
+    for term in query.group_by:
+        values = _key(term)
+        if len(values) == 1 and values[0].isdigit() and 0 < int(values[0]) <= len(query.items):
+            term = _strip_alias(query.items[int(values[0]) - 1])
+        elif len(values) == 1:
+            for item in query.items:
+                alias = _key(item)
+                if len(alias) >= 3 and alias[-2] == "as" and alias[-1] == values[0]:
+                    term = _strip_alias(item)
+                    break
+        groups.append(term)
+    
+    group_columns = [f"p{position}" for position in range(len(groups))]
+    replacements = [(_key(term), group_columns[position]) for position, term in enumerate(groups)]
+    partials = PartialAggregates()
+    select = [
+        f"{_rewrite(_strip_alias(item), replacements, partials)} AS {quote_identifier(name)}"
+        for item, name in zip(query.items, names)
+    ]
+    having = query.clauses.get("HAVING")
+    having_sql = f" HAVING {_rewrite(having, replacements, partials)}" if having else ""
+    order_sql = _order_clause(query, replacements, partials)
+    
+    shard_select = [f"{_text(term)} AS {column}" for term, column in zip(groups, group_columns)]
+    shard_select += [f"{expression} AS {column}" for column, expression in partials.columns]
+    if not shard_select:
+        raise ShardPlanError("Nothing to aggregate")
+    shard_sql = f"SELECT {', '.join(shard_select)} FROM {_text(query.clauses['FROM'])}"
+    if "WHERE" in query.clauses:
+        shard_sql += f" WHERE {_text(query.clauses['WHERE'])}"
+    if groups:
+        shard_sql += f" GROUP BY {', '.join(_text(term) for term in groups)}"
+    
+    merge_sql = f"SELECT {distinct}{', '.join(select)} FROM partials"
+    if groups:
+        merge_sql += f" GROUP BY {', '.join(group_columns)}"
+    merge_sql += f"{having_sql}{order_sql}{_limit_clause(query)}"
+    
+    plan = ShardPlan(shard_sql, merge_sql, group_columns + [column for column, _ in partials.columns], names, kept, pruned)
+    plan.check()
+    return plan
+
+_worker_connections: Dict[Tuple[str, str], sqlite3.Connection] = {}
+_worker_governor = ResourceGovernor()
+
+def _worker_connection(shard_path: str, dimension_path: str) -> sqlite3.Connection:
+    conn = _worker_connections.get((shard_path, dimension_path))
+    if conn is None:
+        conn = sqlite3.connect(f"file:{shard_path}?mode=ro", uri=True, check_same_thread=False)
+        # Tables missing from the shard (clients, catalog) resolve to the attached dimension database
+        conn.execute("ATTACH DATABASE ? AS dimensions", (f"file:{dimension_path}?mode=ro",))
+        conn.execute("PRAGMA query_only = ON;")
+        conn.execute(f"PRAGMA mmap_size = {int(settings.DB_MMAP_SIZE)};")
+        conn.execute(f"PRAGMA cache_size = {int(settings.DB_CACHE_SIZE)};")
+        _worker_connections[(shard_path, dimension_path)] = conn
+    return conn
+
+def run_shard(shard_path: str, dimension_path: str, sql: str, budget: QueryBudget = None) -> Dict:
+    conn = _worker_connection(shard_path, dimension_path)
+    try:
+        with _worker_governor.govern(conn, budget or QueryBudget()) as guard:
+            cursor = conn.execute(sql)
+            rows = []
+            while True:
+                chunk = cursor.fetchmany(settings.STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                rows.extend(chunk)
+                guard.check_rows(len(rows))
+        return {'rows': rows}
+    except BudgetExceeded as e:
+        return {'budget': e.to_dict()}
+    except sqlite3.Error as e:
+        return {'error': str(e)}
+
+class ShardedDatabaseClient(DatabaseClient):
+    
+    def __init__(self, db_path: str = None, shards: List[Dict] = None, use_result_cache: bool = True,
+                 workers: int = None, result_format: str = None):
+        self.shards = [dict(shard) for shard in (settings.SHARDS if shards is None else shards)]
+        if not self.shards:
+            raise ValueError("No shards configured")
+        for shard in self.shards:
+            if not Path(shard['path']).exists():
+                raise FileNotFoundError(f"Shard not found: {shard['path']}")
+        self.workers = workers or settings.SHARD_WORKERS
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'pushed_down': 0, 'fallbacks': 0, 'shards_scanned': 0, 'shards_pruned': 0}
+        super().__init__(db_path, use_result_cache, result_format)
+    
+    def _prepare_connection(self, conn: sqlite3.Connection):
+        # Queries that cannot be pushed down run against a view over every shard; TEMP names shadow main
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(self.shards) > limit:
+            raise ValueError(f"{len(self.shards)} shards exceed SQLite's limit of {limit} attached databases")
+        selects = []
+        for position, shard in enumerate(self.shards):
+            conn.execute(f"ATTACH DATABASE ? AS shard{position}", (f"file:{shard['path']}?mode=ro",))
+            selects.append(f"SELECT * FROM shard{position}.{quote_identifier(SHARD_TABLE)}")
+        conn.execute(f"CREATE TEMP VIEW {quote_identifier(SHARD_TABLE)} AS {' UNION ALL '.join(selects)}")
+    
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+            return self._executor
+    
+    def data_version(self):
+        return (file_token(self.db_path),) + tuple(file_token(shard['path']) for shard in self.shards)
+    
+    def data_files(self) -> List[str]:
+        return super().data_files() + [str(shard['path']) for shard in self.shards]
+    
+    def plan(self, sql: str) -> Optional[ShardPlan]:
+        names = self._describe_columns(sql)
+        if names is None:
+            raise ShardPlanError("Query cannot be described")
+        return build_plan(sql, names, self.shards)
+    
+    def _count(self, **values):
+        with self._stats_lock:
+            for name, value in values.items():
+                self._stats[name] += value
+    
+    def _run_query(self, sql: str, budget: QueryBudget = None, params: Sequence = None) -> Union[pd.DataFrame, str]:
+        if self._is_modification(sql):
+            return "Error: Modification queries are not allowed"
+        if params:
+            # Placeholders can move between the shard and merge queries, so bound queries use the view
+            self._count(fallbacks=1)
+            return super()._run_query(sql, budget, params)
+        
+        try:
+            plan = self.plan(sql)
+        except ShardPlanError:
+            plan = None
+            self._count(fallbacks=1)
+        if plan is None:
+            return super()._run_query(sql, budget)
+        
+        with span('shards', scanned=len(plan.shards), pruned=len(plan.pruned)) as record:
+            result = self._scatter(plan, budget)
+            record['pushed_down'] = result is not None
+        if result is None:
+            self._count(fallbacks=1)
+            return super()._run_query(sql, budget)
+        
+        self._count(pushed_down=1, shards_scanned=len(plan.shards), shards_pruned=len(plan.pruned))
+        if budget and budget.max_rows and len(result) > budget.max_rows:
+            raise BudgetExceeded('rows', budget.max_rows, len(result))
+        return result
+    
+    def _scatter(self, plan: ShardPlan, budget: QueryBudget = None) -> Optional[pd.DataFrame]:
+        futures = [
+            self.executor.submit(run_shard, shard['path'], self.db_path, plan.shard_sql, budget)
+            for shard in plan.shards
+        ]
+        parts = []
+        try:
+            for future in futures:
+                outcome = future.result()
+                if 'budget' in outcome:
+                    violation = outcome['budget']
+                    raise BudgetExceeded(violation['kind'], violation['limit'], violation['used'])
+                if 'error' in outcome:
+                    # The single-database path reports the error, or succeeds where the rewrite did not fit
+                    return None
+                parts.append(outcome['rows'])
+        except BrokenProcessPool as e:
+            print(f"Shard Worker Error: {e}")
+            self._reset_executor()
+            return None
+        finally:
+            for future in futures:
+                future.cancel()
+        return plan.merge(parts, self.result_format)
+    
+    def get_shard_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['shards'] = len(self.shards)
+        stats['workers'] = self.workers
+        return stats
+    
+    def _reset_executor(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+    
+    def close(self):
+        self._reset_executor()
+        super().close()
+
+def open_database(db_path: str = None, use_result_cache: bool = True, result_format: str = None) -> DatabaseClient:
+    if settings.SHARDS:
+        return ShardedDatabaseClient(db_path, use_result_cache=use_result_cache, result_format=result_format)
+    return DatabaseClient(db_path, use_result_cache=use_result_cache, result_format=result_format)
+
+def split_by_year(db_path: str, output_dir: str, table: str = SHARD_TABLE, key: str = SHARD_KEY) -> List[Dict]:
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        create_sql = source.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()[0]
+        index_sql = [row[0] for row in source.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        )]
+        years = [row[0] for row in source.execute(
+            f"SELECT DISTINCT substr({quote_identifier(key)}, 1, 4) FROM {quote_identifier(table)} ORDER BY 1"
+        ) if row[0]]
+    finally:
+        source.close()
+    
+    manifest = []
+    for year in years:
+        path = output / f"{table}_{year}.db"
+        if path.exists():
+            path.unlink()
+        conn = sqlite3.connect(str(path))
+        try:
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute(create_sql)
+            conn.execute("ATTACH DATABASE ? AS source", (f"file:{db_path}?mode=ro",))
+            conn.execute(
+                f"INSERT INTO {quote_identifier(table)} SELECT * FROM source.{quote_identifier(table)} "
+                f"WHERE {quote_identifier(key)} >= ? AND {quote_identifier(key)} < ?",
+                (f"{year}-01-01", f"{int(year) + 1}-01-01")
+            )
+            conn.commit()
+            conn.execute("DETACH DATABASE source")
+            for statement in index_sql:
+                conn.execute(statement)
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+        manifest.append({'path': str(path), 'start': f"{year}-01-01", 'end': f"{year}-12-31"})
+    return manifest
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Split invoices into yearly shards and inspect shard plans")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split = commands.add_parser("split", help="Write one database per invoice year and print the manifest")
+    split.add_argument("--db", default=settings.DB_PATH)
+    split.add_argument("--output-dir", default="data/shards")
+    explain = commands.add_parser("explain", help="Show how a query is pushed down and merged")
+    explain.add_argument("sql")
+    args = parser.parse_args(argv)
+    
+    if args.command == "split":
+        manifest = split_by_year(args.db, args.output_dir)
+        print(f"Wrote {len(manifest)} shards to {args.output_dir}")
+        print(f"SHARDS='{json.dumps(manifest)}'")
+        return manifest
+    
+    db = ShardedDatabaseClient(use_result_cache=False)
+    try:
+        plan = db.plan(args.sql)
+    except ShardPlanError as e:
+        print(f"Runs on the shard view: {e}")
+        return None
+    finally:
+        db.close()
+    if plan is None:
+        print(f"Does not touch {SHARD_TABLE}, runs on {db.db_path}")
+        return None
+    print(json.dumps(plan.to_dict(), indent=2))
+    return plan
+
+if __name__ == "__main__":
+    main()
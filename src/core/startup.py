@@ -0,0 +1,98 @@
+import argparse
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+PAGE_CACHE_CHUNK = 1 << 20
+
+class StartupProfile:
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases: Dict[str, float] = {}
+    
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - start) * 1000
+    
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {'phases_ms': dict(self.phases)}
+
+def profile_imports(module: str = "src.core.engine", top: int = 10) -> Dict:
+    # -X importtime writes one line per module to stderr; a fresh interpreter keeps our own imports out of it
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=str(Path(__file__).resolve().parents[2])
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "import failed")
+    
+    packages: Dict[str, float] = {}
+    total = 0.0
+    for line in process.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0.0) + int(self_us) / 1000
+        if len(indent) == 1:
+            total += int(cumulative_us) / 1000
+    
+    ranked: List[Tuple[str, float]] = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    return {'module': module, 'total_ms': total, 'packages_ms': dict(ranked[:top])}
+
+def warm_page_cache(paths: Iterable[str], max_bytes: int) -> int:
+    # Sequential reads pull the database pages into the OS cache, so the first query does not pay for disk seeks
+    read = 0
+    for path in paths:
+        if read >= max_bytes:
+            break
+        try:
+            with open(path, 'rb', buffering=0) as f:
+                while read < max_bytes:
+                    chunk = f.read(min(PAGE_CACHE_CHUNK, max_bytes - read))
+                    if not chunk:
+                        break
+                    read += len(chunk)
+        except OSError as e:
+            print(f"Warm-up Error: {e}")
+    return read
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Report where Text2SQLEngine spends its startup time")
+    parser.add_argument("--module", default="src.core.engine", help="Module whose import time is profiled")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--no-warm-up", action="store_true", help="Only build the engine")
+    args = parser.parse_args(argv)
+    
+    imports = profile_imports(args.module, args.top)
+    print(f"import {imports['module']}: {imports['total_ms']:.0f} ms")
+    for package, elapsed in imports['packages_ms'].items():
+        print(f"  {package:<28}{elapsed:>9.1f} ms")
+    
+    from src.core.engine import Text2SQLEngine
+    start = time.perf_counter()
+    engine = Text2SQLEngine()
+    print(f"Text2SQLEngine(): {(time.perf_counter() - start) * 1000:.1f} ms")
+    if not args.no_warm_up:
+        engine.warm_up(background=False)
+    for name, elapsed in engine.startup_report()['phases_ms'].items():
+        print(f"  {name:<28}{elapsed:>9.1f} ms")
+    engine.close()
+    return imports
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import argparse
+import json
+import math
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+from src.config import settings
+from src.core.logger import read_log_tail
+
+SNAPSHOT_VERSION = 1
+UNKNOWN_MODEL = "unknown"
+
+def snapshot_path_for(log_file: str) -> Path:
+    log_file = Path(log_file)
+    return log_file.with_name(f"{log_file.stem}_stats.json")
+
+def parse_row(row: Dict) -> Dict:
+    # Buffered rows hold Python values, rows read back from the CSV hold strings
+    def number(value, kind):
+        try:
+            return kind(float(value))
+        except (TypeError, ValueError):
+            return kind(0)
+    
+    return {
+        **row,
+        'prompt_version': str(row.get('prompt_version') or ""),
+        'model': str(row.get('model') or ""),
+        'execution_success': str(row.get('execution_success')).strip().lower() == "true",
+        'rows': number(row.get('rows'), int),
+        'execution_time_ms': number(row.get('execution_time_ms'), float)
+    }
+
+class LatencySketch:
+    
+    # DDSketch: log-spaced buckets give every quantile within `accuracy` relative error, and two
+    # sketches with the same accuracy merge by adding bucket counts
+    def __init__(self, accuracy: float = None):
+        self.accuracy = accuracy or settings.STATS_SKETCH_ACCURACY
+        self.gamma = (1 + self.accuracy) / (1 - self.accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+    
+    def add(self, value: float):
+        if value > 0:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + 1
+        else:
+            self.zeros += 1
+        self.count += 1
+        self.sum += max(value, 0.0)
+    
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        if other.accuracy != self.accuracy:
+            raise ValueError("Sketches with different accuracy cannot be merged")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        return self
+    
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+    
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean_ms': self.sum / self.count if self.count else 0.0,
+            'p50_ms': self.quantile(0.50),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99)
+        }
+    
+    def to_dict(self) -> Dict:
+        return {
+            'accuracy': self.accuracy,
+            'buckets': [[key, count] for key, count in self.buckets.items()],
+            'zeros': self.zeros,
+            'count': self.count,
+            'sum': self.sum
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LatencySketch":
+        sketch = cls(data['accuracy'])
+        sketch.buckets = {int(key): int(count) for key, count in data['buckets']}
+        sketch.zeros, sketch.count, sketch.sum = data['zeros'], data['count'], data['sum']
+        return sketch
+
+class GroupStats:
+    
+    def __init__(self, accuracy: float = None):
+        self.total = 0
+        self.successes = 0
+        self.latency = LatencySketch(accuracy)
+    
+    def add(self, success: bool, execution_time_ms: float):
+        self.total += 1
+        self.successes += int(success)
+        self.latency.add(execution_time_ms)
+    
+    def merge(self, other: "GroupStats") -> "GroupStats":
+        self.total += other.total
+        self.successes += other.successes
+        self.latency.merge(other.latency)
+        return self
+    
+    def summary(self) -> Dict:
+        return {
+            'total_queries': self.total,
+            'successful_queries': self.successes,
+            'success_rate': self.successes / self.total * 100 if self.total else 0,
+            'latency': self.latency.summary()
+        }
+    
+    def to_dict(self) -> Dict:
+        return {'total': self.total, 'successes': self.successes, 'latency': self.latency.to_dict()}
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "GroupStats":
+        group = cls()
+        group.total, group.successes = data['total'], data['successes']
+        group.latency = LatencySketch.from_dict(data['latency'])
+        return group
+
+class ExperimentStats:
+    
+    def __init__(self, log_file: str = None, snapshot_path: str = None, recent: int = None, accuracy: float = None):
+        self.log_file = Path(log_file or settings.LOG_FILE)
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else snapshot_path_for(self.log_file)
+        self.recent_size = recent or settings.STATS_RECENT_EXPERIMENTS
+        self.accuracy = accuracy or settings.STATS_SKETCH_ACCURACY
+        self._lock = threading.RLock()
+        self._reset()
+    
+    def _reset(self):
+        # Keyed by (prompt_version, model); every other view is a merge over these few groups
+        self.groups: Dict[Tuple[str, str], GroupStats] = {}
+        self.recent: deque = deque(maxlen=self.recent_size)
+        self._log_offset = 0
+        self._dirty = False
+    
+    @classmethod
+    def from_settings(cls, log_file: str = None) -> "ExperimentStats":
+        stats = cls(log_file=log_file)
+        stats.load()
+        return stats
+    
+    def add(self, row: Dict):
+        row = parse_row(row)
+        key = (row['prompt_version'], row['model'])
+        with self._lock:
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = GroupStats(self.accuracy)
+            group.add(row['execution_success'], row['execution_time_ms'])
+            self.recent.append(row)
+            self._dirty = True
+    
+    def record(self, rows: Iterable[Dict], start: int, end: int):
+        with self._lock:
+            if start != self._log_offset:
+                # Another process appended in between; read its rows and ours back from the log
+                self.refresh()
+                return
+            for row in rows:
+                self.add(row)
+            self._log_offset = end
+    
+    def _read_log(self) -> List[Dict]:
+        rows, offset, reset = read_log_tail(self.log_file, self._log_offset)
+        if reset:
+            # The log was truncated or replaced; start over
+            self._reset()
+        self._log_offset = offset
+        return rows
+    
+    def refresh(self) -> int:
+        with self._lock:
+            offset = self._log_offset
+            try:
+                rows = self._read_log()
+            except Exception as e:
+                print(f"Experiment Stats Error: {e}")
+                return 0
+            for row in rows:
+                self.add(row)
+            self._dirty = self._dirty or self._log_offset != offset
+            return len(rows)
+    
+    def rebuild(self) -> int:
+        with self._lock:
+            self._reset()
+            return self.refresh()
+    
+    def load(self) -> int:
+        try:
+            data = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            if data.get('version') != SNAPSHOT_VERSION or data.get('log_file') != str(self.log_file):
+                raise ValueError("snapshot does not match this log")
+            groups = {
+                (group['prompt_version'], group['model']): GroupStats.from_dict(group) for group in data['groups']
+            }
+            if any(group.latency.accuracy != self.accuracy for group in groups.values()):
+                # Sketches of different accuracy cannot merge; rebuild them from the log
+                raise ValueError(f"snapshot sketches do not use accuracy {self.accuracy}")
+            with self._lock:
+                self.groups = groups
+                self.recent = deque(data['recent'], maxlen=self.recent_size)
+                self._log_offset = data['log_offset']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Experiment Stats Snapshot Error: {e}")
+            with self._lock:
+                self._reset()
+        return self.refresh()
+    
+    def save(self) -> bool:
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = {
+                'version': SNAPSHOT_VERSION,
+                'log_file': str(self.log_file),
+                'log_offset': self._log_offset,
+                'groups': [
+                    {'prompt_version': version, 'model': model, **group.to_dict()}
+                    for (version, model), group in self.groups.items()
+                ],
+                'recent': list(self.recent)
+            }
+            self._dirty = False
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.snapshot_path.with_suffix(".tmp")
+            temp_path.write_text(json.dumps(data, default=str), encoding="utf-8")
+            temp_path.replace(self.snapshot_path)
+        except Exception as e:
+            print(f"Experiment Stats Snapshot Error: {e}")
+            return False
+        return True
+    
+    def merged(self, prompt_version: str = None, model: str = None) -> GroupStats:
+        total = GroupStats(self.accuracy)
+        with self._lock:
+            for (version, group_model), group in self.groups.items():
+                if prompt_version is not None and version != prompt_version:
+                    continue
+                if model is not None and (group_model or UNKNOWN_MODEL) != model:
+                    continue
+                total.merge(group)
+        return total
+    
+    def success_rate(self, prompt_version: str = None, model: str = None) -> float:
+        return self.merged(prompt_version, model).summary()['success_rate']
+    
+    def summary(self, recent: int = 10) -> Dict:
+        with self._lock:
+            versions = sorted({version for version, _ in self.groups})
+            models = sorted({model or UNKNOWN_MODEL for _, model in self.groups})
+            summary = self.merged().summary()
+            summary['by_prompt_version'] = {version: self.merged(prompt_version=version).summary() for version in versions}
+            summary['by_model'] = {model: self.merged(model=model).summary() for model in models}
+            summary['recent_experiments'] = list(self.recent)[-recent:] if recent else []
+        return summary
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Summarise the experiment log from its incremental statistics")
+    parser.add_argument("--log-file", default=settings.LOG_FILE)
+    parser.add_argument("--snapshot", default=None, help="Defaults to <log>_stats.json next to the log")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute from the raw log, ignoring the snapshot")
+    args = parser.parse_args(argv)
+    
+    stats = ExperimentStats(log_file=args.log_file, snapshot_path=args.snapshot)
+    if args.rebuild:
+        stats.rebuild()
+    else:
+        stats.load()
+    stats.save()
+    
+    summary = stats.summary(recent=0)
+    print(f"{summary['total_queries']} experiments, {summary['success_rate']:.1f}% successful, "
+          f"snapshot at {stats.snapshot_path}")
+    for title, groups in (("prompt version", summary['by_prompt_version']), ("model", summary['by_model'])):
+        print(f"By {title}:")
+        for name, group in groups.items():
+            latency = group['latency']
+            print(f"  {name or '-':<24}{group['total_queries']:>8}{group['success_rate']:>8.1f}%"
+                  f"  p50 {latency['p50_ms']:.0f} ms  p95 {latency['p95_ms']:.0f} ms  p99 {latency['p99_ms']:.0f} ms")
+    return stats
+
+if __name__ == "__main__":
+    main()
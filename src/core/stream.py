@@ -0,0 +1,180 @@
+import csv
+import sqlite3
+import pandas as pd
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable, ContextManager, List, Optional, Union
+from src.core.governor import QueryGuard
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_SCHEMA_CHUNKS = 16
+
+def parquet_schema(tables: List["pa.Table"]) -> "pa.Schema":
+    # A column that is NULL throughout a chunk comes out typed `null`, which later values cannot be cast to;
+    # take its type from the other chunks and fall back to text
+    schema = pa.unify_schemas([table.schema for table in tables], promote_options="permissive")
+    return pa.schema(
+        [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema],
+        metadata=schema.metadata
+    )
+
+class QueryStream:
+    
+    def __init__(self, connection: Callable[[], ContextManager[sqlite3.Connection]], sql: str,
+                 chunk_size: int, max_rows: int = None, as_arrow: bool = False,
+                 on_close: Callable[["QueryStream"], None] = None,
+                 govern: Callable[[sqlite3.Connection], ContextManager[QueryGuard]] = None):
+        if as_arrow and pa is None:
+            raise ImportError("pyarrow is required for Arrow record batches")
+        
+        self.sql = sql
+        self.chunk_size = chunk_size
+        self.max_rows = max_rows
+        self.as_arrow = as_arrow
+        self.rows_read = 0
+        self.truncated = False
+        self.exhausted = False
+        self.closed = False
+        self.error = None
+        self._on_close = on_close
+        self.guard: Optional[QueryGuard] = None
+        self._stack = ExitStack()
+        
+        try:
+            conn = self._stack.enter_context(connection())
+            if govern:
+                # The guard stays on the connection until the stream closes, so every fetch runs under the budget
+                self.guard = self._stack.enter_context(govern(conn))
+            self._cursor = conn.execute(sql)
+        except Exception as e:
+            self.closed = True
+            self._release(e)
+            raise
+        self.columns: List[str] = [column[0] for column in self._cursor.description or []]
+    
+    def __enter__(self) -> "QueryStream":
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def __del__(self):
+        self.close()
+    
+    def __iter__(self) -> "QueryStream":
+        return self
+    
+    def __next__(self) -> Union[pd.DataFrame, "pa.RecordBatch"]:
+        if self.closed:
+            raise StopIteration
+        
+        try:
+            size = self.chunk_size
+            if self.max_rows is not None:
+                size = min(size, self.max_rows - self.rows_read)
+            
+            if size <= 0:
+                self.truncated = self._cursor.fetchone() is not None
+                rows = []
+            else:
+                rows = self._cursor.fetchmany(size)
+                self.exhausted = not rows
+            if rows and self.guard:
+                self.guard.check_rows(self.rows_read + len(rows))
+        except Exception as e:
+            self.close(e)
+            raise
+        
+        if not rows:
+            self.close()
+            raise StopIteration
+        
+        self.rows_read += len(rows)
+        return self._to_chunk(rows)
+    
+    def _to_chunk(self, rows: list) -> Union[pd.DataFrame, "pa.RecordBatch"]:
+        df = pd.DataFrame.from_records(rows, columns=self.columns)
+        if self.as_arrow:
+            return pa.RecordBatch.from_pandas(df, preserve_index=False)
+        return df
+    
+    def _release(self, error: Exception = None):
+        # Passing the error through the stack lets the governor replace an interrupt with the budget it broke
+        if error is None:
+            self._stack.close()
+        else:
+            self._stack.__exit__(type(error), error, error.__traceback__)
+    
+    def close(self, error: Exception = None):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._release(error)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if error is not None:
+                self.error = str(error)
+            if self._on_close:
+                callback, self._on_close = self._on_close, None
+                callback(self)
+    
+    def to_frame(self) -> pd.DataFrame:
+        chunks = [chunk.to_pandas() if self.as_arrow else chunk for chunk in self]
+        if not chunks:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(chunks, ignore_index=True)
+    
+    def to_csv(self, path: str) -> int:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow(self.columns)
+            for chunk in self:
+                df = chunk.to_pandas() if self.as_arrow else chunk
+                df.to_csv(f, header=False, index=False)
+        return self.rows_read
+    
+    def to_parquet(self, path: str) -> int:
+        if pq is None:
+            raise ImportError("pyarrow is required for Parquet export")
+        
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        writer: Optional["pq.ParquetWriter"] = None
+        pending: List["pa.Table"] = []
+        try:
+            for chunk in self:
+                table = pa.Table.from_batches([chunk]) if self.as_arrow else pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    # The writer's schema is fixed once opened, so hold chunks back until every column has a type
+                    pending.append(table)
+                    untyped = any(pa.types.is_null(field.type) for field in pa.unify_schemas(
+                        [held.schema for held in pending], promote_options="permissive"))
+                    if untyped and len(pending) < PARQUET_SCHEMA_CHUNKS:
+                        continue
+                    writer = self._write_pending(path, pending)
+                    pending = []
+                elif table.schema != writer.schema:
+                    writer.write_table(table.cast(writer.schema))
+                else:
+                    writer.write_table(table)
+            if pending:
+                writer = self._write_pending(path, pending)
+        finally:
+            if writer is not None:
+                writer.close()
+        return self.rows_read
+    
+    def _write_pending(self, path: str, tables: List["pa.Table"]) -> "pq.ParquetWriter":
+        schema = parquet_schema(tables)
+        writer = pq.ParquetWriter(path, schema)
+        for table in tables:
+            writer.write_table(table if table.schema == schema else table.cast(schema))
+        return writer
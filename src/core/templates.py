@@ -0,0 +1,372 @@
+import calendar
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from src.config import settings
+from src.core.cache import SQL_TOKEN, TRAILING_PUNCTUATION, LRUCache
+from src.core.db import DatabaseClient
+from src.core.retriever import MAX_VALUE_LENGTH, TEXT_TYPE
+from src.core.schema import quote_identifier
+
+QUESTION_TOKEN = re.compile(
+    r"(?P<date>\d{4}-\d{2}-\d{2})|(?P<month>\d{4}-\d{2})(?!\d)"
+    r"|(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?(?!\d)|\d+(?:\.\d+)?)|(?P<word>\w+)|(?P<symbol>[^\w\s]+)"
+)
+# Bumped whenever parse_question changes what a template key means; rows with another version are dropped
+TEMPLATE_KEY_VERSION = 2
+YEAR = re.compile(r"(?:19|20)\d\d$")
+DATE_LIKE = re.compile(r"(?:19|20)\d\d")
+NUMERIC_VALUE = re.compile(r"[\d\s.:/-]+$")
+YEAR_SUFFIX = re.compile(r"-(\d{2})(?:-(\d{2}))?$")
+MONTH_SUFFIX = re.compile(r"-(\d{2})$")
+MONTH_VALUE = re.compile(r"(\d{4})-(0[1-9]|1[0-2])$")
+TRANSFORMS = {'exact': lambda value: value, 'lower': str.lower, 'upper': str.upper}
+
+Slot = Tuple[str, str, str]
+
+def question_tokens(text: str) -> List[Tuple[str, str]]:
+    # Operators stay in the key: 'revenue > 1000' and 'revenue < 500' must not share a template
+    tokens = [(match.lastgroup, match.group()) for match in QUESTION_TOKEN.finditer(text.lower())]
+    while tokens and tokens[-1][1] in TRAILING_PUNCTUATION:
+        tokens.pop()
+    return tokens
+
+def parse_question(question: str, values: Dict[Tuple[str, ...], Tuple[str, str]] = None,
+                   longest: int = 0) -> Tuple[str, List[Slot]]:
+    tokens = question_tokens(question)
+    values = values or {}
+    parts, slots = [], []
+    i = 0
+    while i < len(tokens):
+        for size in range(min(longest, len(tokens) - i), 0, -1):
+            phrase = tuple(text for _, text in tokens[i:i + size])
+            if phrase in values:
+                column, value = values[phrase]
+                parts.append(f"{{{column}}}")
+                slots.append(('value', column, value))
+                i += size
+                break
+        else:
+            kind, text = tokens[i]
+            if kind == 'number':
+                # '1,000' is one literal; the SQL holds it without the grouping commas
+                text = text.replace(",", "")
+                if YEAR.match(text):
+                    kind = 'year'
+            if kind in ('word', 'symbol'):
+                parts.append(text)
+            else:
+                parts.append(f"{{{kind}}}")
+                slots.append((kind, kind, text))
+            i += 1
+    return " ".join(parts), slots
+
+def _sql_tokens(sql: str) -> List[Tuple[str, str]]:
+    tokens = []
+    for match in SQL_TOKEN.finditer(sql):
+        kind, text = match.lastgroup, match.group()
+        # SQL_TOKEN splits 1.5 into three tokens; literals need it whole
+        if (text.isdigit() and len(tokens) >= 2 and tokens[-1] == ('symbol', '.')
+                and tokens[-2][0] == 'number' and tokens[-2][1].isdigit()):
+            tokens[-2:] = [('number', f"{tokens[-2][1]}.{text}")]
+            continue
+        tokens.append(('number' if kind == 'word' and text.isdigit() else kind, text))
+    return tokens
+
+def _suffix_spec(slot_kind: str, value: str, suffix: str) -> Optional[List]:
+    # A suffix is kept only when it means the same day for every year or month bound later
+    if slot_kind == 'year':
+        match = YEAR_SUFFIX.match(suffix)
+        if not match or (match.group(1) == "02" and match.group(2) in ("28", "29")):
+            return None
+        return ['str', 'prefix', suffix]
+    
+    match, month = MONTH_SUFFIX.match(suffix), MONTH_VALUE.match(value)
+    if not match or not month:
+        return None
+    if match.group(1) == "01":
+        return ['str', 'prefix', suffix]
+    # '2023-02-28' is the end of February; bound to March it must become '2023-03-31', not the 28th
+    if int(match.group(1)) == calendar.monthrange(int(month.group(1)), int(month.group(2)))[1]:
+        return ['str', 'month_end', ""]
+    return None
+
+def _month_end(value: str) -> Optional[str]:
+    month = MONTH_VALUE.match(value)
+    if not month:
+        return None
+    return f"{value}-{calendar.monthrange(int(month.group(1)), int(month.group(2)))[1]:02d}"
+
+def _match_literal(slot: Slot, kind: str, text: str) -> Optional[List]:
+    slot_kind, _, value = slot
+    if kind == 'number':
+        if slot_kind in ('number', 'year') and float(text) == float(value):
+            return ['float' if '.' in text else 'int', 'exact', ""]
+        return None
+    if kind != 'string':
+        return None
+    
+    content = text[1:-1].replace("''", "'")
+    if slot_kind == 'value':
+        for transform, apply in TRANSFORMS.items():
+            if content == apply(value):
+                return ['str', transform, ""]
+    elif slot_kind in ('year', 'month', 'date'):
+        if content == value:
+            return ['str', 'exact', ""]
+        # Range bounds such as '2023-01-01' keep their suffix when another year is bound
+        if slot_kind != 'date' and content.startswith(value + "-"):
+            return _suffix_spec(slot_kind, value, content[len(value):])
+    return None
+
+def parameterize(sql: str, slots: List[Slot]) -> Optional[Tuple[str, List[List]]]:
+    tokens = _sql_tokens(sql)
+    if any(token == ('symbol', '?') for token in tokens):
+        return None
+    
+    mapped: Dict[int, List] = {}
+    for index, slot in enumerate(slots):
+        matches = [(position, _match_literal(slot, kind, text)) for position, (kind, text) in enumerate(tokens)]
+        matches = [(position, spec) for position, spec in matches if spec is not None]
+        # A number that appears twice may be a coincidental constant, and a literal the SQL never
+        # uses (e.g. "last 3 months" written as date arithmetic) cannot be rebound safely
+        if not matches or (slot[0] == 'number' and len(matches) > 1):
+            return None
+        for position, spec in matches:
+            if position in mapped:
+                return None
+            mapped[position] = [index] + spec
+    
+    if any(slot[0] in ('year', 'month', 'date') for slot in slots):
+        for position, (kind, text) in enumerate(tokens):
+            # An unbound '2024-01-01' next to a bound 2023 is an upper bound that would go stale
+            if position not in mapped and kind in ('string', 'number') and DATE_LIKE.search(text):
+                return None
+    
+    template = "".join("?" if position in mapped else text for position, (_, text) in enumerate(tokens))
+    return template, [mapped[position] for position in sorted(mapped)]
+
+def bind(spec: List[List], slots: List[Slot]) -> Optional[List]:
+    params = []
+    for index, kind, transform, suffix in spec:
+        value = slots[index][2]
+        if kind == 'int':
+            if not value.isdigit():
+                return None
+            params.append(int(value))
+        elif kind == 'float':
+            params.append(float(value))
+        elif transform == 'prefix':
+            # Templates stored before suffixes were checked may hold a day that is wrong for this month
+            if _suffix_spec(slots[index][0], value, suffix) != ['str', 'prefix', suffix]:
+                return None
+            params.append(value + suffix)
+        elif transform == 'month_end':
+            end = _month_end(value)
+            if end is None:
+                return None
+            params.append(end)
+        else:
+            params.append(TRANSFORMS[transform](value))
+    return params
+
+def render_sql(sql: str, params: Sequence) -> str:
+    values = iter(params)
+    parts = []
+    for kind, text in _sql_tokens(sql):
+        if (kind, text) == ('symbol', '?'):
+            value = next(values)
+            text = "'" + value.replace("'", "''") + "'" if isinstance(value, str) else repr(value)
+        parts.append(text)
+    return "".join(parts)
+
+class TemplateCache:
+    
+    def __init__(self, db: DatabaseClient, cache_file: str = None, max_values: int = None,
+                 ttl_seconds: float = None):
+        self.db = db
+        self.cache_file = Path(cache_file or settings.CACHE_DB_PATH)
+        self.max_values = max_values or settings.TEMPLATE_MAX_VALUES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.CACHE_TTL_SECONDS
+        self.memory = LRUCache(settings.CACHE_MAX_ENTRIES, self.ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.rejected = 0
+        self.failures = 0
+        self._values: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+        self._longest = 0
+        self._values_hash = None
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+    
+    def _connect(self) -> sqlite3.Connection:
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.cache_file), timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS templates (
+                template TEXT,
+                schema_hash TEXT,
+                prompt_version TEXT,
+                kinds TEXT,
+                sql TEXT,
+                params TEXT,
+                created_at REAL,
+                key_version INTEGER,
+                PRIMARY KEY (template, schema_hash, prompt_version)
+            )
+        """)
+        if 'key_version' not in {row[1] for row in conn.execute("PRAGMA main.table_info(templates)")}:
+            conn.execute("ALTER TABLE templates ADD COLUMN key_version INTEGER")
+        conn.execute("DELETE FROM templates WHERE key_version IS NOT ?", (TEMPLATE_KEY_VERSION,))
+        conn.commit()
+        return conn
+    
+    def _load_values(self) -> Dict[Tuple[str, ...], Tuple[str, str]]:
+        values, ambiguous = {}, set()
+        for table, info in self.db.get_schema_catalog().items():
+            for column in info['columns']:
+                if not TEXT_TYPE.search(column['type'] or ""):
+                    continue
+                name = quote_identifier(column['name'])
+                result = self.db.execute_query(
+                    f"SELECT DISTINCT {name} FROM {quote_identifier(table)} "
+                    f"WHERE {name} IS NOT NULL LIMIT {self.max_values + 1}",
+                    use_cache=False
+                )
+                # Only low-cardinality columns (regions, categories) are slots; names and ids stay literal
+                if isinstance(result, str) or len(result) > self.max_values:
+                    continue
+                for value in result.iloc[:, 0]:
+                    if not isinstance(value, str) or len(value) > MAX_VALUE_LENGTH or NUMERIC_VALUE.match(value):
+                        continue
+                    phrase = tuple(text for _, text in question_tokens(value))
+                    if phrase in values and values[phrase] != (column['name'].lower(), value):
+                        ambiguous.add(phrase)
+                    values[phrase] = (column['name'].lower(), value)
+        for phrase in ambiguous:
+            del values[phrase]
+        return values
+    
+    def _ensure_values(self, schema_hash: str):
+        with self._lock:
+            if self._values_hash == schema_hash:
+                return
+        values = self._load_values()
+        with self._lock:
+            self._values, self._values_hash = values, schema_hash
+            self._longest = max((len(phrase) for phrase in values), default=0)
+    
+    def parse(self, question: str, schema_hash: str) -> Tuple[str, List[Slot]]:
+        self._ensure_values(schema_hash)
+        return parse_question(question, self._values, self._longest)
+    
+    @staticmethod
+    def make_key(template: str, schema_hash: str, prompt_version: str) -> str:
+        return f"{template}|{schema_hash}|{prompt_version}"
+    
+    def _get(self, template: str, schema_hash: str, prompt_version: str) -> Optional[Dict]:
+        key = self.make_key(template, schema_hash, prompt_version)
+        entry = self.memory.get(key)
+        if entry is not None:
+            return entry
+        
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kinds, sql, params, created_at FROM templates "
+                "WHERE template = ? AND schema_hash = ? AND prompt_version = ?",
+                (template, schema_hash, prompt_version)
+            ).fetchone()
+        if row is None or (self.ttl_seconds and time.time() - row[3] > self.ttl_seconds):
+            return None
+        entry = {'kinds': json.loads(row[0]), 'sql': row[1], 'params': json.loads(row[2])}
+        self.memory.put(key, entry, row[3])
+        return entry
+    
+    def match(self, question: str, schema_hash: str, prompt_version: str) -> Optional[Tuple[str, str, List]]:
+        template, slots = self.parse(question, schema_hash)
+        entry = self._get(template, schema_hash, prompt_version) if slots else None
+        params = None
+        if entry is not None and entry['kinds'] == [slot[0] for slot in slots]:
+            params = bind(entry['params'], slots)
+        
+        with self._lock:
+            if params is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return (template, entry['sql'], params) if params is not None else None
+    
+    def learn(self, question: str, sql: str, schema_hash: str, prompt_version: str) -> bool:
+        template, slots = self.parse(question, schema_hash)
+        if not slots:
+            return False
+        prepared = parameterize(sql, slots)
+        if prepared is None:
+            with self._lock:
+                self.rejected += 1
+            return False
+        
+        template_sql, spec = prepared
+        kinds = [slot[0] for slot in slots]
+        now = time.time()
+        self.memory.put(self.make_key(template, schema_hash, prompt_version),
+                        {'kinds': kinds, 'sql': template_sql, 'params': spec}, now)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO templates VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (template, schema_hash, prompt_version, json.dumps(kinds), template_sql, json.dumps(spec), now,
+                 TEMPLATE_KEY_VERSION)
+            )
+            self._conn.commit()
+            self.learned += 1
+        return True
+    
+    def discard(self, template: str, schema_hash: str, prompt_version: str):
+        self.memory.pop(self.make_key(template, schema_hash, prompt_version))
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM templates WHERE template = ? AND schema_hash = ? AND prompt_version = ?",
+                (template, schema_hash, prompt_version)
+            )
+            self._conn.commit()
+            self.failures += 1
+    
+    def invalidate(self, schema_hash: str = None, prompt_version: str = None) -> int:
+        clauses, params = [], []
+        if schema_hash is not None:
+            clauses.append("schema_hash != ?")
+            params.append(schema_hash)
+        if prompt_version is not None:
+            clauses.append("prompt_version = ?")
+            params.append(prompt_version)
+        where = f" WHERE {' OR '.join(clauses)}" if clauses else ""
+        
+        with self._lock:
+            removed = self._conn.execute(f"DELETE FROM templates{where}", params).rowcount
+            self._conn.commit()
+        self.memory.clear()
+        return removed
+    
+    def clear(self) -> int:
+        return self.invalidate()
+    
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM templates").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total * 100) if total > 0 else 0,
+            'templates': stored,
+            'learned': self.learned,
+            'rejected': self.rejected,
+            'failures': self.failures,
+            'slot_values': len(self._values)
+        }
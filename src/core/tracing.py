@@ -0,0 +1,240 @@
+import bisect
+import contextvars
+import cProfile
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from src.config import settings
+
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("text2sql_trace", default=None)
+
+class Histogram:
+    
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+    
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum_ms': self.sum,
+            'mean_ms': self.sum / self.count if self.count else 0.0,
+            'p50_ms': self.quantile(0.50),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99)
+        }
+
+class MetricsRegistry:
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+    
+    def observe(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(elapsed_ms)
+    
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+    
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'stages': {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+                'counters': dict(self.counters)
+            }
+    
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP text2sql_stage_duration_seconds Duration of each ask() pipeline stage",
+            "# TYPE text2sql_stage_duration_seconds histogram"
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'text2sql_stage_duration_seconds_bucket{{stage="{stage}",le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'text2sql_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'text2sql_stage_duration_seconds_sum{{stage="{stage}"}} {histogram.sum / 1000:.6f}')
+                lines.append(f'text2sql_stage_duration_seconds_count{{stage="{stage}"}} {histogram.count}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE text2sql_{name} counter")
+                lines.append(f"text2sql_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+class Trace:
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self._token = None
+    
+    def activate(self) -> "Trace":
+        self._token = _current_trace.set(self)
+        return self
+    
+    def deactivate(self):
+        if self._token is not None:
+            _current_trace.reset(self._token)
+            self._token = None
+    
+    def durations(self) -> Dict[str, float]:
+        return stage_durations(self.spans)
+
+def stage_durations(spans: List[Dict]) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for record in spans:
+        totals[record['name']] = totals.get(record['name'], 0.0) + record['duration_ms']
+    return totals
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Dict]:
+    trace = _current_trace.get()
+    record = {'name': name, **attributes}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        record['duration_ms'] = elapsed_ms
+        if trace is not None:
+            record['start_ms'] = (start - trace.started) * 1000
+            trace.spans.append(record)
+        REGISTRY.observe(name, elapsed_ms)
+
+def record_request(metadata: dict):
+    REGISTRY.increment("requests_total")
+    if not metadata.get('success'):
+        REGISTRY.increment("requests_failed_total")
+    for key in ('cache_hit', 'result_cache_hit', 'template_hit'):
+        if metadata.get(key):
+            REGISTRY.increment(f"{key}s_total")
+    memory = metadata.get('memory')
+    if memory and not memory.get('cached'):
+        REGISTRY.increment("result_bytes_total", memory['bytes'])
+        REGISTRY.increment("result_peak_bytes_total", memory['peak_bytes'])
+    REGISTRY.observe("total", metadata.get('execution_time_ms', 0.0))
+
+class SlowRequestProfiler:
+    
+    def __init__(self, threshold_ms: float = None, sample_rate: float = None, output_dir: str = None):
+        self.threshold_ms = settings.PROFILE_SLOW_MS if threshold_ms is None else threshold_ms
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.output_dir = Path(output_dir or settings.PROFILE_DIR)
+        self.profiled = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0 and self.sample_rate > 0
+    
+    @contextmanager
+    def profile(self, metadata: dict) -> Iterator[None]:
+        # cProfile is per-thread and costly, so only one sampled request runs under it at a time
+        if not self.enabled or random.random() >= self.sample_rate or not self._lock.acquire(blocking=False):
+            yield
+            return
+        
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            self.profiled += 1
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= self.threshold_ms:
+                metadata['profile'] = self._save(profiler, elapsed_ms)
+        finally:
+            self._lock.release()
+    
+    def _save(self, profiler: cProfile.Profile, elapsed_ms: float) -> str:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"ask_{datetime.now():%Y%m%d_%H%M%S_%f}_{elapsed_ms:.0f}ms.prof"
+        profiler.dump_stats(str(path))
+        self.saved += 1
+        return str(path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = REGISTRY.to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, content_type = json.dumps(REGISTRY.to_dict()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, format, *args):
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int = None, host: str = None) -> Optional[ThreadingHTTPServer]:
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host or settings.METRICS_HOST, port or settings.METRICS_PORT), _MetricsHandler)
+        except OSError as e:
+            print(f"Metrics Server Error: {e}")
+            return None
+        threading.Thread(target=_server.serve_forever, name="text2sql-metrics", daemon=True).start()
+        return _server
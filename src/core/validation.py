@@ -1,29 +1,45 @@
-import pandera as pa
-from pandera import Column, DataFrameSchema, Check
+import time
+import numpy as np
+from functools import lru_cache
 import pandas as pd
-from typing import Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+from src.config import settings
 
-financial_schema = DataFrameSchema({
-    "revenue": Column(float, checks=Check.ge(0), nullable=True, coerce=True),
-    "profit": Column(float, nullable=True, coerce=True),
-}, strict=False)
+REGIONS = ["asia pacific", "europe", "latin america", "north america"]
+HASH_CHUNK_ROWS = 65536
 
-regional_schema = DataFrameSchema({
-    "region": Column(str, checks=Check.isin(["asia pacific", "europe", "latin america", "north america"]), nullable=False),
-}, strict=False)
-
-category_schema = DataFrameSchema({
-    "category": Column(str, nullable=False),
-}, strict=False)
+@lru_cache(maxsize=1)
+def pandera_schemas() -> Dict:
+    # pandera is slow to import and only validate_result needs it; ValidationEngine runs without it
+    from pandera import Column, DataFrameSchema, Check
+    return {
+        "financial": DataFrameSchema({
+            "revenue": Column(float, checks=Check.ge(0), nullable=True, coerce=True, required=False),
+            "profit": Column(float, nullable=True, coerce=True, required=False),
+        }, strict=False),
+        "regional": DataFrameSchema({
+            "region": Column(str, checks=Check.isin(REGIONS), nullable=False),
+        }, strict=False),
+        "category": DataFrameSchema({
+            "category": Column(str, nullable=False),
+        }, strict=False),
+        "quantity": DataFrameSchema({
+            "quantity": Column(int, checks=Check.ge(0), nullable=False, coerce=True),
+        }, strict=False),
+    }
 
-quantity_schema = DataFrameSchema({
-    "quantity": Column(int, checks=Check.ge(0), nullable=False, coerce=True),
-}, strict=False)
+def __getattr__(name: str):
+    # financial_schema and the other module-level schemas stay importable, built on first use
+    kind = name[:-len("_schema")] if name.endswith("_schema") else None
+    if kind in ("financial", "regional", "category", "quantity"):
+        return pandera_schemas()[kind]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def validate_result(df: pd.DataFrame, schema_type: str = "auto") -> Tuple[bool, str]:
     if df.empty:
         return True, ""
     
+    import pandera as pa
     try:
         if schema_type == "auto":
             if any(col in df.columns for col in ["revenue", "profit"]):
@@ -37,18 +53,12 @@ def validate_result(df: pd.DataFrame, schema_type: str = "auto") -> Tuple[bool,
             else:
                 return True, ""
         
-        if schema_type == "financial":
-            financial_schema.validate(df, lazy=True)
-        elif schema_type == "regional":
-            regional_schema.validate(df, lazy=True)
-        elif schema_type == "category":
-            category_schema.validate(df, lazy=True)
-        elif schema_type == "quantity":
-            quantity_schema.validate(df, lazy=True)
+        if schema_type in ("financial", "regional", "category", "quantity"):
+            pandera_schemas()[schema_type].validate(df, lazy=True)
         
         return True, ""
     
-    except pa.errors.SchemaError as e:
+    except (pa.errors.SchemaError, pa.errors.SchemaErrors) as e:
         error_msg = f"Validation Failed: {str(e)}"
         return False, error_msg
 
@@ -59,7 +69,7 @@ def check_data_quality(df: pd.DataFrame) -> dict:
         "missing_values": df.isnull().sum().to_dict(),
         "duplicate_rows": df.duplicated().sum(),
         "numeric_columns": list(df.select_dtypes(include=['number']).columns),
-        "text_columns": list(df.select_dtypes(include=['object']).columns),
+        "text_columns": list(df.select_dtypes(include=['object', 'string', 'category']).columns),
     }
     
     for col in report["numeric_columns"]:
@@ -68,3 +78,286 @@ def check_data_quality(df: pd.DataFrame) -> dict:
             report[f"{col}_negative_values"] = negative_count
     
     return report
+
+def _numeric_values(series: pd.Series) -> np.ndarray:
+    # Plain NumPy columns, downcast ones included, are compared in place rather than copied to float64
+    if isinstance(series, pd.Series) and isinstance(series.dtype, np.dtype) and series.dtype.kind in "iuf":
+        return series.to_numpy()
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    # murmur3 finalizer, spreads combined column hashes across all 64 bits
+    hashes = hashes ^ (hashes >> np.uint64(33))
+    hashes = hashes * np.uint64(0xFF51AFD7ED558CCD)
+    hashes = hashes ^ (hashes >> np.uint64(33))
+    hashes = hashes * np.uint64(0xC4CEB9FE1A85EC53)
+    return hashes ^ (hashes >> np.uint64(33))
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    # Exact while values fit in the 53-bit float mantissa, which holds for precision >= 11
+    return np.frexp(values.astype(np.float64))[1]
+
+def _hash_column(series: pd.Series) -> np.ndarray:
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return pd.util.hash_pandas_object(series, index=False).to_numpy()
+    # Text is factorized first so each distinct value is hashed once, nulls take the last slot
+    codes, uniques = pd.factorize(series)
+    lookup = pd.util.hash_pandas_object(pd.Series(uniques, dtype=object), index=False).to_numpy()
+    return np.append(lookup, np.uint64(0))[codes]
+
+def _count_unique(hashes: np.ndarray) -> int:
+    if not len(hashes):
+        return 0
+    ordered = np.sort(hashes)
+    return int(np.count_nonzero(ordered[1:] != ordered[:-1])) + 1
+
+class HyperLogLog:
+    
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+    
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(len(self.registers))
+    
+    def add_hashes(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        suffix_bits = 64 - self.precision
+        index = (hashes >> np.uint64(suffix_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << suffix_bits) - 1)
+        rank = (suffix_bits + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+    
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+    
+    def count(self) -> int:
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+class ColumnRule:
+    
+    def __init__(self, column: str, kind: str, nullable: bool = True, required: bool = True,
+                 minimum: float = None, allowed: Sequence[str] = None):
+        self.column = column
+        self.kind = kind
+        self.nullable = nullable
+        self.required = required
+        self.minimum = minimum
+        self.allowed = np.array(sorted(allowed), dtype=object) if allowed is not None else None
+    
+    def check(self, series: pd.Series) -> List[str]:
+        failures = []
+        nulls = series.isna().to_numpy()
+        if not self.nullable and nulls.any():
+            failures.append(f"{self.column}: {int(nulls.sum())} null values")
+        
+        if self.kind == "str":
+            failures.extend(self._check_text(series, nulls))
+        else:
+            failures.extend(self._check_numeric(series, nulls))
+        return failures
+    
+    def _check_numeric(self, series: pd.Series, nulls: np.ndarray) -> List[str]:
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            values = _numeric_values(series)
+        else:
+            values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            invalid = np.isnan(values) & ~nulls
+            if invalid.any():
+                return [f"{self.column}: {int(invalid.sum())} values not coercible to {self.kind}"]
+        
+        if self.minimum is not None:
+            below = int(np.count_nonzero(values < self.minimum))
+            if below:
+                return [f"{self.column}: {below} values below {self.minimum:g}"]
+        return []
+    
+    def _check_text(self, series: pd.Series, nulls: np.ndarray) -> List[str]:
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Only the categories need checking, rows map to them through integer codes
+            categories = series.cat.categories.to_numpy(dtype=object)
+            codes = series.cat.codes.to_numpy()
+            bad = np.zeros(len(categories), dtype=bool)
+            bad |= ~np.array([isinstance(value, str) for value in categories], dtype=bool)
+            if self.allowed is not None:
+                bad |= ~np.isin(categories, self.allowed)
+            failing = int(np.count_nonzero(np.isin(codes, np.flatnonzero(bad))))
+            return [f"{self.column}: {failing} values not in allowed set"] if failing else []
+        
+        if isinstance(series.dtype, pd.StringDtype):
+            # Text by construction; the membership test runs on the string buffers without boxing each value
+            if self.allowed is not None:
+                outside = int(np.count_nonzero(~series.isin(self.allowed).to_numpy(dtype=bool, na_value=True) & ~nulls))
+                if outside:
+                    return [f"{self.column}: {outside} values not in allowed set"]
+            return []
+        
+        values = series.to_numpy(dtype=object)[~nulls]
+        if len(values) and pd.api.types.infer_dtype(values, skipna=True) != "string":
+            return [f"{self.column}: values are not text"]
+        if self.allowed is not None:
+            outside = int(np.count_nonzero(~np.isin(values, self.allowed)))
+            if outside:
+                return [f"{self.column}: {outside} values not in allowed set"]
+        return []
+
+RULES: Dict[str, List[ColumnRule]] = {
+    "financial": [
+        ColumnRule("revenue", "float", minimum=0, required=False),
+        ColumnRule("profit", "float", required=False)
+    ],
+    "regional": [ColumnRule("region", "str", nullable=False, allowed=REGIONS)],
+    "category": [ColumnRule("category", "str", nullable=False)],
+    "quantity": [ColumnRule("quantity", "int", nullable=False, minimum=0)]
+}
+
+@lru_cache(maxsize=256)
+def detect_schema(columns: Tuple[str, ...]) -> Optional[str]:
+    if any(col in columns for col in ["revenue", "profit"]):
+        return "financial"
+    if "region" in columns:
+        return "regional"
+    if "category" in columns:
+        return "category"
+    if "quantity" in columns:
+        return "quantity"
+    return None
+
+class ValidationEngine:
+    
+    def __init__(self, sample_rows: int = None, time_budget_ms: float = None, precision: int = 14, seed: int = 0):
+        self.sample_rows = settings.VALIDATION_SAMPLE_ROWS if sample_rows is None else sample_rows
+        self.time_budget_ms = settings.VALIDATION_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+        self.precision = precision
+        self.seed = seed
+    
+    def _deadline(self) -> float:
+        return time.perf_counter() + self.time_budget_ms / 1000 if self.time_budget_ms else float("inf")
+    
+    def _sample(self, df: pd.DataFrame) -> pd.DataFrame:
+        if not self.sample_rows or len(df) <= self.sample_rows:
+            return df
+        rng = np.random.default_rng(self.seed)
+        positions = np.sort(rng.choice(len(df), size=self.sample_rows, replace=False))
+        return df.take(positions)
+    
+    def validate(self, df: pd.DataFrame, schema_type: str = "auto") -> Dict:
+        start = time.perf_counter()
+        report = {'passed': True, 'schema': None, 'errors': [], 'rows_checked': 0, 'sampled': False, 'skipped': []}
+        if df.empty:
+            return report
+        
+        if schema_type == "auto":
+            schema_type = detect_schema(tuple(df.columns))
+        report['schema'] = schema_type
+        if schema_type is None:
+            return report
+        
+        rows = self._sample(df)
+        report['rows_checked'] = len(rows)
+        report['sampled'] = len(rows) < len(df)
+        deadline = self._deadline()
+        for rule in RULES[schema_type]:
+            if rule.column not in rows.columns:
+                if rule.required:
+                    report['errors'].append(f"{rule.column}: column missing")
+                continue
+            if time.perf_counter() > deadline:
+                report['skipped'].append(rule.column)
+                continue
+            report['errors'].extend(rule.check(rows[rule.column]))
+        
+        report['passed'] = not report['errors']
+        report['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        return report
+    
+    def check(self, df: pd.DataFrame, schema_type: str = "auto") -> Tuple[bool, str]:
+        report = self.validate(df, schema_type)
+        if report['passed']:
+            return True, ""
+        return False, "Validation Failed: " + "; ".join(report['errors'])
+    
+    def profile(self, df: pd.DataFrame) -> Dict:
+        start = time.perf_counter()
+        deadline = self._deadline()
+        numeric_columns = list(df.select_dtypes(include=['number']).columns)
+        report = {
+            "total_rows": len(df),
+            "total_columns": len(df.columns),
+            "numeric_columns": numeric_columns,
+            "text_columns": list(df.select_dtypes(include=['object', 'string', 'category']).columns),
+        }
+        
+        # Column scans run on the sample and are scaled up to the full result
+        rows = self._sample(df)
+        scale = len(df) / len(rows) if len(rows) else 1.0
+        report["missing_values"] = {
+            col: int(round(np.count_nonzero(rows[col].isna().to_numpy()) * scale)) for col in df.columns
+        }
+        for col in numeric_columns:
+            values = _numeric_values(rows[col])
+            negative_count = int(round(np.count_nonzero(values < 0) * scale))
+            if negative_count > 0:
+                report[f"{col}_negative_values"] = negative_count
+        
+        report.update(self._count_distinct(df, deadline))
+        report["sampled_rows"] = len(rows) if len(rows) < len(df) else None
+        report["elapsed_ms"] = (time.perf_counter() - start) * 1000
+        return report
+    
+    def _count_distinct(self, df: pd.DataFrame, deadline: float) -> Dict:
+        # Small results keep every hash and count exactly, larger ones go through sketches
+        exact = len(df) <= max(self.sample_rows, HASH_CHUNK_ROWS)
+        rows_sketch = HyperLogLog(self.precision)
+        column_sketches = {col: HyperLogLog(self.precision) for col in df.columns}
+        row_hashes, column_hashes = [], {col: [] for col in df.columns}
+        # Chunks are visited in random order so a scan cut short by the budget is not just the head
+        starts = np.random.default_rng(self.seed).permutation(np.arange(0, len(df), HASH_CHUNK_ROWS))
+        scanned = 0
+        for position in starts:
+            if scanned and time.perf_counter() > deadline:
+                break
+            chunk = df.iloc[position:position + HASH_CHUNK_ROWS]
+            combined = np.zeros(len(chunk), dtype=np.uint64)
+            for col in chunk.columns:
+                hashes = _hash_column(chunk[col])
+                if exact:
+                    column_hashes[col].append(hashes)
+                else:
+                    column_sketches[col].add_hashes(hashes)
+                combined = combined * np.uint64(1000003) ^ hashes
+            combined = _mix(combined)
+            if exact:
+                row_hashes.append(combined)
+            else:
+                rows_sketch.add_hashes(combined)
+            scanned += len(chunk)
+        
+        if exact:
+            distinct_rows = _count_unique(np.concatenate(row_hashes)) if row_hashes else 0
+            distinct_values = {
+                col: _count_unique(np.concatenate(hashes)) if hashes else 0 for col, hashes in column_hashes.items()
+            }
+        else:
+            distinct_rows = rows_sketch.count()
+            # Differences inside the sketch's error band are indistinguishable from zero
+            if scanned - distinct_rows < 2 * rows_sketch.relative_error * scanned:
+                distinct_rows = scanned
+            distinct_values = {col: min(sketch.count(), scanned) for col, sketch in column_sketches.items()}
+        duplicates = max(0, scanned - distinct_rows)
+        
+        return {
+            "duplicate_rows": int(round(duplicates * len(df) / scanned)) if scanned else 0,
+            "distinct_rows": distinct_rows,
+            "distinct_values": distinct_values,
+            "scanned_rows": scanned,
+            "approximate": not exact or scanned < len(df)
+        }
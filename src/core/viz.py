@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from src.config import settings
+
+TIME_HINTS = ("date", "day", "week", "month", "year", "quarter", "period", "time")
+MEAN_HINTS = ("avg", "average", "mean", "margin", "rate", "ratio", "pct", "percent", "price", "share")
+OTHER_LABEL = "Other"
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: keeps the point per bucket that best preserves the visual shape
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start = end
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        mean_x = x[next_start:next_end].mean()
+        mean_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[anchor] - mean_x) * (y[start:end] - y[anchor]) - (x[anchor] - x[start:end]) * (mean_y - y[anchor])
+        )
+        anchor = start + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+    return selected
+
+def aggregation_for(column: str) -> str:
+    return "mean" if any(hint in column.lower() for hint in MEAN_HINTS) else "sum"
+
+def _as_time(series: pd.Series) -> Optional[pd.Series]:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if not any(hint in str(series.name).lower() for hint in TIME_HINTS):
+        return None
+    # Dates repeat heavily, so only distinct values are parsed. Years come back from SQLite as text like "2023"
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(uniques, dtype=object).astype(str)
+    parsed = pd.to_datetime(text.where(text.str.len() != 4, text + "-01-01"), errors="coerce", format="mixed")
+    if len(parsed) and parsed.notna().mean() < 0.95:
+        return None
+    values = np.append(parsed.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))[codes]
+    return pd.Series(values, index=series.index, name=series.name)
+
+def choose_axes(df: pd.DataFrame) -> Optional[Tuple[str, str]]:
+    numeric_cols = list(df.select_dtypes(include=['number']).columns)
+    other_cols = [col for col in df.columns if col not in numeric_cols]
+    if not numeric_cols or not other_cols:
+        return None
+    return other_cols[0], numeric_cols[0]
+
+def _aggregate(df: pd.DataFrame, x_col: str, y_col: str, how: str) -> pd.DataFrame:
+    return df.groupby(x_col, sort=False, observed=True, dropna=False)[y_col].agg(how).reset_index()
+
+def prepare_chart(df: pd.DataFrame, max_points: int = None, top_n: int = None) -> Optional[Dict]:
+    max_points = max_points or settings.CHART_MAX_POINTS
+    top_n = top_n or settings.CHART_TOP_N
+    axes = choose_axes(df) if len(df) > 1 else None
+    if axes is None:
+        return None
+    
+    x_col, y_col = axes
+    how = aggregation_for(y_col)
+    # Both columns are borrowed from the result; compact dtypes stay as they are until aggregation
+    data = pd.DataFrame({x_col: df[x_col], y_col: df[y_col]}, copy=False)
+    notes: List[str] = []
+    
+    times = _as_time(data[x_col])
+    if times is not None:
+        data = pd.DataFrame({x_col: times, y_col: data[y_col]}).dropna(subset=[x_col])
+        if data[x_col].duplicated().any():
+            data = _aggregate(data, x_col, y_col, how)
+            notes.append(f"{how} of {y_col} per {x_col} ({len(df):,} rows into {len(data):,} points)")
+        data = data.sort_values(x_col, kind="stable").reset_index(drop=True)
+        if len(data) > max_points:
+            keep = lttb(data[x_col].to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64),
+                        data[y_col].to_numpy(dtype=np.float64, na_value=0.0), max_points)
+            notes.append(f"downsampled from {len(data):,} to {len(keep):,} points (LTTB)")
+            data = data.iloc[keep]
+        return {'data': data, 'x': x_col, 'y': y_col, 'kind': "time", 'source_rows': len(df), 'notes': notes}
+    
+    if data[x_col].duplicated().any():
+        data = _aggregate(data, x_col, y_col, how)
+        notes.append(f"{how} of {y_col} per {x_col} ({len(df):,} rows into {len(data):,} groups)")
+    
+    limit = min(top_n, max_points)
+    if len(data) > limit:
+        ranked = data.sort_values(y_col, ascending=False, kind="stable")
+        head, tail = ranked.iloc[:limit - 1], ranked.iloc[limit - 1:]
+        other = pd.DataFrame({x_col: [OTHER_LABEL], y_col: [tail[y_col].agg(how)]})
+        data = pd.concat([head.astype({x_col: object}), other], ignore_index=True)
+        notes.append(f"top {limit - 1} {x_col} values shown, {len(tail):,} more grouped as '{OTHER_LABEL}'")
+    return {'data': data, 'x': x_col, 'y': y_col, 'kind': "category", 'source_rows': len(df), 'notes': notes}
+
+def paginate(df: pd.DataFrame, page: int, page_size: int = None) -> Tuple[pd.DataFrame, int]:
+    page_size = page_size or settings.TABLE_PAGE_ROWS
+    pages = max(1, -(-len(df) // page_size))
+    page = min(max(page, 1), pages)
+    return df.iloc[(page - 1) * page_size:page * page_size], pages
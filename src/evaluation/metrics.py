@@ -0,0 +1,73 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+FLOAT_DECIMALS = 6
+
+def _normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    columns = {}
+    for position, name in enumerate(df.columns):
+        column = df.iloc[:, position]
+        if pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+            column = column.astype("float64").round(FLOAT_DECIMALS)
+        else:
+            column = column.astype("string")
+        columns[position] = column.reset_index(drop=True)
+    return pd.DataFrame(columns)
+
+def frame_signature(df: pd.DataFrame) -> str:
+    if df.shape[1] == 0:
+        return hashlib.sha256(f"empty:{len(df)}".encode()).hexdigest()
+    
+    normalized = _normalize_frame(df)
+    column_digests = [
+        np.sort(pd.util.hash_pandas_object(normalized[position], index=False).to_numpy()).tobytes()
+        for position in normalized.columns
+    ]
+    order = sorted(range(len(column_digests)), key=lambda position: column_digests[position])
+    normalized = normalized.iloc[:, order]
+    normalized.columns = range(len(order))
+    
+    row_hashes = np.sort(pd.util.hash_pandas_object(normalized, index=False).to_numpy())
+    digest = hashlib.sha256(row_hashes.tobytes())
+    digest.update(f"{normalized.shape}".encode())
+    return digest.hexdigest()
+
+def results_match(expected: pd.DataFrame, actual: pd.DataFrame) -> bool:
+    if expected.shape != actual.shape:
+        return False
+    return frame_signature(expected) == frame_signature(actual)
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+def compute_metrics(records: List[Dict]) -> Dict:
+    total = len(records)
+    if total == 0:
+        return {
+            'total_questions': 0,
+            'execution_accuracy': 0,
+            'validity_rate': 0,
+            'row_count_accuracy': 0
+        }
+    
+    valid = sum(1 for r in records if r.get('generated_valid'))
+    correct = sum(1 for r in records if r.get('result_match'))
+    row_matches = sum(1 for r in records if r.get('row_count_match'))
+    gold_errors = sum(1 for r in records if r.get('gold_error'))
+    
+    metrics = {
+        'total_questions': total,
+        'execution_accuracy': correct / total * 100,
+        'validity_rate': valid / total * 100,
+        'row_count_accuracy': row_matches / total * 100,
+        'gold_errors': gold_errors
+    }
+    
+    for stage in ('generation_ms', 'generated_exec_ms', 'gold_exec_ms', 'total_ms'):
+        values = [r[stage] for r in records if r.get(stage) is not None]
+        metrics[f'{stage}_p50'] = _percentile(values, 50)
+        metrics[f'{stage}_p95'] = _percentile(values, 95)
+    
+    return metrics
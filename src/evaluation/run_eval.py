@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import json
+import sqlite3
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from src.config import settings
+from src.core.db import DatabaseClient
+from src.core.governor import QueryBudget, ResourceGovernor
+from src.core.llm import LLMClient, RecordingLLMClient, ReplayLLMClient
+from src.evaluation.metrics import compute_metrics, frame_signature
+
+DEFAULT_EVAL_SET = "data/gold_standard/eval_set.json"
+RESULTS_DIR = "experiments"
+
+def load_eval_set(path: str) -> List[Dict]:
+    items = json.loads(Path(path).read_text(encoding="utf-8"))
+    if isinstance(items, dict):
+        items = items.get("questions", [])
+    
+    eval_set = []
+    for index, item in enumerate(items):
+        eval_set.append({
+            'id': str(item.get('id', index)),
+            'question': item['question'],
+            'gold_sql': item.get('gold_sql') or item.get('sql') or item.get('expected_sql')
+        })
+    return eval_set
+
+def _run_sql(db_path: str, sql: Optional[str], budget: QueryBudget = None) -> Dict:
+    if not sql:
+        return {'error': "No SQL", 'elapsed_ms': 0.0}
+    
+    start = time.perf_counter()
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            conn.execute("PRAGMA query_only = ON;")
+            if budget is None or budget.is_unlimited():
+                df = pd.read_sql_query(sql, conn)
+            else:
+                with ResourceGovernor().govern(conn, budget) as guard:
+                    df = pd.read_sql_query(sql, conn)
+                    guard.check_rows(len(df))
+        finally:
+            conn.close()
+    except Exception as e:
+        return {'error': str(e), 'elapsed_ms': (time.perf_counter() - start) * 1000}
+    
+    return {
+        'error': None,
+        'rows': len(df),
+        'columns': df.shape[1],
+        'signature': frame_signature(df),
+        'elapsed_ms': (time.perf_counter() - start) * 1000
+    }
+
+def execute_pair(db_path: str, gold_sql: str, generated_sql: Optional[str], budget: QueryBudget = None) -> Dict:
+    gold = _run_sql(db_path, gold_sql, budget)
+    generated = _run_sql(db_path, generated_sql, budget)
+    
+    generated_valid = generated['error'] is None
+    comparable = generated_valid and gold['error'] is None
+    return {
+        'gold_error': gold['error'],
+        'generated_error': generated['error'],
+        'generated_valid': generated_valid,
+        'gold_rows': gold.get('rows'),
+        'generated_rows': generated.get('rows'),
+        'row_count_match': comparable and gold['rows'] == generated['rows'],
+        'result_match': comparable and gold['signature'] == generated['signature'],
+        'gold_exec_ms': gold['elapsed_ms'],
+        'generated_exec_ms': generated['elapsed_ms']
+    }
+
+def load_completed(results_file: Path) -> Dict[str, Dict]:
+    completed = {}
+    if results_file.exists():
+        with open(results_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get('retryable'):
+                    # The LLM call failed rather than answered; ask again on the next run
+                    completed.pop(record['id'], None)
+                    continue
+                completed[record['id']] = record
+    return completed
+
+async def evaluate(eval_set: List[Dict], llm: LLMClient, db_path: str, prompt_version: str,
+                   results_file: Path, workers: int = 4, concurrency: int = 4,
+                   budget: QueryBudget = None) -> List[Dict]:
+    completed = load_completed(results_file)
+    pending = [item for item in eval_set if item['id'] not in completed]
+    print(f"Evaluating {len(pending)} questions ({len(completed)} already done)")
+    budget = budget or QueryBudget.from_settings()
+    
+    schema = DatabaseClient(db_path, use_result_cache=False).get_schema_info()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    loop = asyncio.get_running_loop()
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(results_file, "a", encoding="utf-8") as out:
+        
+        async def run(item: Dict):
+            async with semaphore:
+                start = time.perf_counter()
+                generated_sql = await llm.generate_sql_async(item['question'], schema, prompt_version)
+                generation_ms = (time.perf_counter() - start) * 1000
+            
+            outcome = await loop.run_in_executor(
+                pool, execute_pair, db_path, item['gold_sql'], generated_sql, budget
+            )
+            record = {
+                'id': item['id'],
+                'question': item['question'],
+                'prompt_version': prompt_version,
+                'gold_sql': item['gold_sql'],
+                'generated_sql': generated_sql,
+                'generation_ms': generation_ms,
+                **outcome,
+                'total_ms': (time.perf_counter() - start) * 1000,
+                'retryable': generated_sql is None
+            }
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            completed[item['id']] = record
+        
+        await asyncio.gather(*(run(item) for item in pending))
+    
+    return [completed[item['id']] for item in eval_set if item['id'] in completed]
+
+def build_llm(args) -> LLMClient:
+    if args.replay:
+        return ReplayLLMClient(args.replay)
+    if args.record:
+        return RecordingLLMClient(args.record, model=args.model)
+    return LLMClient(model=args.model)
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Run the Text2SQL evaluation pipeline")
+    parser.add_argument("--eval-set", default=DEFAULT_EVAL_SET)
+    parser.add_argument("--prompt-version", default="v1")
+    parser.add_argument("--db", default=None, help="Database path (defaults to DB_PATH)")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--workers", type=int, default=4, help="Processes executing SQL")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent LLM requests")
+    parser.add_argument("--replay", default=None, help="Serve SQL from a recorded responses file")
+    parser.add_argument("--record", default=None, help="Record live LLM responses to this file")
+    parser.add_argument("--fresh", action="store_true", help="Ignore results from a previous run")
+    parser.add_argument("--timeout-ms", type=int, default=settings.QUERY_MAX_TIME_MS,
+                        help="Time limit for each gold or generated query")
+    parser.add_argument("--output-dir", default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+    
+    db_path = args.db or settings.DB_PATH
+    output_dir = Path(args.output_dir)
+    results_file = output_dir / f"eval_results_{args.prompt_version}.jsonl"
+    summary_file = output_dir / f"eval_results_{args.prompt_version}.json"
+    if args.fresh and results_file.exists():
+        results_file.unlink()
+    
+    eval_set = load_eval_set(args.eval_set)
+    llm = build_llm(args)
+    
+    start = time.perf_counter()
+    try:
+        records = asyncio.run(evaluate(
+            eval_set, llm, db_path, args.prompt_version, results_file, args.workers, args.concurrency,
+            QueryBudget.from_settings().merge(QueryBudget(max_time_ms=args.timeout_ms))
+        ))
+    finally:
+        if isinstance(llm, RecordingLLMClient):
+            llm.close()
+    metrics = compute_metrics(records)
+    metrics['prompt_version'] = args.prompt_version
+    metrics['model'] = llm.model_name
+    metrics['wall_time_s'] = time.perf_counter() - start
+    
+    summary_file.write_text(json.dumps({'metrics': metrics, 'results': records}, indent=2), encoding="utf-8")
+    
+    print(f"Execution Accuracy: {metrics['execution_accuracy']:.1f}%")
+    print(f"Validity Rate: {metrics['validity_rate']:.1f}%")
+    print(f"Row Count Accuracy: {metrics['row_count_accuracy']:.1f}%")
+    retryable = sum(1 for record in records if record.get('retryable'))
+    if retryable:
+        print(f"{retryable} generations failed and will be retried on the next run")
+    print(f"Results saved to {summary_file}")
+    return metrics
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import pytest
+from src.core.cache import QueryCache, normalize_question
+
+@pytest.mark.parametrize("first, second", [
+    ("revenue > 100", "revenue < 100"),
+    ("revenue >= 100", "revenue > 100"),
+    ("revenue = 100", "revenue 100"),
+    ("top 1.5% of clients", "top 1 5% of clients"),
+    ("margin above 0.5", "margin above 5"),
+    ("orders over 1,000", "orders over 1 000"),
+    ("revenue in 2023-02", "revenue in 2023 02"),
+])
+def test_questions_that_need_different_sql_get_different_keys(first, second):
+    assert normalize_question(first) != normalize_question(second)
+    assert QueryCache.make_key(first, "h", "v1") != QueryCache.make_key(second, "h", "v1")
+
+@pytest.mark.parametrize("first, second", [
+    ("Revenue  by Region", "revenue by region"),
+    ("revenue>100", "revenue > 100"),
+    ("What is total revenue?", "what is total revenue"),
+])
+def test_case_and_spacing_do_not_matter(first, second):
+    assert normalize_question(first) == normalize_question(second)
+
+def test_stored_answers_are_bounded(tmp_path):
+    cache = QueryCache(cache_file=str(tmp_path / "cache.db"), max_entries=2, max_stored=3)
+    for n in range(5):
+        cache.put(f"revenue > {n}", "h", "v1", f"SELECT {n}")
+    
+    assert cache._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 3
+    assert cache.get("revenue > 4", "h", "v1") == "SELECT 4"
+    assert cache.get("revenue > 0", "h", "v1") is None
@@ -0,0 +1,39 @@
+import csv
+import pytest
+from src.core.examples import ExampleIndex
+from src.core.logger import LOG_COLUMNS, SEMANTIC_MODEL
+
+def write_log(path, columns, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+@pytest.mark.parametrize("columns", [LOG_COLUMNS, [column for column in LOG_COLUMNS if column != 'validation_passed']])
+def test_only_validated_rows_become_examples(tmp_path, columns):
+    log_file = tmp_path / "experiments.csv"
+    write_log(log_file, columns, [
+        {'user_question': "total revenue", 'sql': "SELECT SUM(total) FROM invoices",
+         'execution_success': True, 'validation_passed': True},
+        {'user_question': "revenue by month", 'sql': "SELECT 1",
+         'execution_success': True, 'validation_passed': False, 'error': "Result contains only NULL values"},
+        {'user_question': "top artists", 'sql': "SELECT * FROM nowhere",
+         'execution_success': False, 'validation_passed': True, 'error': "no such table: nowhere"}
+    ])
+    index = ExampleIndex(log_file=str(log_file), snapshot_path=str(tmp_path / "examples.json"))
+    
+    assert index.refresh() == 1
+    assert [example['question'] for example in index.examples] == ["total revenue"]
+
+def test_rollup_answers_are_not_examples(tmp_path):
+    log_file = tmp_path / "experiments.csv"
+    write_log(log_file, LOG_COLUMNS, [
+        {'user_question': "total revenue", 'sql': "SELECT SUM(total) FROM invoices", 'model': "gemini",
+         'execution_success': True, 'validation_passed': True},
+        {'user_question': "revenue by region", 'sql': "SELECT region, SUM(revenue) FROM rollup_region",
+         'model': SEMANTIC_MODEL, 'execution_success': True, 'validation_passed': True}
+    ])
+    index = ExampleIndex(log_file=str(log_file), snapshot_path=str(tmp_path / "examples.json"))
+    
+    assert index.refresh() == 1
+    assert [example['question'] for example in index.examples] == ["total revenue"]
@@ -0,0 +1,58 @@
+import asyncio
+import sqlite3
+import pytest
+from src.core.governor import QueryBudget
+from src.core.llm import RecordingLLMClient, ReplayLLMClient, response_key
+from src.evaluation.run_eval import _run_sql, evaluate, load_completed
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "eval.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER)")
+    conn.executemany("INSERT INTO items VALUES (?)", [(n,) for n in range(3)])
+    conn.commit()
+    conn.close()
+    return str(path)
+
+def test_failed_generations_are_retried(db_path, tmp_path):
+    eval_set = [
+        {'id': "1", 'question': "how many items", 'gold_sql': "SELECT COUNT(*) FROM items"},
+        {'id': "2", 'question': "largest item", 'gold_sql': "SELECT MAX(id) FROM items"}
+    ]
+    results_file = tmp_path / "results.jsonl"
+    llm = ReplayLLMClient(responses={response_key("how many items", "v1"): "SELECT COUNT(*) FROM items"})
+    
+    records = asyncio.run(evaluate(eval_set, llm, db_path, "v1", results_file, workers=1))
+    assert [record['retryable'] for record in records] == [False, True]
+    assert list(load_completed(results_file)) == ["1"]
+    
+    llm.responses[response_key("largest item", "v1")] = "SELECT MAX(id) FROM items"
+    records = asyncio.run(evaluate(eval_set, llm, db_path, "v1", results_file, workers=1))
+    assert [record['result_match'] for record in records] == [True, True]
+    assert sorted(load_completed(results_file)) == ["1", "2"]
+
+def test_queries_run_under_time_limit(db_path):
+    endless = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT x FROM n WHERE x < 0"
+    outcome = _run_sql(db_path, endless, QueryBudget(max_time_ms=200))
+    
+    assert outcome['error'].startswith("Budget Exceeded: time_ms")
+    assert outcome['elapsed_ms'] < 5000
+
+def test_replay_client_is_offline():
+    llm = ReplayLLMClient(responses={})
+    
+    assert llm.rate_limiter is None
+    assert llm.prompt_tokens("how many items", {'items': ['id']}) > 0
+    with pytest.raises(RuntimeError):
+        llm.model
+
+def test_recording_client_writes_responses_on_close(tmp_path):
+    responses_file = tmp_path / "responses.json"
+    with RecordingLLMClient(str(responses_file)) as llm:
+        llm._record("how many items", "v1", "SELECT COUNT(*) FROM items")
+        llm._record("largest item", "v1", "SELECT MAX(id) FROM items")
+        assert not responses_file.exists()
+    
+    replay = ReplayLLMClient(str(responses_file))
+    assert replay.responses[response_key("largest item", "v1")] == "SELECT MAX(id) FROM items"
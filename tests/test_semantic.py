@@ -0,0 +1,69 @@
+import sqlite3
+from pathlib import Path
+import pytest
+from src.core.db import DatabaseClient
+from src.core.governor import QueryBudget
+from src.core.semantic import SemanticLayer
+
+METRICS_FILE = str(Path(__file__).resolve().parents[1] / "metrics.yaml")
+
+def execute(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+@pytest.fixture
+def layer(tmp_path):
+    path = str(tmp_path / "sales.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE clients (client_id INTEGER PRIMARY KEY, company_name TEXT, region TEXT);
+        CREATE TABLE catalog (product_id INTEGER PRIMARY KEY, product_name TEXT, category TEXT,
+                              cost_price REAL, unit_price REAL);
+        CREATE TABLE invoices (invoice_id INTEGER PRIMARY KEY, client_id INTEGER, product_id INTEGER,
+                               invoice_date TEXT, quantity INTEGER);
+        INSERT INTO clients VALUES (1, 'Acme', 'Europe'), (2, 'Globex', 'Asia');
+        INSERT INTO catalog VALUES (1, 'Widget', 'Tools', 5, 10);
+    """)
+    conn.executemany("INSERT INTO invoices (client_id, product_id, invoice_date, quantity) VALUES (?, 1, ?, ?)",
+                     [(n % 2 + 1, f"2023-{n % 12 + 1:02d}-01", 1) for n in range(40)])
+    conn.commit()
+    conn.close()
+    
+    db = DatabaseClient(path, use_result_cache=False)
+    layer = SemanticLayer(db, METRICS_FILE, str(tmp_path / "rollups.db"))
+    layer.refresh()
+    yield layer
+    layer.wait()
+    db.close()
+
+def revenue(layer, region):
+    answer = layer.answer("revenue by region", QueryBudget(max_time_ms=1000))
+    if answer is None:
+        return None
+    result = answer[1]
+    return result.loc[result['region'] == region, 'revenue'].iloc[0]
+
+def test_appended_invoices_are_folded_in_on_the_request_path(layer):
+    assert revenue(layer, "Europe") == 200
+    execute(layer.db.db_path, "INSERT INTO invoices (client_id, product_id, invoice_date, quantity) VALUES (1, 1, '2024-01-01', 3)")
+    
+    assert revenue(layer, "Europe") == 230
+    assert layer.store.stats()['rebuilds'] == len(layer.model['rollups'])
+
+def test_deleted_invoice_is_rebuilt_in_the_background(layer):
+    execute(layer.db.db_path, "DELETE FROM invoices WHERE invoice_id = 1")
+    
+    assert revenue(layer, "Europe") is None
+    assert layer.wait(10)
+    assert revenue(layer, "Europe") == 190
+
+def test_in_place_update_is_found_by_verification(layer):
+    execute(layer.db.db_path, "UPDATE catalog SET unit_price = 20 WHERE product_id = 1")
+    
+    # Counts are unchanged, so only the background checksum notices the new price
+    layer.refresh(verify=False)
+    assert revenue(layer, "Europe") == 200
+    layer.refresh(verify=True)
+    assert revenue(layer, "Europe") == 400
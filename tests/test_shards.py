@@ -0,0 +1,69 @@
+import sqlite3
+import pandas as pd
+import pytest
+from src.core.db import DatabaseClient
+from src.core.shards import ShardedDatabaseClient, build_plan, prune_shards, split_by_year
+
+QUERIES = [
+    "SELECT COUNT(*) AS n, SUM(total) AS revenue, AVG(total) AS average FROM invoices",
+    "SELECT substr(invoice_date, 1, 4) AS year, SUM(total) AS revenue FROM invoices GROUP BY year ORDER BY year",
+    "SELECT c.country, MAX(i.total) AS largest FROM invoices i JOIN customers c ON c.customer_id = i.customer_id "
+    "GROUP BY c.country ORDER BY c.country",
+    "SELECT invoice_id, total FROM invoices WHERE invoice_date >= '2022-01-01' ORDER BY total DESC, invoice_id LIMIT 5",
+    "SELECT COUNT(*) AS n FROM invoices WHERE invoice_date BETWEEN '2021-03-01' AND '2021-06-30'"
+]
+
+@pytest.fixture(scope="module")
+def databases(tmp_path_factory):
+    root = tmp_path_factory.mktemp("shards")
+    db_path = str(root / "main.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, country TEXT)")
+    conn.execute("CREATE TABLE invoices (invoice_id INTEGER PRIMARY KEY, customer_id INTEGER, invoice_date TEXT, total REAL)")
+    conn.executemany("INSERT INTO customers VALUES (?, ?)", [(n, ["DE", "FR", "US"][n % 3]) for n in range(10)])
+    conn.executemany("INSERT INTO invoices VALUES (?, ?, ?, ?)", [
+        (n, n % 10, f"{2020 + n % 3}-{n % 12 + 1:02d}-{n % 28 + 1:02d}", round(n * 1.37 % 50, 2)) for n in range(600)
+    ])
+    conn.commit()
+    conn.close()
+    
+    manifest = split_by_year(db_path, str(root / "parts"))
+    sharded = ShardedDatabaseClient(db_path, shards=manifest, use_result_cache=False, workers=2)
+    single = DatabaseClient(db_path, use_result_cache=False)
+    yield single, sharded, manifest
+    sharded.close()
+    single.close()
+
+def test_split_writes_one_shard_per_year(databases):
+    _, _, manifest = databases
+    assert [(shard['start'], shard['end']) for shard in manifest] == [
+        ("2020-01-01", "2020-12-31"), ("2021-01-01", "2021-12-31"), ("2022-01-01", "2022-12-31")
+    ]
+
+@pytest.mark.parametrize("sql", QUERIES)
+def test_sharded_results_match_single_database(databases, sql):
+    single, sharded, _ = databases
+    before = sharded.get_shard_stats()['pushed_down']
+    expected = single.execute_query(sql, use_cache=False)
+    actual = sharded.execute_query(sql, use_cache=False)
+    
+    assert not isinstance(actual, str), actual
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert sharded.get_shard_stats()['pushed_down'] == before + 1
+
+def test_date_range_prunes_shards(databases):
+    _, _, manifest = databases
+    plan = build_plan(QUERIES[-1], ["n"], manifest)
+    
+    assert [shard['start'] for shard in plan.shards] == ["2021-01-01"]
+    assert len(plan.pruned) == 2
+    kept, pruned = prune_shards(manifest, "2022-06-01", None)
+    assert [shard['start'] for shard in kept] == ["2022-01-01"]
+
+def test_unsupported_queries_fall_back_to_the_view(databases):
+    single, sharded, _ = databases
+    sql = "SELECT total FROM invoices WHERE invoice_id < 3 UNION SELECT 0"
+    before = sharded.get_shard_stats()['fallbacks']
+    
+    pd.testing.assert_frame_equal(sharded.execute_query(sql, use_cache=False), single.execute_query(sql, use_cache=False))
+    assert sharded.get_shard_stats()['fallbacks'] == before + 1
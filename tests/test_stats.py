@@ -0,0 +1,30 @@
+import csv
+from src.core.logger import LOG_COLUMNS
+from src.core.stats import ExperimentStats
+
+def write_log(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=LOG_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+def test_snapshot_with_other_accuracy_is_rebuilt(tmp_path):
+    log_file = tmp_path / "experiments.csv"
+    snapshot_path = tmp_path / "stats.json"
+    write_log(log_file, [
+        {'prompt_version': "v1", 'model': "gemini", 'execution_success': True, 'execution_time_ms': 10},
+        {'prompt_version': "v1", 'model': "gemini", 'execution_success': False, 'execution_time_ms': 250}
+    ])
+    stats = ExperimentStats(log_file=str(log_file), snapshot_path=str(snapshot_path), accuracy=0.05)
+    assert stats.load() == 2
+    assert stats.save()
+    
+    stats = ExperimentStats(log_file=str(log_file), snapshot_path=str(snapshot_path), accuracy=0.01)
+    assert stats.load() == 2
+    assert stats.groups[("v1", "gemini")].latency.accuracy == 0.01
+    assert stats.groups[("v1", "gemini")].total == 2
+    
+    stats.save()
+    stats = ExperimentStats(log_file=str(log_file), snapshot_path=str(snapshot_path), accuracy=0.01)
+    assert stats.load() == 0
+    assert stats.groups[("v1", "gemini")].total == 2
@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+import pytest
+from src.core.governor import BudgetExceeded, QueryBudget, ResourceGovernor
+from src.core.stream import QueryStream
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+@pytest.fixture
+def connection(tmp_path):
+    path = tmp_path / "stream.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER, note TEXT)")
+    conn.executemany("INSERT INTO items VALUES (?, ?)", [(n, None if n < 5 else f"note {n}") for n in range(12)])
+    conn.commit()
+    conn.close()
+    
+    @contextmanager
+    def connect():
+        conn = sqlite3.connect(path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    return connect
+
+@pytest.mark.parametrize("as_arrow", [False, True])
+def test_parquet_column_null_in_first_chunk(connection, tmp_path, as_arrow):
+    path = tmp_path / "items.parquet"
+    stream = QueryStream(connection, "SELECT id, note FROM items ORDER BY id", chunk_size=5, as_arrow=as_arrow)
+    
+    assert stream.to_parquet(str(path)) == 12
+    table = pq.read_table(path)
+    assert table.column("note").to_pylist() == [None] * 5 + [f"note {n}" for n in range(5, 12)]
+    assert table.column("id").to_pylist() == list(range(12))
+
+def test_parquet_column_null_throughout(connection, tmp_path):
+    path = tmp_path / "empty.parquet"
+    stream = QueryStream(connection, "SELECT id, NULL AS missing FROM items", chunk_size=5)
+    
+    assert stream.to_parquet(str(path)) == 12
+    assert pq.read_table(path).column("missing").null_count == 12
+
+def test_stream_runs_under_budget(connection):
+    governor = ResourceGovernor()
+    budget = QueryBudget(max_vm_steps=50000)
+    endless = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT x FROM n WHERE x < 0"
+    
+    with pytest.raises(BudgetExceeded) as raised:
+        QueryStream(connection, endless, chunk_size=5, govern=lambda conn: governor.govern(conn, budget))
+    assert raised.value.kind == 'vm_steps'
+    assert governor.stats()['killed_vm_steps'] == 1
+
+def test_stream_fetch_runs_under_budget(connection):
+    governor = ResourceGovernor()
+    closed = []
+    slow = ("SELECT x FROM (WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n LIMIT 1000000) "
+            "SELECT x FROM n) WHERE x IN (1, 2, 3, 999999)")
+    stream = QueryStream(connection, slow, chunk_size=2, on_close=closed.append,
+                         govern=lambda conn: governor.govern(conn, QueryBudget(max_vm_steps=100000)))
+    
+    assert len(next(stream)) == 2
+    with pytest.raises(BudgetExceeded) as raised:
+        next(stream)
+    assert closed == [stream] and stream.error == str(raised.value)
+
+def test_stream_row_budget(connection):
+    governor = ResourceGovernor()
+    stream = QueryStream(connection, "SELECT id FROM items", chunk_size=5,
+                         govern=lambda conn: governor.govern(conn, QueryBudget(max_rows=8)))
+    
+    assert len(next(stream)) == 5
+    with pytest.raises(BudgetExceeded):
+        next(stream)
+    assert stream.closed and stream.guard.violation.kind == 'rows'
+
+def test_deadline_is_enforced_without_a_timer_thread(connection):
+    governor = ResourceGovernor()
+    endless = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT x FROM n WHERE x < 0"
+    threads = threading.active_count()
+    
+    with pytest.raises(BudgetExceeded) as raised:
+        QueryStream(connection, endless, chunk_size=5, govern=lambda conn: governor.govern(conn, QueryBudget(max_time_ms=100)))
+    assert raised.value.kind == 'time_ms'
+    assert threading.active_count() == threads
+
+def test_merge_can_lift_a_limit():
+    base = QueryBudget(max_time_ms=1000, max_rows=10)
+    
+    assert base.merge(QueryBudget(max_time_ms=0)).is_unlimited() is False
+    assert base.merge(QueryBudget(max_time_ms=0, max_rows=0)).is_unlimited()
+    assert base.merge(QueryBudget(max_rows=5)).max_time_ms == 1000
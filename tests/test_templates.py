@@ -0,0 +1,137 @@
+import sqlite3
+import pytest
+from src.core.db import DatabaseClient
+from src.core.templates import TemplateCache, bind, parameterize, parse_question, render_sql
+
+def rebind(learned_question: str, sql: str, question: str) -> str:
+    template, slots = parse_question(learned_question)
+    prepared = parameterize(sql, slots)
+    assert prepared is not None
+    template_sql, spec = prepared
+    
+    other_template, other_slots = parse_question(question)
+    assert other_template == template
+    params = bind(spec, other_slots)
+    return None if params is None else render_sql(template_sql, params)
+
+def test_year_range_rebinds_both_bounds():
+    sql = "SELECT SUM(total) FROM invoices WHERE invoice_date BETWEEN '2023-01-01' AND '2023-12-31'"
+    assert rebind("revenue in 2023", sql, "revenue in 2024") == (
+        "SELECT SUM(total) FROM invoices WHERE invoice_date BETWEEN '2024-01-01' AND '2024-12-31'"
+    )
+
+@pytest.mark.parametrize("month, end", [
+    ("2023-03", "2023-03-31"),
+    ("2023-04", "2023-04-30"),
+    ("2024-02", "2024-02-29"),
+    ("2023-02", "2023-02-28"),
+])
+def test_month_end_is_recomputed_for_the_bound_month(month, end):
+    sql = "SELECT SUM(total) FROM invoices WHERE invoice_date BETWEEN '2023-02-01' AND '2023-02-28'"
+    assert rebind("revenue in 2023-02", sql, f"revenue in {month}") == (
+        f"SELECT SUM(total) FROM invoices WHERE invoice_date BETWEEN '{month}-01' AND '{end}'"
+    )
+
+def test_month_end_learned_from_a_long_month_shrinks():
+    sql = "SELECT SUM(total) FROM invoices WHERE invoice_date >= '2023-01-01' AND invoice_date <= '2023-01-31'"
+    assert rebind("revenue in 2023-01", sql, "revenue in 2023-02") == (
+        "SELECT SUM(total) FROM invoices WHERE invoice_date >= '2023-02-01' AND invoice_date <= '2023-02-28'"
+    )
+
+@pytest.mark.parametrize("sql", [
+    # A day in the middle of the month has no meaning in another month
+    "SELECT SUM(total) FROM invoices WHERE invoice_date BETWEEN '2023-01-01' AND '2023-01-30'",
+    "SELECT SUM(total) FROM invoices WHERE invoice_date >= '2023-02-15'",
+    # The exclusive upper bound is the next month, which no slot covers
+    "SELECT SUM(total) FROM invoices WHERE invoice_date >= '2023-02-01' AND invoice_date < '2023-03-01'",
+])
+def test_month_templates_with_unbindable_days_are_not_learned(sql):
+    month = sql.split("'")[1][:7]
+    _, slots = parse_question(f"revenue in {month}")
+    assert parameterize(sql, slots) is None
+
+def test_year_bound_on_february_end_is_not_learned():
+    _, slots = parse_question("revenue in 2023")
+    sql = "SELECT SUM(total) FROM invoices WHERE invoice_date BETWEEN '2023-01-01' AND '2023-02-28'"
+    assert parameterize(sql, slots) is None
+
+@pytest.mark.parametrize("quarter, start, end", [
+    ("q1", "-01-01", "-03-31"),
+    ("q2", "-04-01", "-06-30"),
+    ("q3", "-07-01", "-09-30"),
+    ("q4", "-10-01", "-12-31"),
+])
+def test_quarter_bounds_rebind_to_another_year(quarter, start, end):
+    sql = f"SELECT SUM(total) FROM invoices WHERE invoice_date BETWEEN '2023{start}' AND '2023{end}'"
+    assert rebind(f"revenue in {quarter} 2023", sql, f"revenue in {quarter} 2020") == (
+        f"SELECT SUM(total) FROM invoices WHERE invoice_date BETWEEN '2020{start}' AND '2020{end}'"
+    )
+
+def test_quarters_are_different_templates():
+    assert parse_question("revenue in q1 2023")[0] != parse_question("revenue in q2 2023")[0]
+
+def test_stored_prefix_with_a_fixed_day_is_refused():
+    # Specs learned before month ends were handled carried the day of the original month
+    _, slots = parse_question("revenue in 2023-03")
+    assert bind([[0, 'str', 'prefix', "-28"]], slots) is None
+    assert bind([[0, 'str', 'prefix', "-01"]], slots) == ["2023-03-01"]
+
+def test_invalid_month_is_not_bound():
+    _, slots = parse_question("revenue in 2023-13")
+    assert bind([[0, 'str', 'month_end', ""]], slots) is None
+
+@pytest.fixture
+def cache(tmp_path):
+    db_path = tmp_path / "sales.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE invoices (invoice_id INTEGER PRIMARY KEY, region TEXT, invoice_date TEXT, total REAL)")
+    conn.executemany(
+        "INSERT INTO invoices (region, invoice_date, total) VALUES (?, ?, ?)",
+        [("europe", "2023-02-10", 10.0), ("asia", "2023-03-30", 20.0), ("europe", "2024-02-29", 5.0)]
+    )
+    conn.commit()
+    conn.close()
+    
+    db = DatabaseClient(str(db_path), use_result_cache=False)
+    yield TemplateCache(db, cache_file=str(tmp_path / "cache.db"), ttl_seconds=0)
+    db.close()
+
+def test_learn_and_match_round_trip(cache):
+    sql = (
+        "SELECT SUM(total) FROM invoices WHERE region = 'europe' "
+        "AND invoice_date BETWEEN '2023-02-01' AND '2023-02-28'"
+    )
+    assert cache.learn("revenue in europe in 2023-02", sql, "h", "v1")
+    
+    template, template_sql, params = cache.match("revenue in asia in 2023-03", "h", "v1")
+    assert params == ["asia", "2023-03-01", "2023-03-31"]
+    assert cache.db.execute_query(template_sql, use_cache=False, params=params).iloc[0, 0] == 20.0
+    
+    _, _, params = cache.match("revenue in europe in 2024-02", "h", "v1")
+    assert params == ["europe", "2024-02-01", "2024-02-29"]
+    assert cache.match("revenue in europe in 2023-02", "h", "v2") is None
+
+def test_comparison_operators_are_part_of_the_template():
+    assert parse_question("clients with revenue > 1000")[0] == "clients with revenue > {number}"
+    assert parse_question("clients with revenue > 1000")[0] != parse_question("clients with revenue < 500")[0]
+    assert parse_question("revenue by region?")[0] == parse_question("revenue by region")[0]
+
+def test_grouped_number_is_one_literal():
+    template, slots = parse_question("orders over 1,000")
+    assert template == "orders over {number}"
+    assert slots == [('number', 'number', "1000")]
+    sql = "SELECT COUNT(*) FROM invoices WHERE total > 1000"
+    assert rebind("orders over 1,000", sql, "orders over 2,500") == "SELECT COUNT(*) FROM invoices WHERE total > 2500"
+
+def test_opposite_comparison_is_not_served_from_cache(cache):
+    sql = "SELECT region FROM invoices GROUP BY region HAVING SUM(total) > 1000"
+    assert cache.learn("regions with revenue > 1000", sql, "h", "v1")
+    assert cache.match("regions with revenue < 500", "h", "v1") is None
+    assert cache.match("regions with revenue > 500", "h", "v1")[2] == [500]
+
+def test_templates_from_an_older_key_format_are_dropped(cache):
+    assert cache.learn("regions with revenue > 1000", "SELECT 1 WHERE 1 > 1000", "h", "v1")
+    cache._conn.execute("UPDATE templates SET key_version = 1")
+    cache._conn.commit()
+    reopened = TemplateCache(cache.db, cache_file=str(cache.cache_file), ttl_seconds=0)
+    assert reopened._conn.execute("SELECT COUNT(*) FROM templates").fetchone()[0] == 0